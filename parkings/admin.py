@@ -210,8 +210,8 @@ class PermitLookupItemAdmin(ReadOnlyAdmin):
         'registration_number', 'area',
         'start_time', 'end_time']
     list_filter = [
-        'permit__series__active',
-        'permit__domain',
+        'is_active',
+        'domain',
         'permit__series__owner']
     ordering = ('-permit__series', 'permit')
     search_fields = ['registration_number']
@@ -221,9 +221,6 @@ class PermitLookupItemAdmin(ReadOnlyAdmin):
         return '{id}{active}'.format(
             id=series.id, active='*' if series.active else '')
 
-    def domain(self, instance):
-        return instance.permit.domain
-
 
 @admin.register(PermitSeries)
 class PermitSeriesAdmin(admin.ModelAdmin):
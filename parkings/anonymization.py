@@ -5,7 +5,9 @@ from typing import Optional
 from django.conf import ImproperlyConfigured, settings
 from django.utils import timezone
 
-from .models import ArchivedParking, Parking, ParkingCheck, Permit
+from .lookups.permits import permit_index
+from .models import (
+    ArchivedParking, Parking, ParkingCheck, Permit, PermitLookupItemChange)
 from .utils.querysets import make_batches
 
 LOG = logging.getLogger(__name__)
@@ -27,6 +29,7 @@ ENDED_ITEMS_QUERYSET_METHODS = [
     Parking.objects.ends_before,
     ParkingCheck.objects.created_before,
     Permit.objects.all_items_end_before,
+    PermitLookupItemChange.objects.ends_before,
 ]
 
 # Map from model to queryset method.  Used in the implementation.
@@ -47,6 +50,9 @@ def anonymize_all(
     for model in ENDED_ITEMS_QS_METHODS_BY_MODEL:
         total += anonymize_model(model, cutoff=cutoff, dry_run=dry_run)
 
+    if total and not dry_run:
+        permit_index.invalidate()
+
     return total
 
 
@@ -91,6 +97,23 @@ def anonymize_model(
     return total_anonymized
 
 
+def delete_prunable_permit_item_changes(dry_run: bool = False) -> int:
+    prunable = PermitLookupItemChange.objects.prunable()
+    count = prunable.count()
+    if not count:
+        LOG.info("No PermitLookupItemChange objects to delete.")
+        return 0
+
+    verb = "Deleting" if not dry_run else "(DRY-RUN) Would delete"
+    LOG.info("%s %d PermitLookupItemChange objects...", verb, count)
+
+    if dry_run:
+        return 0
+
+    (deleted, _by_model) = prunable.delete()
+    return deleted
+
+
 def get_default_cutoff_date():
     limit = settings.PARKKIHUBI_REGISTRATION_NUMBERS_REMOVABLE_AFTER
     if not isinstance(limit, datetime.timedelta):
@@ -2,6 +2,8 @@ from django.utils.translation import gettext_lazy as _
 from rest_framework import exceptions
 from rest_framework_gis.filters import InBBoxFilter
 
+from ..utils.coordinates import transform_geometry
+
 
 class ParkingException(exceptions.APIException):
     status_code = 403
@@ -17,5 +19,4 @@ class WGS84InBBoxFilter(InBBoxFilter):
             return bbox
 
         bbox.srid = 4326
-        bbox.transform(3879)
-        return bbox
+        return transform_geometry(bbox, 3879)
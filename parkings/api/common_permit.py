@@ -6,8 +6,14 @@ from rest_framework import mixins, serializers, viewsets
 from rest_framework.decorators import action
 from rest_framework.exceptions import NotFound
 from rest_framework.response import Response
+from rest_framework.status import HTTP_201_CREATED, HTTP_400_BAD_REQUEST
 
+from ..importers import PermitImporter
+from ..lookups.permits import permit_index
+from ..lookups.plates import plate_filter
+from ..lookups.verdicts import verdict_cache
 from ..models import Permit, PermitArea, PermitSeries
+from ..signals import update_permit_series_activity
 
 
 class PermitSeriesSerializer(serializers.ModelSerializer):
@@ -39,6 +45,33 @@ class PermitSeriesViewSet(CreateAndReadOnlyModelViewSet):
     def activate(self, request, pk=None):
         return self.execute_activation(Q())
 
+    @action(detail=True, methods=['post'])
+    def import_permits(self, request, pk=None):
+        """
+        Import permits to the series from an NDJSON request body.
+
+        The body is streamed to the importer line by line without
+        parsing it as a whole.
+        """
+        series = self.get_object()
+        importer = PermitImporter(
+            series, request.user, domain=self.get_import_domain())
+        result = importer.import_permits(request.stream or [])
+        if result.error_count:
+            return Response({
+                'errors': result.errors,
+                'error_count': result.error_count,
+            }, status=HTTP_400_BAD_REQUEST)
+        return Response({'created': result.created}, status=HTTP_201_CREATED)
+
+    def get_import_domain(self):
+        """
+        Get the domain forced to the imported permits.
+
+        :rtype: parkings.models.EnforcementDomain|None
+        """
+        return None
+
     def execute_activation(self, deactivate_id_filter):
         with transaction.atomic():
             obj_to_activate = self.get_object()
@@ -51,12 +84,19 @@ class PermitSeriesViewSet(CreateAndReadOnlyModelViewSet):
             if obj_to_activate.active and to_deactivate.count() == 0:
                 return Response({'status': 'No change'})
 
+            changed_ids = [obj_to_activate.pk]
+            changed_ids.extend(to_deactivate.values_list('pk', flat=True))
+
             if not obj_to_activate.active:
                 obj_to_activate.active = True
                 obj_to_activate.save(update_fields=['active'])
 
             to_deactivate.update(active=False)
 
+            # The bulk update of the deactivated series sends no signals
+            update_permit_series_activity(
+                PermitSeries.objects.filter(pk__in=changed_ids))
+
             PermitSeries.delete_prunable_series()
 
             return Response({'status': 'OK'})
@@ -65,7 +105,12 @@ class PermitSeriesViewSet(CreateAndReadOnlyModelViewSet):
 class PermitListSerializer(serializers.ListSerializer):
     def create(self, validated_data):
         permits = [Permit(**item) for item in validated_data]
-        return Permit.objects.bulk_create(permits)
+        created = Permit.objects.bulk_create(permits)
+        transaction.on_commit(lambda: verdict_cache.invalidate_permits(created))
+        transaction.on_commit(
+            lambda: permit_index.invalidate_for_permits(created))
+        transaction.on_commit(lambda: plate_filter.add_permits(created))
+        return created
 
 
 class PermitSerializer(serializers.ModelSerializer):
@@ -110,7 +155,15 @@ class PermitSerializer(serializers.ModelSerializer):
             })
 
 
-class PermitViewSet(viewsets.ModelViewSet):
+class PermitDestroyMixin:
+    def perform_destroy(self, instance):
+        super().perform_destroy(instance)
+        transaction.on_commit(lambda: verdict_cache.invalidate_permits([instance]))
+        transaction.on_commit(
+            lambda: permit_index.invalidate_for_permits([instance]))
+
+
+class PermitViewSet(PermitDestroyMixin, viewsets.ModelViewSet):
     queryset = Permit.objects.all()
     serializer_class = PermitSerializer
     filter_backends = [DjangoFilterBackend]
@@ -130,7 +183,7 @@ class ActivePermitByExternalIdSerializer(PermitSerializer):
         read_only_fields = ['id', 'series']
 
 
-class ActivePermitByExternalIdViewSet(viewsets.ModelViewSet):
+class ActivePermitByExternalIdViewSet(PermitDestroyMixin, viewsets.ModelViewSet):
     queryset = Permit.objects.active().exclude(external_id=None)
     serializer_class = ActivePermitByExternalIdSerializer
     lookup_field = 'external_id'
@@ -1,16 +1,23 @@
 import datetime
 
 from django.conf import settings
-from django.contrib.gis.gdal.error import GDALException
 from django.contrib.gis.geos import Point
+from django.db import connections, router
 from django.utils import timezone
 from rest_framework import generics, serializers
 from rest_framework.response import Response
 
+from ...lookups.areas import area_index
+from ...lookups.parkings import hot_parking_index
+from ...lookups.permits import permit_index
+from ...lookups.plates import plate_filter
+from ...lookups.verdicts import verdict_cache
 from ...models import (
-    EventParking, Parking, ParkingCheck, PaymentZone, PermitArea,
-    PermitLookupItem)
+    EventParking, Parking, ParkingCheck, PaymentZone, PermitLookupItem)
 from ...models.constants import GK25FIN_SRID, WGS84_SRID
+from ...models.utils import normalize_reg_num
+from ...utils.coordinates import transform_points
+from .parking_check_log import parking_check_log
 from .permissions import IsEnforcer
 
 
@@ -61,76 +68,85 @@ class CheckParking(generics.GenericAPIView):
         zone = get_payment_zone(gk25_location, domain)
         area = get_permit_area(gk25_location, domain)
 
+        # If no matching parking or permit is found, this will find one
+        # that has just expired, i.e. was valid a few minutes ago (where
+        # "a few minutes" is the grace duration)
         (allowed_by, parking, end_time) = check_parking(
             registration_number, zone, area, time, domain)
 
         allowed = bool(allowed_by)
 
-        if not allowed:
-            # If no matching parking or permit was found, try to find
-            # one that has just expired, i.e. was valid a few minutes
-            # ago (where "a few minutes" is the grace duration)
-            past_time = time - get_grace_duration()
-            (_allowed_by, parking, end_time) = check_parking(
-                registration_number, zone, area, past_time, domain)
-
-        result = {
-            "allowed": allowed,
-            "end_time": end_time,
-            "location": {
-                "payment_zone": zone,
-                "permit_area": area.identifier if area else None,
-            },
-            "time": time,
-        }
-        filter = {
-            "performer": request.user,
-            "time": time,
-            "time_overridden": bool(params.get("time")),
-            "registration_number": registration_number,
-            "location": wgs84_location,
-            "result": result,
-            "allowed": allowed
-        }
-        if isinstance(parking, Parking):
-            filter["found_parking"] = parking
-        if isinstance(parking, EventParking):
-            filter["found_event_parking"] = parking
-
-        ParkingCheck.objects.create(**filter)
+        result = get_result(allowed, end_time, zone, area, time)
+        filter = get_parking_check_fields(
+            request.user, params, time, wgs84_location, result, parking)
+        parking_check_log.add([ParkingCheck(**filter)])
         return Response(result)
 
 
+def get_result(allowed, end_time, zone, area, time):
+    return {
+        "allowed": allowed,
+        "end_time": end_time,
+        "location": {
+            "payment_zone": zone,
+            "permit_area": area.identifier if area else None,
+        },
+        "time": time,
+    }
+
+
+def get_parking_check_fields(performer, params, time, location, result, found):
+    fields = {
+        "performer": performer,
+        "time": time,
+        "time_overridden": bool(params.get("time")),
+        "registration_number": params.get("registration_number"),
+        "location": location,
+        "result": result,
+        "allowed": result["allowed"],
+    }
+    if isinstance(found, Parking):
+        fields["found_parking"] = found
+    if isinstance(found, EventParking):
+        fields["found_event_parking"] = found
+    return fields
+
+
 def get_location(params):
-    longitude = params["location"]["longitude"]
-    latitude = params["location"]["latitude"]
-    wgs84_location = Point(longitude, latitude, srid=WGS84_SRID)
-    try:
-        gk25_location = wgs84_location.transform(GK25FIN_SRID, clone=True)
-    except GDALException:
-        # GK25-FIN doesn't cover the whole world, and therefore
-        # locations outside of its projection plane will raise a
-        # GDALException.  In that case return None as the gk25_location.
-        return (wgs84_location, None)
-    return (wgs84_location, gk25_location)
+    [location] = get_locations([params])
+    return location
+
+
+def get_locations(params_list):
+    """
+    Get the WGS84 and GK25-FIN locations of given check parameters.
+
+    GK25-FIN doesn't cover the whole world, and therefore the GK25-FIN
+    location is None for the locations outside of its projection plane.
+
+    :type params_list: list[dict]
+    :rtype: list[tuple[Point, Point|None]]
+    """
+    wgs84_locations = [
+        Point(
+            params["location"]["longitude"], params["location"]["latitude"],
+            srid=WGS84_SRID)
+        for params in params_list
+    ]
+    gk25_locations = transform_points(wgs84_locations, GK25FIN_SRID)
+    return list(zip(wgs84_locations, gk25_locations))
 
 
 def get_payment_zone(location, domain):
     if location is None:
         return None
-    zone = (
-        PaymentZone.objects
-        .filter(geom__contains=location, domain=domain)
-        .order_by("-number")[:1]
-        .values_list("number", flat=True)).first()
-    return zone
+    return area_index.get_payment_zone(location, domain)
 
 
 def get_permit_area(location, domain):
     if location is None:
         return None
-    area = PermitArea.objects.filter(geom__contains=location, domain=domain).first()
-    return area if area else None
+    return area_index.get_permit_area(location, domain)
 
 # def get_event_area(location, domain):
 #     if location is None:
@@ -144,49 +160,212 @@ def check_parking(registration_number, zone, area, time, domain):
     """
     Check parking allowance from the database.
 
+    Finds the best parking, permit or event parking allowing the
+    parking at given time.  If there is none, finds the best one that
+    was valid within the grace duration before the given time, i.e.
+    one that has just expired.  Both of these are evaluated with a
+    single SQL statement.  If the in-process index of the current
+    parkings is enabled and covers the given time, the parkings are
+    looked up from it and the statement is needed only if no parking
+    allows the parking, see `parkings.lookups.parkings`.
+
+    The priority order of the rights is: parking, permit and event
+    parking.  A parking is allowing only if it is for the given payment
+    zone or for a zone with a smaller number.  A permit is allowing
+    only if it is for the given permit area and in an active series.
+
+    Registration numbers which have no rights at all are recognized
+    without a database query, if the PARKKIHUBI_PLATE_FILTER setting is
+    enabled, see `parkings.lookups.plates`.
+
+    The results allowing the parking are cached for a short while, if
+    enabled by the PARKKIHUBI_CHECK_PARKING_CACHE_TTL setting, see
+    `parkings.lookups.verdicts`.
+
+    The returned allowed_by value is None, if no right allows the
+    parking at given time, even when a recently expired right was
+    found.
+
     :type registration_number: str
     :type zone: int|None
-    :type area: str|None
+    :type area: parkings.models.PermitArea|None
     :type domain: parkings.models.EnforcementDomain
     :type time: datetime.datetime
-    :rtype: (str, Parking|None, datetime.datetime)
+    :rtype: (str|None, Parking|EventParking|None, datetime.datetime|None)
     """
-    active_parkings = (
-        Parking.objects
-        .registration_number_like(registration_number)
-        .valid_at(time)
-        .only("id", "zone", "time_end")
-        .filter(domain=domain))
-
-    for parking in active_parkings:
-        if zone is None or parking.zone.number <= zone:
-            return ("parking", parking, parking.time_end)
-
-    if area:
-        permit_end_time = (
-            PermitLookupItem.objects
-            .active()
-            .by_time(time)
-            .by_subject(registration_number)
-            .by_area(area)
-            .values_list("end_time", flat=True)
-            .filter(permit__domain=domain)
-            .first())
-
-        if permit_end_time:
-            return ("permit", None, permit_end_time)
-
-    active_event_parking = (
-        EventParking.objects
-        .registration_number_like(registration_number)
-        .valid_at(time)
-        .only("id", "time_end")
-        .filter(domain=domain)).first()
-
-    if active_event_parking:
-        return ("event parking", active_event_parking, active_event_parking.time_end)
-
-    return (None, None, None)
+    db = router.db_for_read(Parking)
+    reg_num = normalize_reg_num(registration_number)
+    if plate_filter.rules_out(domain, reg_num, time):
+        return (None, None, None)
+
+    cache_key = verdict_cache.get_key(domain, reg_num, zone, area, time)
+    row = _get_cached_row(cache_key, time)
+    if row is None:
+        row = _fetch_best_right(db, reg_num, zone, area, time, domain)
+        if row and row[0] < len(RIGHT_KINDS):
+            verdict_cache.set(cache_key, (time, row))
+
+    if not row:
+        return (None, None, None)
+
+    (priority, parking_id, event_parking_id, end_time) = row
+    kind = RIGHT_KINDS[priority % len(RIGHT_KINDS)]
+    allowed_by = kind if priority < len(RIGHT_KINDS) else None
+    found = (
+        Parking.from_db(db, ["id", "time_end"], [parking_id, end_time])
+        if parking_id else
+        EventParking.from_db(db, ["id", "time_end"], [event_parking_id, end_time])
+        if event_parking_id else None)
+    return (allowed_by, found, end_time)
+
+
+def _fetch_best_right(db, reg_num, zone, area, time, domain):
+    past_time = time - get_grace_duration()
+    times = [time, past_time]
+
+    # Find the rights from the in-process indexes, if they are usable
+    rows = []
+    sql_kinds = []
+    parkings = hot_parking_index.find(domain, reg_num, time, past_time)
+    if parkings is not None:
+        rows.extend(_find_parking_row(parkings, zone, times, n) for n in (0, 1))
+    else:
+        sql_kinds.append("parking")
+    permit_items = permit_index.get_items(domain, reg_num, area)
+    if permit_items is not None:
+        rows.extend(_find_permit_row(permit_items, times, n) for n in (0, 1))
+    else:
+        sql_kinds.append("permit")
+    sql_kinds.append("event parking")
+
+    best_row = min(filter(None, rows), default=None)
+    if best_row and best_row[0] < RIGHT_KINDS.index(sql_kinds[0]):
+        return best_row  # Nothing from the database could beat this
+
+    params = {
+        "reg_num": reg_num,
+        "zone": zone,
+        "area": area.pk if area else None,
+        "domain": domain.pk,
+        "time": time,
+        "past_time": past_time,
+    }
+    sql = _get_check_parking_sql(connections[db], sql_kinds)
+    with connections[db].cursor() as cursor:
+        cursor.execute(sql, params)
+        row = cursor.fetchone()
+    rows = ([best_row] if best_row else []) + ([tuple(row)] if row else [])
+    return min(rows) if rows else ()
+
+
+def _find_parking_row(parkings, zone, times, n):
+    time = times[n]
+    for (id, time_start, time_end, zone_number) in parkings:
+        is_valid = time_start <= time and (time_end is None or time_end >= time)
+        if is_valid and (zone is None or (
+                zone_number is not None and zone_number <= zone)):
+            return (_get_priority("parking", n), id, None, time_end)
+    return None
+
+
+def _find_permit_row(permit_items, times, n):
+    end_time = permit_items.find(times[n])
+    if end_time is None:
+        return None
+    return (_get_priority("permit", n), None, None, end_time)
+
+
+def _get_priority(kind, n):
+    """
+    Get priority of a right of given kind.
+
+    The rights valid at the checked time (n=0) come before the rights
+    valid at the start of the grace duration (n=1).
+    """
+    return n * len(RIGHT_KINDS) + RIGHT_KINDS.index(kind)
+
+
+def _get_cached_row(cache_key, time):
+    """
+    Get a cached verdict if it holds at given time.
+
+    Only the verdicts allowing the parking are cached, together with
+    the time they were checked for.  The right of such a verdict has
+    started by the checked time, so the verdict holds from then until
+    the end of the right.  The verdicts not allowing the parking are
+    not cached, since a right could start at any time.
+    """
+    cached = verdict_cache.get(cache_key)
+    if cached is None:
+        return None
+    (checked_time, row) = cached
+    end_time = row[3]
+    if checked_time <= time and (end_time is None or end_time >= time):
+        return row
+    return None
+
+
+RIGHT_KINDS = ("parking", "permit", "event parking")
+
+
+def _get_check_parking_sql(connection, kinds=RIGHT_KINDS):
+    quote = connection.ops.quote_name
+    tables = {
+        "parking_table": quote(Parking._meta.db_table),
+        "zone_table": quote(PaymentZone._meta.db_table),
+        "lookup_item_table": quote(PermitLookupItem._meta.db_table),
+        "event_parking_table": quote(EventParking._meta.db_table),
+    }
+    parts = [
+        _RIGHT_SQLS[kind].format(
+            time=time_param, priority=_get_priority(kind, n), **tables)
+        for (n, time_param) in enumerate(["%(time)s", "%(past_time)s"])
+        for kind in kinds
+    ]
+    return " UNION ALL ".join(parts) + " ORDER BY priority LIMIT 1"
+
+
+_PARKING_SQL = """
+(SELECT {priority} AS priority, p.id, NULL::uuid, p.time_end
+ FROM {parking_table} p
+ LEFT JOIN {zone_table} z ON z.id = p.zone_id
+ WHERE p.normalized_reg_num = %(reg_num)s
+   AND p.domain_id = %(domain)s
+   AND p.time_start <= {time}
+   AND COALESCE(p.time_end, 'infinity') >= {time}
+   AND (%(zone)s::integer IS NULL OR z.number <= %(zone)s)
+ LIMIT 1)
+"""
+
+_PERMIT_SQL = """
+(SELECT {priority} AS priority, NULL::uuid, NULL::uuid, pli.end_time
+ FROM {lookup_item_table} pli
+ WHERE pli.registration_number = %(reg_num)s
+   AND pli.area_id = %(area)s
+   AND pli.start_time <= {time}
+   AND pli.end_time >= {time}
+   AND pli.domain_id = %(domain)s
+   AND pli.is_active
+ ORDER BY pli.start_time, pli.end_time
+ LIMIT 1)
+"""
+
+_EVENT_PARKING_SQL = """
+(SELECT {priority} AS priority, NULL::uuid, e.id, e.time_end
+ FROM {event_parking_table} e
+ WHERE e.normalized_reg_num = %(reg_num)s
+   AND e.domain_id = %(domain)s
+   AND e.time_start <= {time}
+   AND COALESCE(e.time_end, 'infinity') >= {time}
+ ORDER BY e.id
+ LIMIT 1)
+"""
+
+_RIGHT_SQLS = {
+    "parking": _PARKING_SQL,
+    "permit": _PERMIT_SQL,
+    "event parking": _EVENT_PARKING_SQL,
+}
 
 
 def get_grace_duration(default=datetime.timedelta(minutes=15)):
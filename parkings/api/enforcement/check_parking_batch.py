@@ -0,0 +1,161 @@
+from django.utils import timezone
+from django.utils.translation import gettext_lazy as _
+from rest_framework import generics, serializers
+from rest_framework.response import Response
+
+from ...lookups.plates import plate_filter
+from ...models import EventParking, Parking, ParkingCheck, PermitLookupItem
+from ...models.utils import normalize_reg_num
+from .check_parking import (
+    RIGHT_KINDS, CheckParkingSerializer, get_grace_duration, get_locations,
+    get_parking_check_fields, get_payment_zone, get_permit_area, get_result)
+from .parking_check_log import parking_check_log
+from .permissions import IsEnforcer
+
+MAX_BATCH_SIZE = 200
+
+
+class CheckParkingBatch(generics.GenericAPIView):
+    """
+    Check validity of parkings of several registration numbers at once.
+
+    Takes a list of the same items that are accepted by the check_parking
+    endpoint and returns a list of results in the same order.
+    """
+    permission_classes = [IsEnforcer]
+
+    serializer_class = CheckParkingSerializer
+
+    def post(self, request):
+        if isinstance(request.data, list) and len(request.data) > MAX_BATCH_SIZE:
+            raise serializers.ValidationError(
+                _("At most {} items can be checked at once").format(
+                    MAX_BATCH_SIZE))
+        serializer = self.get_serializer(data=request.data, many=True)
+        serializer.is_valid(raise_exception=True)
+        items = serializer.validated_data
+        if not items:
+            return Response([])
+
+        now = timezone.now()
+        domain = request.user.enforcer.enforced_domain
+        checks = []
+        for (params, (wgs84_location, gk25_location)) in zip(
+                items, get_locations(items)):
+            checks.append({
+                "params": params,
+                "time": params.get("time") or now,
+                "reg_num": normalize_reg_num(params["registration_number"]),
+                "wgs84_location": wgs84_location,
+                "zone": get_payment_zone(gk25_location, domain),
+                "area": get_permit_area(gk25_location, domain),
+            })
+
+        rights = _RightsByRegNum(checks, domain)
+        results = []
+        parking_checks = []
+        for check in checks:
+            (allowed_by, found, end_time) = rights.check_parking(
+                check["reg_num"], check["zone"], check["area"], check["time"])
+            result = get_result(
+                bool(allowed_by), end_time, check["zone"], check["area"],
+                check["time"])
+            results.append(result)
+            parking_checks.append(ParkingCheck(**get_parking_check_fields(
+                request.user, check["params"], check["time"],
+                check["wgs84_location"], result, found)))
+
+        parking_check_log.add(parking_checks)
+        return Response(results)
+
+
+class _RightsByRegNum:
+    """
+    Parkings, permits and event parkings of the checked vehicles.
+
+    The rights of all the checked registration numbers are fetched with
+    one query per right type, which covers all the checked times and
+    their grace windows.  The checks are then evaluated in Python with
+    the same rules as `check_parking.check_parking` uses in SQL.
+    """
+    def __init__(self, checks, domain):
+        reg_nums = {
+            x["reg_num"] for x in checks
+            if not plate_filter.rules_out(domain, x["reg_num"], x["time"])}
+        area_ids = {x["area"].pk for x in checks if x["area"]}
+        first_time = min(x["time"] for x in checks) - get_grace_duration()
+        last_time = max(x["time"] for x in checks)
+
+        parkings = (
+            Parking.objects
+            .filter(domain=domain, normalized_reg_num__in=reg_nums)
+            .overlapping(first_time, last_time)
+            .values_list(
+                "normalized_reg_num", "id", "time_start", "time_end",
+                "zone__number"))
+        permit_items = (
+            PermitLookupItem.objects
+            .active()
+            .filter(
+                domain=domain,
+                registration_number__in=reg_nums,
+                area__in=area_ids)
+            .overlapping(first_time, last_time)
+            .order_by("start_time", "end_time")
+            .values_list(
+                "registration_number", "area", "start_time", "end_time"))
+        event_parkings = (
+            EventParking.objects
+            .filter(domain=domain, normalized_reg_num__in=reg_nums)
+            .overlapping(first_time, last_time)
+            .order_by("id")
+            .values_list("normalized_reg_num", "id", "time_start", "time_end"))
+
+        self.db = parkings.db
+        self.parkings = _group_by_first(parkings)
+        self.permit_items = _group_by_first(permit_items) if area_ids else {}
+        self.event_parkings = _group_by_first(event_parkings)
+
+    def check_parking(self, reg_num, zone, area, time):
+        """
+        Check parking allowance like `check_parking.check_parking`.
+
+        :rtype: (str|None, Parking|EventParking|None, datetime.datetime|None)
+        """
+        for (n, at_time) in enumerate([time, time - get_grace_duration()]):
+            (kind, found, end_time) = self._find_right(
+                reg_num, zone, area, at_time)
+            if kind:
+                return (kind if n == 0 else None, found, end_time)
+        return (None, None, None)
+
+    def _find_right(self, reg_num, zone, area, time):
+        for (pk, start, end, zone_number) in self.parkings.get(reg_num, []):
+            if _is_valid(start, end, time) and (
+                    zone is None or (
+                        zone_number is not None and zone_number <= zone)):
+                parking = Parking.from_db(self.db, ["id", "time_end"], [pk, end])
+                return (RIGHT_KINDS[0], parking, end)
+
+        for (area_id, start, end) in self.permit_items.get(reg_num, []):
+            if area and area_id == area.pk and _is_valid(start, end, time):
+                return (RIGHT_KINDS[1], None, end)
+
+        for (pk, start, end) in self.event_parkings.get(reg_num, []):
+            if _is_valid(start, end, time):
+                event_parking = EventParking.from_db(
+                    self.db, ["id", "time_end"], [pk, end])
+                return (RIGHT_KINDS[2], event_parking, end)
+
+        return (None, None, None)
+
+
+def _group_by_first(rows):
+    result = {}
+    for (key, *values) in rows:
+        result.setdefault(key, []).append(tuple(values))
+    return result
+
+
+def _is_valid(start, end, time):
+    return start <= time and (end is None or end >= time)
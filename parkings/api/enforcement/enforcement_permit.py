@@ -9,6 +9,9 @@ from .permissions import IsEnforcer
 class EnforcementPermitSeriesViewSet(PermitSeriesViewSet):
     permission_classes = [IsEnforcer]
 
+    def get_import_domain(self):
+        return self.request.user.enforcer.enforced_domain
+
 
 class _ForcedDomain:
     def to_internal_value(self, data):
@@ -0,0 +1,88 @@
+from django.contrib.gis.geos import Point
+from django.utils import timezone
+from rest_framework import generics, serializers
+from rest_framework.response import Response
+
+from ...models import EventParking, Parking
+from ...models.constants import GK25FIN_SRID, WGS84_SRID
+from ...utils.coordinates import transform_points
+from .check_parking import LocationSerializer
+from .permissions import IsEnforcer
+from .valid_event_parking import ValidEventParkingSerializer
+from .valid_parking import ValidParkingSerializer
+
+MAX_RADIUS = 1000.0
+MAX_LIMIT = 100
+
+NEARBY_KINDS = [
+    ("parking", Parking, ValidParkingSerializer),
+    ("event_parking", EventParking, ValidEventParkingSerializer),
+]
+
+
+class NearbyParkingSerializer(LocationSerializer):
+    radius = serializers.FloatField(
+        min_value=0, max_value=MAX_RADIUS, default=100.0)
+    limit = serializers.IntegerField(
+        min_value=1, max_value=MAX_LIMIT, default=20)
+
+
+class NearbyParking(generics.GenericAPIView):
+    """
+    List the currently valid parkings nearest to given location.
+
+    Both parkings and event parkings are listed, nearest first, with
+    their distance from the location in meters.
+    """
+    permission_classes = [IsEnforcer]
+
+    serializer_class = NearbyParkingSerializer
+
+    def get(self, request):
+        serializer = self.get_serializer(data=request.query_params)
+        serializer.is_valid(raise_exception=True)
+        params = serializer.validated_data
+
+        wgs84_location = Point(
+            params["longitude"], params["latitude"], srid=WGS84_SRID)
+        [location] = transform_points([wgs84_location], GK25FIN_SRID)
+        domain = request.user.enforcer.enforced_domain
+
+        results = []
+        if location is not None:
+            results = get_nearby_parkings(
+                domain, location, params["radius"], params["limit"])
+        return Response({"results": results})
+
+
+def get_nearby_parkings(domain, location, radius, limit, time=None):
+    """
+    Get the valid parkings and event parkings nearest to given location.
+
+    The nearest parkings of each kind are fetched with a single query
+    and then merged by their distance.
+
+    :type domain: parkings.models.EnforcementDomain
+    :type location: Point
+    :param location: Location in GK25-FIN
+    :type radius: float
+    :param radius: Radius in meters
+    :type limit: int
+    :type time: datetime.datetime|None
+    :rtype: list[dict]
+    """
+    time = time or timezone.now()
+    results = []
+    for (kind, model, serializer_class) in NEARBY_KINDS:
+        rows = list(
+            model.objects
+            .filter(domain=domain)
+            .valid_at(time)
+            .nearest(location, radius)
+            .values(*serializer_class.values_fields, "distance")[:limit])
+        representations = serializer_class.serialize_values(rows)
+        results.extend(
+            dict(representation, kind=kind, distance=round(row["distance"], 1))
+            for (row, representation) in zip(rows, representations))
+    results.sort(key=(lambda x: x["distance"]))
+    return results[:limit]
@@ -0,0 +1,58 @@
+from django.http import HttpResponse
+from django.utils.http import http_date, parse_etags
+from rest_framework import generics
+
+from ...lookups.bundles import bundle_store
+from .permissions import IsEnforcer
+
+
+class OfflineBundle(generics.GenericAPIView):
+    """
+    Get a snapshot of the rights of the enforced domain for offline use.
+
+    The snapshot is a gzip file of the binary described in
+    `parkings.lookups.bundles`.  The response has an ETag, so that
+    clients can check with If-None-Match whether their copy is current.
+    """
+    permission_classes = [IsEnforcer]
+
+    def perform_content_negotiation(self, request, force=False):
+        # The bundle is binary, so accept any media type.  The JSON
+        # renderer is still used for the error responses.
+        return super().perform_content_negotiation(request, force=True)
+
+    def get(self, request):
+        domain = request.user.enforcer.enforced_domain
+        bundle = bundle_store.get(domain)
+        if _etag_matches(bundle.etag, request.headers.get("If-None-Match")):
+            response = HttpResponse(status=304)
+        else:
+            # The gzip file is the payload itself, so it is not served
+            # with a Content-Encoding, which clients would decode
+            response = HttpResponse(
+                bundle.data, content_type="application/gzip")
+        response["ETag"] = bundle.etag
+        response["Last-Modified"] = http_date(bundle.generated_at.timestamp())
+        return response
+
+
+def _etag_matches(etag, if_none_match):
+    """
+    Check whether an ETag matches an If-None-Match header.
+
+    The ETags are compared weakly, as required for If-None-Match.
+
+    :type etag: str
+    :type if_none_match: str|None
+    :rtype: bool
+    """
+    if not if_none_match:
+        return False
+    etags = parse_etags(if_none_match)
+    if etags == ["*"]:
+        return True
+    return _strip_weak(etag) in {_strip_weak(x) for x in etags}
+
+
+def _strip_weak(etag):
+    return etag[2:] if etag.startswith("W/") else etag
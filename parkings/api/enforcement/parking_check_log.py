@@ -0,0 +1,156 @@
+"""
+Storing of the performed parking checks.
+
+By default the ParkingCheck objects are written to the database
+synchronously within the check request.  When the write-behind mode
+is enabled with the PARKKIHUBI_PARKING_CHECK_WRITE_BEHIND setting, the
+objects are appended to an in-process buffer instead and written with
+`bulk_create` when the buffer reaches PARKKIHUBI_PARKING_CHECK_FLUSH_SIZE
+items, when its oldest item gets older than
+PARKKIHUBI_PARKING_CHECK_FLUSH_INTERVAL, or when the worker exits.
+
+The buffer is flushed by a background thread, so under uWSGI the
+write-behind mode needs the `enable-threads` option.  Note that the
+buffered checks of a worker which is killed without a normal shutdown
+are lost.  A found parking which is deleted before the buffer is
+flushed is not linked to the written check.
+"""
+import atexit
+import datetime
+import logging
+import os
+import threading
+import time
+
+from django.conf import settings
+from django.db import IntegrityError, connections
+
+from ...models import ParkingCheck
+
+LOG = logging.getLogger(__name__)
+
+
+class ParkingCheckLog:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._buffer = []
+        self._oldest_added_at = None
+        self._flusher = None
+        self._pid = os.getpid()
+
+    def add(self, parking_checks):
+        """
+        Store given parking checks.
+
+        :type parking_checks: list[ParkingCheck]
+        """
+        if not _is_write_behind_enabled():
+            ParkingCheck.objects.bulk_create(parking_checks)
+            return
+
+        with self._lock:
+            self._reset_if_forked()
+            if self._oldest_added_at is None:
+                self._oldest_added_at = time.monotonic()
+            self._buffer.extend(parking_checks)
+            is_full = len(self._buffer) >= _get_flush_size()
+            self._start_flusher()
+        if is_full:
+            self.flush()
+
+    def flush(self):
+        """
+        Write the buffered parking checks to the database.
+        """
+        with self._lock:
+            self._reset_if_forked()
+            parking_checks = self._buffer
+            self._buffer = []
+            self._oldest_added_at = None
+        if not parking_checks:
+            return
+        try:
+            _write(parking_checks)
+        except Exception:
+            LOG.exception(
+                "Failed to write %d parking checks", len(parking_checks))
+
+    def clear(self):
+        """
+        Drop the buffered parking checks without writing them.
+        """
+        with self._lock:
+            self._buffer = []
+            self._oldest_added_at = None
+
+    def _reset_if_forked(self):
+        # The buffer and the flusher thread are inherited by the child
+        # processes of a forking server, but they belong to the parent
+        if self._pid != os.getpid():
+            self._pid = os.getpid()
+            self._buffer = []
+            self._oldest_added_at = None
+            self._flusher = None
+
+    def _start_flusher(self):
+        if self._flusher is None:
+            self._flusher = threading.Thread(
+                target=self._run_flusher, name="parking-check-flusher",
+                daemon=True)
+            self._flusher.start()
+
+    def _run_flusher(self):
+        while True:
+            interval = _get_flush_interval()
+            time.sleep(interval / 4)
+            with self._lock:
+                added_at = self._oldest_added_at
+            if added_at is not None and time.monotonic() - added_at >= interval:
+                try:
+                    self.flush()
+                finally:
+                    # Do not keep an idle connection open in this thread
+                    connections.close_all()
+
+
+def _write(parking_checks):
+    try:
+        ParkingCheck.objects.bulk_create(parking_checks)
+    except IntegrityError:
+        # A found parking may have been deleted after the check
+        _unlink_deleted_found_parkings(parking_checks)
+        ParkingCheck.objects.bulk_create(parking_checks)
+
+
+def _unlink_deleted_found_parkings(parking_checks):
+    for field_name in ["found_parking", "found_event_parking"]:
+        field = ParkingCheck._meta.get_field(field_name)
+        ids = {getattr(x, field.attname) for x in parking_checks} - {None}
+        existing_ids = set(
+            field.related_model.objects.filter(pk__in=ids)
+            .values_list("pk", flat=True))
+        for parking_check in parking_checks:
+            if getattr(parking_check, field.attname) not in existing_ids:
+                setattr(parking_check, field_name, None)
+    for parking_check in parking_checks:
+        parking_check.pk = None  # Set by the failed insert
+
+
+def _is_write_behind_enabled():
+    return bool(getattr(settings, "PARKKIHUBI_PARKING_CHECK_WRITE_BEHIND", False))
+
+
+def _get_flush_size(default=100):
+    value = getattr(settings, "PARKKIHUBI_PARKING_CHECK_FLUSH_SIZE", None)
+    return value if value is not None else default
+
+
+def _get_flush_interval(default=datetime.timedelta(seconds=5)):
+    value = getattr(settings, "PARKKIHUBI_PARKING_CHECK_FLUSH_INTERVAL", None)
+    assert value is None or isinstance(value, datetime.timedelta)
+    return (value if value is not None else default).total_seconds()
+
+
+parking_check_log = ParkingCheckLog()
+
+atexit.register(parking_check_log.flush)
@@ -3,9 +3,12 @@ from rest_framework.routers import DefaultRouter
 
 from ..url_utils import versioned_url
 from .check_parking import CheckParking
+from .check_parking_batch import CheckParkingBatch
 from .enforcement_permit import (
     EnforcementActivePermitByExternalIdViewSet, EnforcementPermitSeriesViewSet,
     EnforcementPermitViewSet)
+from .nearby_parking import NearbyParking
+from .offline_bundle import OfflineBundle
 from .operator import OperatorViewSet
 from .valid_event_parking import ValidEventParkingViewSet
 from .valid_parking import ValidParkingViewSet
@@ -17,6 +20,9 @@ class Router(DefaultRouter):
         urls = super().get_urls()
         return urls + [
             re_path(r"^check_parking/$", CheckParking.as_view(), name="check_parking"),
+            re_path(r"^check_parking/batch/$", CheckParkingBatch.as_view(), name="check_parking_batch"),
+            re_path(r"^offline_bundle/$", OfflineBundle.as_view(), name="offline_bundle"),
+            re_path(r"^nearby_parking/$", NearbyParking.as_view(), name="nearby_parking"),
         ]
 
     def get_api_root_view(self, *args, **kwargs):
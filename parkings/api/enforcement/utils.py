@@ -1,9 +1,61 @@
 import datetime
 
 from django.conf import settings
+from django.utils import timezone
+from rest_framework.response import Response
 
 
 def get_grace_duration(default=datetime.timedelta(minutes=15)):
     value = getattr(settings, 'PARKKIHUBI_TIME_OLD_PARKINGS_VISIBLE', None)
     assert value is None or isinstance(value, datetime.timedelta)
     return value if value is not None else default
+
+
+class ValuesListMixin:
+    """
+    Mixin for listing the objects from a values() projection.
+
+    The list is built from dictionaries of the queryset's values()
+    without instantiating the model objects or the serializer fields.
+    The serializer class must define the projected fields in
+    `values_fields` and a class method `serialize_values`, which turns
+    the rows to the same representations as the serializer would.
+    """
+    def list(self, request, *args, **kwargs):
+        serializer_class = self.get_serializer_class()
+        queryset = self.filter_queryset(self.get_queryset())
+        rows = queryset.values(*serializer_class.values_fields)
+        page = self.paginate_queryset(rows)
+        if page is not None:
+            return self.get_paginated_response(
+                serializer_class.serialize_values(page))
+        return Response(serializer_class.serialize_values(rows))
+
+
+def get_datetime_formatter():
+    """
+    Get a function which formats datetimes like DRF's DateTimeField.
+
+    The current time zone is resolved once, so that the function is
+    cheap to call for every value of a page.
+    """
+    current_timezone = timezone.get_current_timezone()
+
+    def format_datetime(value):
+        if value is None:
+            return None
+        formatted = value.astimezone(current_timezone).isoformat()
+        if formatted.endswith('+00:00'):
+            return formatted[:-6] + 'Z'
+        return formatted
+
+    return format_datetime
+
+
+def format_seconds_utc(value):
+    """
+    Format an UTC datetime as YYYY-MM-DDTHH:MM:SSZ.
+
+    Same as strftime('%Y-%m-%dT%H:%M:%SZ'), but faster.
+    """
+    return value.isoformat(timespec='seconds')[:19] + 'Z'
@@ -8,6 +8,17 @@ class ValidEventParkingSerializer(ValidSerializer):
         model = EventParking
         fields = ValidSerializer.Meta.fields + ['event_area']
 
+    values_fields = ValidSerializer.values_fields + ['event_area']
+
+    @classmethod
+    def _serialize_row(cls, row, format_datetime, none_end_time):
+        representation = super()._serialize_row(
+            row, format_datetime, none_end_time)
+        event_area = row['event_area']
+        representation['event_area'] = (
+            str(event_area) if event_area is not None else None)
+        return representation
+
 
 class ValidEventParkingFilter(ValidFilter):
 
@@ -1,12 +1,19 @@
 import django_filters
+from django import forms
 from django.conf import settings
+from django.db.models import Exists, OuterRef, Subquery
 from django.utils import timezone
 from django.utils.translation import gettext_lazy as _
+from django_filters.utils import translate_validation
 from rest_framework import serializers, viewsets
 
+from ...lookups.parkings import hot_parking_index
 from ...models import Parking
+from ...models.utils import normalize_reg_num
 from .permissions import IsEnforcer
-from .utils import get_grace_duration
+from .utils import (
+    ValuesListMixin, format_seconds_utc, get_datetime_formatter,
+    get_grace_duration)
 
 
 class ValidSerializer(serializers.ModelSerializer):
@@ -43,6 +50,52 @@ class ValidSerializer(serializers.ModelSerializer):
 
         return representation
 
+    values_fields = [
+        'id',
+        'created_at',
+        'modified_at',
+        'registration_number',
+        'time_start',
+        'time_end',
+        'operator',
+        'operator__name',
+    ]
+
+    @classmethod
+    def serialize_values(cls, rows):
+        """
+        Build the representations from rows of values_fields.
+
+        The result is the same as from to_representation.
+
+        :type rows: Iterable[dict]
+        :rtype: list[dict]
+        """
+        format_datetime = get_datetime_formatter()
+        none_end_time = getattr(
+            settings, 'PARKKIHUBI_NONE_END_TIME_REPLACEMENT', None) or None
+        return [
+            cls._serialize_row(row, format_datetime, none_end_time)
+            for row in rows]
+
+    @classmethod
+    def _serialize_row(cls, row, format_datetime, none_end_time):
+        (time_start, time_end) = (row['time_start'], row['time_end'])
+        return {
+            'id': str(row['id']),
+            'created_at': format_datetime(row['created_at']),
+            'modified_at': format_datetime(row['modified_at']),
+            'registration_number': row['registration_number'],
+            'time_start': (
+                format_seconds_utc(time_start)
+                if time_start is not None else None),
+            'time_end': (
+                format_seconds_utc(time_end)
+                if time_end is not None else none_end_time),
+            'operator': str(row['operator']),
+            'operator_name': row['operator__name'],
+        }
+
 
 class ValidParkingSerializer(ValidSerializer):
 
@@ -64,9 +117,40 @@ class ValidParkingSerializer(ValidSerializer):
 
         return representation
 
+    values_fields = ValidSerializer.values_fields + [
+        'zone__code',
+        'is_disc_parking',
+    ]
+
+    @classmethod
+    def _serialize_row(cls, row, format_datetime, none_end_time):
+        representation = super()._serialize_row(
+            row, format_datetime, none_end_time)
+        zone_code = row['zone__code']
+        representation['zone'] = (
+            int(zone_code) if zone_code and zone_code.isdigit()
+            else zone_code)
+        if row['is_disc_parking']:
+            representation['is_disc_parking'] = True
+        return representation
+
+
+class RegistrationNumbersField(forms.Field):
+    """
+    Form field for registration numbers given as repeated parameters.
+    """
+    widget = forms.MultipleHiddenInput
+
+    def to_python(self, value):
+        return [x for x in (value or []) if x]
+
+
+class RegistrationNumbersFilter(django_filters.Filter):
+    field_class = RegistrationNumbersField
+
 
 class ValidFilter(django_filters.rest_framework.FilterSet):
-    reg_num = django_filters.CharFilter(
+    reg_num = RegistrationNumbersFilter(
         label=_("Registration number"), method='filter_reg_num')
     time = django_filters.IsoDateTimeFilter(
         label=_("Time"), method='filter_time')
@@ -93,13 +177,13 @@ class ValidFilter(django_filters.rest_framework.FilterSet):
 
     def filter_reg_num(self, queryset, name, value):
         """
-        Filter by normalized registration number.
+        Filter by normalized registration numbers.
 
         :type queryset: parkings.models.ParkingQuerySet
         :type name: str
-        :type value: str
+        :type value: list[str]
         """
-        return queryset.registration_number_like(value)
+        return queryset.registration_numbers_like(value)
 
     def filter_time(self, queryset, name, value):
         """
@@ -120,8 +204,28 @@ class ValidParkingFilter(ValidFilter):
         model = Parking
         fields = []
 
+    def filter_queryset(self, queryset):
+        """
+        Filter the queryset using the index of the current parkings.
 
-class ValidViewSet(viewsets.ReadOnlyModelViewSet):
+        Falls back to the database filters, if the index is not enabled
+        or it does not cover the given time.
+        """
+        reg_nums = self.form.cleaned_data.get('reg_num')
+        time = self.form.cleaned_data.get('time')
+        if reg_nums and time:
+            domain = self.request.user.enforcer.enforced_domain
+            found = [
+                hot_parking_index.find(
+                    domain, normalize_reg_num(reg_num), time, time)
+                for reg_num in reg_nums]
+            if all(parkings is not None for parkings in found):
+                return queryset.filter(pk__in=[
+                    x[0] for parkings in found for x in parkings])
+        return super().filter_queryset(queryset)
+
+
+class ValidViewSet(ValuesListMixin, viewsets.ReadOnlyModelViewSet):
     permission_classes = [IsEnforcer]
 
     class Meta:
@@ -131,42 +235,56 @@ class ValidViewSet(viewsets.ReadOnlyModelViewSet):
         """
         Filter the queryset by given filters.
 
-        If there is no valid parkings for the given registration number
+        If there is no valid parkings for a given registration number
         at given time, but there is a parking that was valid within
         grace duration (G) from given time, then return the parking that
         has the latest ending time and has started before the given time.
+        This is done separately for each given registration number.
 
         The grace duration G defaults to 15 minutes, but is configurable
         with the PARKKIHUBI_TIME_OLD_PARKINGS_VISIBLE setting.
+
+        Both cases are combined to a single queryset, so that the
+        results are fetched with a single query when the queryset is
+        evaluated.
         """
-        filtered_queryset = super().filter_queryset(queryset)
+        filterset = self._get_filterset(queryset)
+        if not filterset.is_valid():
+            raise translate_validation(filterset.errors)
+        filter_params = filterset.form.cleaned_data
+        valid_parkings = filterset.qs
 
-        if filtered_queryset:
-            return filtered_queryset
+        if not filter_params.get('reg_num'):
+            return valid_parkings
 
-        return self._filter_last_valid_if_within_grace_duration(queryset)
+        last_valid = self._filter_last_valid_if_within_grace_duration(
+            queryset, filter_params)
+        return valid_parkings | last_valid
 
-    def _filter_last_valid_if_within_grace_duration(self, queryset):
+    def _filter_last_valid_if_within_grace_duration(
+            self, queryset, filter_params):
         """
         Filter to last valid parking if it ends within grace duration.
+
+        The parking is searched for each registration number which has
+        no valid parkings at the given time.
         """
-        filter_params = self._get_filter_params(queryset)
-        reg_num = filter_params['reg_num']
+        reg_nums = filter_params['reg_num']
         time = filter_params.get('time') or timezone.now()
         some_time_ago = time - get_grace_duration()
-        valid_some_time_ago = (
+        same_reg_num = queryset.filter(
+            normalized_reg_num=OuterRef('normalized_reg_num'))
+        last_valid = (
+            same_reg_num
+            .overlapping(some_time_ago, time)
+            .order_by('-time_end')
+            .values('pk')[:1])
+        return (
             queryset
-            .registration_number_like(reg_num)
-            .ends_after(some_time_ago)
-            .starts_before(time))
-
-        return valid_some_time_ago.order_by('-time_end')[:1]
-
-    def _get_filter_params(self, queryset):
-        filterset = self._get_filterset(queryset)
-        is_valid = filterset.is_valid()
-        assert is_valid
-        return filterset.form.cleaned_data
+            .registration_numbers_like(reg_nums)
+            .overlapping(some_time_ago, time)
+            .filter(~Exists(same_reg_num.valid_at(time)))
+            .filter(pk=Subquery(last_valid)))
 
     def _get_filterset(self, queryset):
         filter_backend = self.filter_backends[0]()
@@ -180,3 +298,26 @@ class ValidParkingViewSet(ValidViewSet):
     queryset = Parking.objects.order_by('-time_end')
     serializer_class = ValidParkingSerializer
     filterset_class = ValidParkingFilter
+
+    def _filter_last_valid_if_within_grace_duration(
+            self, queryset, filter_params):
+        time = filter_params.get('time') or timezone.now()
+        domain = self.request.user.enforcer.enforced_domain
+        last_valid_ids = []
+        for reg_num in filter_params['reg_num']:
+            parkings = hot_parking_index.find(
+                domain, normalize_reg_num(reg_num), time,
+                time - get_grace_duration())
+            if parkings is None:
+                return super()._filter_last_valid_if_within_grace_duration(
+                    queryset, filter_params)
+            if any(x[2] is None or x[2] >= time for x in parkings):
+                continue  # Has a valid parking
+            # Order like the database does with descending time_end,
+            # i.e. with the parkings without an end time first
+            last_valid = max(
+                parkings, key=(lambda x: (x[2] is None, x[2] or time)),
+                default=None)
+            if last_valid:
+                last_valid_ids.append(last_valid[0])
+        return queryset.filter(pk__in=last_valid_ids)
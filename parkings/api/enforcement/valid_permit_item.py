@@ -1,10 +1,17 @@
 import django_filters
 from django.utils.translation import gettext_lazy as _
 from rest_framework import serializers, viewsets
+from rest_framework.decorators import action
+from rest_framework.exceptions import ValidationError
+from rest_framework.response import Response
 
-from ...models import PermitArea, PermitLookupItem
+from ...models import PermitArea, PermitLookupItem, PermitLookupItemChange
 from ...pagination import CursorPagination
 from .permissions import IsEnforcer
+from .utils import ValuesListMixin, get_datetime_formatter
+from .valid_parking import RegistrationNumbersFilter
+
+CHANGES_PAGE_SIZE = 1000
 
 
 class ValidPermitItemSerializer(serializers.ModelSerializer):
@@ -28,9 +35,61 @@ class ValidPermitItemSerializer(serializers.ModelSerializer):
             'properties',
         ]
 
+    values_fields = [
+        'id',
+        'permit_id',
+        'area__identifier',
+        'registration_number',
+        'start_time',
+        'end_time',
+        'permit__series__owner__operator__id',
+        'permit__series__owner__operator__name',
+        'permit__properties',
+    ]
+
+    @classmethod
+    def serialize_values(cls, rows):
+        """
+        Build the representations from rows of values_fields.
+
+        The result is the same as from to_representation.
+
+        :type rows: Iterable[dict]
+        :rtype: list[dict]
+        """
+        format_datetime = get_datetime_formatter()
+        return [{
+            'id': row['id'],
+            'permit_id': row['permit_id'],
+            'area': row['area__identifier'],
+            'registration_number': row['registration_number'],
+            'start_time': format_datetime(row['start_time']),
+            'end_time': format_datetime(row['end_time']),
+            'operator': _str_or_none(
+                row['permit__series__owner__operator__id']),
+            'operator_name': row['permit__series__owner__operator__name'],
+            'properties': row['permit__properties'],
+        } for row in rows]
+
+
+class PermitItemChangeSerializer(serializers.ModelSerializer):
+    id = serializers.IntegerField(source='item_id')
+
+    class Meta:
+        model = PermitLookupItemChange
+        fields = [
+            'kind',
+            'id',
+            'permit_id',
+            'area',
+            'registration_number',
+            'start_time',
+            'end_time',
+        ]
+
 
 class ValidPermitItemFilter(django_filters.rest_framework.FilterSet):
-    reg_num = django_filters.CharFilter(
+    reg_num = RegistrationNumbersFilter(
         label=_("Registration number"), method='filter_reg_num')
     time = django_filters.IsoDateTimeFilter(
         label=_("Time"), method='filter_time')
@@ -40,13 +99,13 @@ class ValidPermitItemFilter(django_filters.rest_framework.FilterSet):
         fields = []
 
     def filter_reg_num(self, queryset, name, value):
-        return queryset.by_subject(value)
+        return queryset.by_subjects(value)
 
     def filter_time(self, queryset, name, value):
         return queryset.by_time(value)
 
 
-class ValidPermitItemViewSet(viewsets.ReadOnlyModelViewSet):
+class ValidPermitItemViewSet(ValuesListMixin, viewsets.ReadOnlyModelViewSet):
     permission_classes = [IsEnforcer]
     queryset = PermitLookupItem.objects.active()
     serializer_class = ValidPermitItemSerializer
@@ -55,4 +114,49 @@ class ValidPermitItemViewSet(viewsets.ReadOnlyModelViewSet):
 
     def get_queryset(self):
         domain = self.request.user.enforcer.enforced_domain
-        return super().get_queryset().filter(permit__domain=domain)
+        return super().get_queryset().filter(domain=domain)
+
+    @action(detail=False)
+    def changes(self, request):
+        """
+        List the changes of the valid permit items after given cursor.
+
+        Without a cursor only the cursor of the current position is
+        returned, so that a client can take it before fetching the full
+        list and then follow the changes from there.
+        """
+        domain = request.user.enforcer.enforced_domain
+        changes = PermitLookupItemChange.objects.filter(domain=domain)
+        horizon = (changes.get_horizon(), 0)
+        position = _parse_change_cursor(request.query_params.get('cursor'))
+        page = []
+        if position is not None:
+            page = list(
+                changes.after(position)
+                .filter(transaction_id__lt=horizon[0])
+                .order_by('transaction_id', 'id')[:CHANGES_PAGE_SIZE + 1])
+        has_more = len(page) > CHANGES_PAGE_SIZE
+        page = page[:CHANGES_PAGE_SIZE]
+        if has_more:
+            position = (page[-1].transaction_id, page[-1].id)
+        else:
+            position = max(position or horizon, horizon)
+        return Response({
+            'cursor': '{}.{}'.format(*position),
+            'has_more': has_more,
+            'changes': PermitItemChangeSerializer(page, many=True).data,
+        })
+
+
+def _str_or_none(value):
+    return str(value) if value is not None else None
+
+
+def _parse_change_cursor(value):
+    if not value:
+        return None
+    try:
+        (transaction_id, change_id) = (int(x) for x in value.split('.'))
+    except ValueError:
+        raise ValidationError({'cursor': [_("Invalid cursor")]})
+    return (transaction_id, change_id)
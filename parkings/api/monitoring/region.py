@@ -3,6 +3,7 @@ import rest_framework_gis.serializers as gis_serializers
 from rest_framework import serializers, viewsets
 
 from ...models import ParkingArea, Region
+from ...utils.coordinates import transform_geometry
 from ..common import WGS84InBBoxFilter
 from .permissions import IsMonitor
 
@@ -19,7 +20,7 @@ class RegionSerializer(gis_serializers.GeoFeatureModelSerializer):
     parking_areas = serializers.SerializerMethodField()
 
     def get_wgs84_geometry(self, instance):
-        return instance.geom.transform(WGS84_SRID, clone=True)
+        return transform_geometry(instance.geom, WGS84_SRID)
 
     def get_area_km2(self, instance):
         return instance.geom.area / M2_PER_KM2
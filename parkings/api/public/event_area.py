@@ -4,6 +4,7 @@ from rest_framework_gis.serializers import (
     GeoFeatureModelSerializer, GeometrySerializerMethodField)
 
 from parkings.models import EventArea
+from parkings.utils.coordinates import transform_geometry
 
 from ..common import WGS84InBBoxFilter
 
@@ -12,7 +13,7 @@ class AreaSerializer(GeoFeatureModelSerializer):
     wgs84_areas = GeometrySerializerMethodField()
 
     def get_wgs84_areas(self, area):
-        return area.geom.transform(4326, clone=True)
+        return transform_geometry(area.geom, 4326)
 
     class Meta:
         abstact = True
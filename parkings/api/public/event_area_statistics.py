@@ -40,8 +40,8 @@ class EventAreaStatisticsSerializer(serializers.ModelSerializer):
         return EventArea.objects.get_active_queryset().annotate(parking_count=Count(
             Case(
                 When(
-                    (Q(parking_areas__parkings__time_start__lte=now) &
-                     Q(parking_areas__parkings__time_end__gte=now) |
+                    Q(parking_areas__parkings__time_start__lte=now) &
+                    (Q(parking_areas__parkings__time_end__gte=now) |
                      Q(parking_areas__parkings__time_end__isnull=True)) &
                     Q(geom__intersects=F("parking_areas__parkings__location_gk25fin")),
                     then=1,
@@ -1,5 +1,56 @@
+from django.utils.translation import gettext_lazy as _
+from drf_jwt_2fa.authentication import \
+    Jwt2faAuthentication as BaseJwt2faAuthentication
+from rest_framework import exceptions
 from rest_framework.authentication import TokenAuthentication
+from rest_framework_jwt.settings import api_settings as jwt_settings
+
+from .lookups.users import USER_RELATIONS, user_cache
 
 
 class ApiKeyAuthentication(TokenAuthentication):
     keyword = 'ApiKey'
+
+    def authenticate_credentials(self, key):
+        """
+        Authenticate the API key resolving also the role profiles.
+
+        The resolved user and token are cached for a short time, if
+        enabled by the PARKKIHUBI_AUTH_CACHE_TTL setting.
+        """
+        cached = user_cache.get_by_api_key(key)
+        if cached is not None:
+            return cached
+
+        model = self.get_model()
+        user_relations = ['user__' + x for x in USER_RELATIONS]
+        try:
+            token = model.objects.select_related(*user_relations).get(key=key)
+        except model.DoesNotExist:
+            raise exceptions.AuthenticationFailed(_('Invalid token.'))
+
+        if not token.user.is_active:
+            raise exceptions.AuthenticationFailed(_('User inactive or deleted.'))
+
+        user_cache.set_by_api_key(key, token.user, token)
+        return (token.user, token)
+
+
+class Jwt2faAuthentication(BaseJwt2faAuthentication):
+    def authenticate_credentials(self, payload):
+        """
+        Authenticate the JWT payload resolving also the role profiles.
+
+        The resolved user is cached for a short time by its username, if
+        enabled by the PARKKIHUBI_AUTH_CACHE_TTL setting.
+        """
+        username = jwt_settings.JWT_PAYLOAD_GET_USERNAME_HANDLER(payload)
+        user = user_cache.get_by_username(username) if username else None
+        if user is not None:
+            return user
+
+        user = super().authenticate_credentials(payload)
+        if user_cache.enabled:
+            user = user_cache.load_user(user.pk)
+            user_cache.set_by_username(username, user)
+        return user
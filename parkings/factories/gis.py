@@ -1,5 +1,7 @@
 from django.contrib.gis.geos import MultiPolygon, Point, Polygon
 
+from parkings.utils.coordinates import transform_coordinates
+
 from .faker import fake
 
 
@@ -20,15 +22,15 @@ def generate_location(
 def generate_polygon():
     center = generate_location()
     # Create a square area that covers the generated locations for sure
-    wgs84_points = [
-        Point(center.x - 0.040, center.y - 0.022, srid=4326),
-        Point(center.x + 0.040, center.y - 0.022, srid=4326),
-        Point(center.x + 0.040, center.y + 0.022, srid=4326),
-        Point(center.x - 0.040, center.y + 0.022, srid=4326),
+    wgs84_coordinates = [
+        (center.x - 0.040, center.y - 0.022),
+        (center.x + 0.040, center.y - 0.022),
+        (center.x + 0.040, center.y + 0.022),
+        (center.x - 0.040, center.y + 0.022),
     ]
-    points = [p.transform(3879, clone=True) for p in wgs84_points]
+    points = transform_coordinates(wgs84_coordinates, 4326, 3879)
     points.append(points[0])
-    return Polygon(points)
+    return Polygon(points, srid=3879)
 
 
 def generate_multi_polygon():
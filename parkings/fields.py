@@ -1,4 +1,6 @@
-from django.db.models import JSONField
+from django.contrib.postgres.fields import DateTimeRangeField
+from django.db import models
+from django.db.models import Expression, JSONField
 
 
 class CleaningJsonField(JSONField):
@@ -12,3 +14,43 @@ class CleaningJsonField(JSONField):
             if callable(getattr(validator, 'clean', None)):
                 value = validator.clean(value)
         return value
+
+
+class DatabaseDefault(Expression):
+    """
+    The DEFAULT keyword of INSERT and UPDATE statements.
+    """
+    def as_sql(self, compiler, connection):
+        return ("DEFAULT", [])
+
+
+class GeneratedRangeField(DateTimeRangeField):
+    """
+    Time range column which is generated by the database.
+
+    The column is defined as GENERATED ALWAYS AS (...) STORED in the
+    migrations, so Django always writes DEFAULT to it and reads the
+    generated value back when inserting.  After an update the value of
+    the model instance is stale until it is refreshed from the database.
+    """
+    generated = True
+    db_returning = True
+
+    def pre_save(self, model_instance, add):
+        return DatabaseDefault()
+
+
+class TransactionIdField(models.BigIntegerField):
+    """
+    Id of the transaction which last wrote the row.
+
+    The column is set by a trigger of the database, see the migration
+    0073, so that the rows can be read in the commit order of their
+    transactions.  Like with GeneratedRangeField, Django always writes
+    DEFAULT to it and the value of an updated model instance is stale.
+    """
+    generated = True
+    db_returning = True
+
+    def pre_save(self, model_instance, add):
+        return DatabaseDefault()
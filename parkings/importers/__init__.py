@@ -1,9 +1,12 @@
 from .geojson_parking_areas import ParkingAreaImporter
 from .geojson_payment_zones import PaymentZoneImporter
 from .geojson_permit_areas import PermitAreaImporter
+from .permits import PermitImporter, PermitImportResult
 
 __all__ = [
     'ParkingAreaImporter',
     'PermitAreaImporter',
     'PaymentZoneImporter',
+    'PermitImporter',
+    'PermitImportResult',
 ]
@@ -0,0 +1,378 @@
+"""
+Streaming import of permits from NDJSON.
+
+Each line of the input is a JSON object of a permit with the same
+fields as in the permit API: "external_id", "subjects", "areas",
+"properties" and, unless the domain is forced, "domain".  The series
+of the permits is given to the importer.
+
+The lines are validated one by one and the valid rows are streamed to a
+temporary staging table with COPY, so that the memory use does not
+depend on the size of the input.  The permits and their subject, area
+and lookup items are then created from the staging tables with a few
+set based statements.
+
+The import is all or nothing: if any line is invalid, nothing is
+created and the errors are reported by line number.
+"""
+import collections
+import json
+
+from django.core.exceptions import ValidationError
+from django.db import connections, router, transaction
+from django.db.models.expressions import RawSQL
+from django.utils.translation import gettext as _
+
+from ..lookups.permits import permit_index
+from ..lookups.plates import plate_filter
+from ..lookups.verdicts import verdict_cache
+from ..models import (
+    EnforcementDomain, Permit, PermitArea, PermitAreaItem, PermitLookupItem,
+    PermitLookupItemChange, PermitSubjectItem)
+from ..models.utils import normalize_reg_num
+
+MAX_REPORTED_ERRORS = 100
+
+NON_FIELD_ERRORS = 'non_field_errors'
+
+PermitImportResult = collections.namedtuple(
+    'PermitImportResult', ['created', 'errors', 'error_count'])
+
+STAGING_COLUMNS = [
+    'line', 'domain_id', 'external_id', 'subjects', 'areas', 'properties',
+    'reg_nums']
+
+CREATE_STAGING_TABLE_SQL = """
+CREATE TEMPORARY TABLE permit_import (
+    line integer NOT NULL,
+    domain_id integer NOT NULL,
+    external_id varchar(50),
+    subjects jsonb NOT NULL,
+    areas jsonb NOT NULL,
+    properties jsonb,
+    reg_nums jsonb NOT NULL,
+    permit_id integer
+) ON COMMIT DROP
+"""
+
+DUPLICATE_EXTERNAL_IDS_SQL = """
+SELECT pi.line FROM permit_import AS pi
+WHERE pi.external_id IS NOT NULL AND (
+    EXISTS (
+        SELECT 1 FROM permit_import AS other
+        WHERE other.external_id = pi.external_id AND other.line < pi.line)
+    OR EXISTS (
+        SELECT 1 FROM {permit_table} AS pe
+        WHERE pe.series_id = %(series)s AND pe.external_id = pi.external_id))
+ORDER BY pi.line
+"""
+
+LOAD_SQL_STATEMENTS = [
+    # Allocate the permit ids in the order of the lines
+    """
+    UPDATE permit_import AS pi SET permit_id = allocated.id
+    FROM (
+        SELECT line, nextval(pg_get_serial_sequence('{permit_table}', 'id'))
+        FROM (SELECT line FROM permit_import ORDER BY line) AS ordered
+    ) AS allocated (line, id)
+    WHERE allocated.line = pi.line
+    """,
+    """
+    INSERT INTO {permit_table} (
+        id, created_at, modified_at, domain_id, series_id, external_id,
+        subjects, areas, properties)
+    SELECT
+        permit_id, now(), now(), domain_id, %(series)s, external_id,
+        subjects, areas, properties
+    FROM permit_import
+    """,
+    """
+    CREATE TEMPORARY TABLE permit_import_subject ON COMMIT DROP AS
+    SELECT
+        nextval(pg_get_serial_sequence('{subject_table}', 'id')) AS id,
+        pi.permit_id,
+        pi.domain_id,
+        subject.value->>'registration_number' AS registration_number,
+        pi.reg_nums->>(subject.n - 1)::integer AS normalized_reg_num,
+        (subject.value->>'start_time')::timestamptz AS start_time,
+        (subject.value->>'end_time')::timestamptz AS end_time
+    FROM permit_import AS pi
+    CROSS JOIN LATERAL jsonb_array_elements(pi.subjects)
+        WITH ORDINALITY AS subject (value, n)
+    """,
+    """
+    CREATE TEMPORARY TABLE permit_import_area ON COMMIT DROP AS
+    SELECT
+        nextval(pg_get_serial_sequence('{area_item_table}', 'id')) AS id,
+        pi.permit_id,
+        pa.id AS area_id,
+        (area.value->>'start_time')::timestamptz AS start_time,
+        (area.value->>'end_time')::timestamptz AS end_time
+    FROM permit_import AS pi
+    CROSS JOIN LATERAL jsonb_array_elements(pi.areas) AS area (value)
+    JOIN {area_table} AS pa
+      ON pa.domain_id = pi.domain_id
+     AND pa.identifier = area.value->>'area'
+    """,
+    """
+    INSERT INTO {subject_table} (
+        id, permit_id, registration_number, start_time, end_time)
+    SELECT id, permit_id, registration_number, start_time, end_time
+    FROM permit_import_subject
+    """,
+    """
+    INSERT INTO {area_item_table} (
+        id, permit_id, area_id, start_time, end_time)
+    SELECT id, permit_id, area_id, start_time, end_time
+    FROM permit_import_area
+    """,
+    # Same as Permit._make_lookup_items: the intersections of the
+    # subject and area items of each permit
+    """
+    INSERT INTO {lookup_item_table} (
+        permit_id, subject_item_id, area_item_id, registration_number,
+        area_id, start_time, end_time, domain_id, is_active)
+    SELECT
+        su.permit_id, su.id, ar.id, su.normalized_reg_num,
+        ar.area_id, GREATEST(su.start_time, ar.start_time),
+        LEAST(su.end_time, ar.end_time), su.domain_id, %(active)s
+    FROM permit_import_subject AS su
+    JOIN permit_import_area AS ar ON ar.permit_id = su.permit_id
+    WHERE GREATEST(su.start_time, ar.start_time)
+       <= LEAST(su.end_time, ar.end_time)
+    """,
+]
+
+
+class PermitImporter:
+    """
+    Importer of permits from NDJSON lines to a permit series.
+    """
+
+    def __init__(self, series, user, domain=None):
+        """
+        Initialize the importer.
+
+        :type series: parkings.models.PermitSeries
+        :type user: django.contrib.auth.models.User
+        :param user: User whose permit areas are allowed
+        :type domain: parkings.models.EnforcementDomain|None
+        :param domain: Domain of all the permits, or None if the domain
+          is given by the code in the "domain" field of each line
+        """
+        self.series = series
+        self.user = user
+        self.domain = domain
+        self.using = router.db_for_write(Permit)
+        self._errors = []
+        self._error_count = 0
+        self._domain_ids = None
+        self._area_ids = {}
+
+    def import_permits(self, lines):
+        """
+        Import the permits of given NDJSON lines.
+
+        :type lines: Iterable[bytes|str]
+        :rtype: PermitImportResult
+        """
+        connection = connections[self.using]
+        with transaction.atomic(using=self.using):
+            with connection.cursor() as cursor:
+                cursor.execute(CREATE_STAGING_TABLE_SQL)
+                cursor.copy_expert(
+                    'COPY permit_import ({}) FROM STDIN'.format(
+                        ', '.join(STAGING_COLUMNS)),
+                    _IterableReader(self._generate_staging_rows(lines)))
+                cursor.execute('ANALYZE permit_import')
+                self._check_external_ids(cursor)
+                if self._error_count:
+                    transaction.set_rollback(True, using=self.using)
+                    return PermitImportResult(
+                        0, sorted(self._errors, key=(lambda x: x['line'])),
+                        self._error_count)
+                created = self._load(cursor)
+            if created and self.series.active:
+                transaction.on_commit(verdict_cache.invalidate_all)
+                transaction.on_commit(permit_index.invalidate)
+                transaction.on_commit(plate_filter.invalidate)
+        return PermitImportResult(created, [], 0)
+
+    def _generate_staging_rows(self, lines):
+        for (line_number, line) in enumerate(lines, 1):
+            if not line.strip():
+                continue
+            try:
+                row = self._clean_line(line)
+            except ValidationError as error:
+                self._add_error(line_number, error.message_dict)
+                continue
+            if not self._error_count:  # No need to stage after errors
+                yield _format_copy_row([line_number] + row)
+
+    def _clean_line(self, line):
+        (domain_id, cleaned) = self._clean_data(_parse_json_object(line))
+        reg_nums = [
+            normalize_reg_num(x['registration_number'])
+            for x in cleaned['subjects']]
+        properties = cleaned['properties']
+        return [
+            domain_id,
+            cleaned['external_id'],
+            json.dumps(cleaned['subjects']),
+            json.dumps(cleaned['areas']),
+            json.dumps(properties) if properties is not None else None,
+            json.dumps(reg_nums),
+        ]
+
+    def _clean_data(self, data):
+        errors = {}
+        cleaned = {}
+        for name in ['external_id', 'subjects', 'areas', 'properties']:
+            try:
+                cleaned[name] = self._clean_field(name, data)
+            except ValidationError as error:
+                errors[name] = error.messages
+        domain_id = None
+        try:
+            domain_id = self._clean_domain(data)
+            if 'areas' in cleaned:
+                self._validate_areas(domain_id, cleaned['areas'])
+        except ValidationError as error:
+            errors['domain' if domain_id is None else 'areas'] = (
+                error.messages)
+        if errors:
+            raise ValidationError(errors)
+        return (domain_id, cleaned)
+
+    def _clean_field(self, name, data):
+        field = Permit._meta.get_field(name)
+        if name not in data:
+            if not field.null:
+                raise ValidationError(_("This field is required."))
+            return None
+        return field.clean(data[name], None)
+
+    def _clean_domain(self, data):
+        if self.domain is not None:
+            if 'domain' in data:
+                raise ValidationError(_("Not allowed"))
+            return self.domain.pk
+        code = data.get('domain')
+        if code is None:
+            raise ValidationError(_("This field is required."))
+        if self._domain_ids is None:
+            self._domain_ids = dict(
+                EnforcementDomain.objects.using(self.using)
+                .values_list('code', 'id'))
+        domain_id = self._domain_ids.get(code)
+        if domain_id is None:
+            raise ValidationError(
+                _("Object with code={} does not exist.").format(code))
+        return domain_id
+
+    def _validate_areas(self, domain_id, areas):
+        if domain_id not in self._area_ids:
+            self._area_ids[domain_id] = set(
+                PermitArea.objects.using(self.using)
+                .for_user(self.user)
+                .filter(domain=domain_id)
+                .values_list('identifier', flat=True))
+        unknown_areas = sorted(
+            {x['area'] for x in areas} - self._area_ids[domain_id])
+        if unknown_areas:
+            raise ValidationError(_("Unknown identifiers: {}").format(
+                ', '.join(unknown_areas)))
+
+    def _check_external_ids(self, cursor):
+        if self._error_count:
+            return
+        cursor.execute('CREATE INDEX ON permit_import (external_id)')
+        cursor.execute(
+            DUPLICATE_EXTERNAL_IDS_SQL.format(**self._get_table_names()),
+            {'series': self.series.pk})
+        for (line_number,) in iter(cursor.fetchone, None):
+            self._add_error(line_number, {
+                'external_id': [_("Duplicate external id")]})
+
+    def _add_error(self, line_number, errors):
+        self._error_count += 1
+        if len(self._errors) < MAX_REPORTED_ERRORS:
+            self._errors.append({'line': line_number, 'errors': errors})
+
+    def _load(self, cursor):
+        table_names = self._get_table_names()
+        params = {'series': self.series.pk, 'active': self.series.active}
+        cursor.execute('SELECT count(*) FROM permit_import')
+        [created] = cursor.fetchone()
+        if not created:
+            cursor.execute('DROP TABLE permit_import')
+            return 0
+        for sql in LOAD_SQL_STATEMENTS:
+            cursor.execute(sql.format(**table_names), params)
+        (PermitLookupItem.objects.using(self.using)
+         .filter(permit__in=RawSQL('SELECT permit_id FROM permit_import', []))
+         .record_changes(PermitLookupItemChange.ADDED))
+        cursor.execute(
+            'DROP TABLE permit_import, permit_import_subject, '
+            'permit_import_area')
+        return created
+
+    def _get_table_names(self):
+        quote = connections[self.using].ops.quote_name
+        return {
+            'permit_table': quote(Permit._meta.db_table),
+            'subject_table': quote(PermitSubjectItem._meta.db_table),
+            'area_item_table': quote(PermitAreaItem._meta.db_table),
+            'area_table': quote(PermitArea._meta.db_table),
+            'lookup_item_table': quote(PermitLookupItem._meta.db_table),
+        }
+
+
+class _IterableReader:
+    """
+    File-like reader of an iterable of strings for COPY FROM.
+    """
+
+    def __init__(self, chunks):
+        self._chunks = iter(chunks)
+        self._buffer = ''
+
+    def read(self, size=-1):
+        while size < 0 or len(self._buffer) < size:
+            chunk = next(self._chunks, None)
+            if chunk is None:
+                break
+            self._buffer += chunk
+        if size < 0:
+            (result, self._buffer) = (self._buffer, '')
+        else:
+            (result, self._buffer) = (
+                self._buffer[:size], self._buffer[size:])
+        return result
+
+
+def _parse_json_object(line):
+    try:
+        data = json.loads(line)
+    except ValueError:
+        raise ValidationError({NON_FIELD_ERRORS: [_("Invalid JSON")]})
+    if not isinstance(data, dict):
+        raise ValidationError(
+            {NON_FIELD_ERRORS: [_("Expected a JSON object")]})
+    return data
+
+
+def _format_copy_row(values):
+    return '\t'.join(_format_copy_value(x) for x in values) + '\n'
+
+
+def _format_copy_value(value):
+    if value is None:
+        return '\\N'
+    return (
+        str(value)
+        .replace('\\', '\\\\')
+        .replace('\t', '\\t')
+        .replace('\n', '\\n')
+        .replace('\r', '\\r'))
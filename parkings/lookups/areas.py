@@ -0,0 +1,110 @@
+"""
+In-process lookup of payment zones and permit areas by location.
+
+Saving or deleting a payment zone or a permit area invalidates the
+index of all workers through a version token in the Django cache.
+With a cache which is not shared by the worker processes, such as the
+default local memory cache, the other workers see the change only when
+they rebuild their index after PARKKIHUBI_AREA_INDEX_MAX_AGE.
+"""
+import datetime
+import time as time_module
+
+from django.conf import settings
+
+from ..models import PaymentZone, PermitArea
+from .base import WorkerIndex
+
+
+class _PolygonIndex:
+    """
+    Prepared polygons of a domain filtered by their bounding boxes.
+
+    The polygons are kept in the order in which the first containing
+    polygon should be returned.  A domain has only some dozens of
+    polygons, so a flat list of bounding boxes is enough for pruning
+    the candidates before the exact test with the prepared geometry.
+    """
+    def __init__(self, items):
+        self._entries = [
+            (geom.extent, geom.prepared, value)
+            for (geom, value) in items
+        ]
+
+    def find(self, point):
+        (x, y) = (point.x, point.y)
+        for ((xmin, ymin, xmax, ymax), prepared, value) in self._entries:
+            if xmin <= x <= xmax and ymin <= y <= ymax:
+                if prepared.contains(point):
+                    return value
+        return None
+
+
+class _DomainAreas:
+    def __init__(self, zones, areas):
+        self.zones = zones
+        self.areas = areas
+        self.built_at = time_module.monotonic()
+
+
+class AreaIndex(WorkerIndex):
+    name = "areas"
+
+    def build(self, domain):
+        zones = (
+            PaymentZone.objects
+            .filter(domain=domain)
+            .order_by("-number")
+            .values_list("geom", "number"))
+        areas = PermitArea.objects.filter(domain=domain).order_by("identifier")
+        return _DomainAreas(
+            _PolygonIndex(zones),
+            _PolygonIndex((area.geom, area) for area in areas))
+
+    def get(self, domain):
+        data = super().get(domain)
+        if time_module.monotonic() - data.built_at >= _get_max_age():
+            with self._lock:
+                if self._data_by_domain.get(domain.pk) is data:
+                    del self._data_by_domain[domain.pk]
+            return super().get(domain)
+        return data
+
+    def get_payment_zone(self, location, domain):
+        """
+        Get number of the payment zone containing given location.
+
+        If there are several zones containing the location, then the
+        one with the highest number is returned.
+
+        :type location: django.contrib.gis.geos.Point  # in GK25-FIN
+        :type domain: parkings.models.EnforcementDomain
+        :rtype: int|None
+        """
+        zones = self.get(domain).zones
+        # Prepared geometries build their internal index lazily and
+        # are therefore not safe to use from several threads at once
+        with self._lock:
+            return zones.find(location)
+
+    def get_permit_area(self, location, domain):
+        """
+        Get the permit area containing given location.
+
+        :type location: django.contrib.gis.geos.Point  # in GK25-FIN
+        :type domain: parkings.models.EnforcementDomain
+        :rtype: parkings.models.PermitArea|None
+        """
+        areas = self.get(domain).areas
+        with self._lock:
+            return areas.find(location)
+
+
+def _get_max_age(default=datetime.timedelta(minutes=5)):
+    value = getattr(settings, "PARKKIHUBI_AREA_INDEX_MAX_AGE", None)
+    result = value if value is not None else default
+    assert isinstance(result, datetime.timedelta)
+    return result.total_seconds()
+
+
+area_index = AreaIndex()
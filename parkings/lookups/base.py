@@ -0,0 +1,167 @@
+import datetime
+import threading
+import time
+import uuid
+
+from django.conf import settings
+from django.core.cache import cache, caches
+from django.core.cache.backends.dummy import DummyCache
+from django.core.cache.backends.locmem import LocMemCache
+from django.core.exceptions import ImproperlyConfigured
+from django.db import connections
+
+
+class WorkerIndex:
+    """
+    Lookup structure which is kept in the memory of a worker process.
+
+    The structure is built lazily per enforcement domain with the
+    `build` method, which subclasses must implement.
+
+    Invalidation happens in two levels: The `invalidate` method drops
+    the structures of the current worker immediately and stores a new
+    version token to the Django cache.  Other workers notice the new
+    version token when they next check it, which is done at most once
+    per PARKKIHUBI_WORKER_INDEX_CHECK_INTERVAL.  The version token
+    reaches the other worker processes only through a shared cache
+    backend, see `is_cache_shared`.
+
+    The structures can be built synchronously with `get` or in a
+    background thread with `get_if_built` and `start_rebuild`.
+    """
+    name = None
+
+    def __init__(self):
+        assert self.name, "WorkerIndex subclasses must define a name"
+        self._lock = threading.RLock()
+        self._data_by_domain = {}
+        self._version = None
+        self._version_checked_at = None
+        self._builders = {}
+
+    def build(self, domain):
+        """
+        Build the lookup structure for given domain.
+
+        :type domain: parkings.models.EnforcementDomain
+        """
+        raise NotImplementedError()
+
+    def get(self, domain):
+        self._check_version()
+        data = self._data_by_domain.get(domain.pk)
+        if data is None:
+            with self._lock:
+                data = self._data_by_domain.get(domain.pk)
+                if data is None:
+                    data = self.build(domain)
+                    self._data_by_domain[domain.pk] = data
+        return data
+
+    def get_if_built(self, domain):
+        """
+        Get the structure of given domain if it has been built.
+
+        Otherwise start building it in the background and return None.
+
+        :type domain: parkings.models.EnforcementDomain
+        """
+        self._check_version()
+        data = self._data_by_domain.get(domain.pk)
+        if data is None:
+            self.start_rebuild(domain)
+        return data
+
+    def start_rebuild(self, domain):
+        """
+        Start building the structure of given domain in the background.
+
+        The current structure, if any, is used until the new one is
+        ready.
+
+        :type domain: parkings.models.EnforcementDomain
+        """
+        with self._lock:
+            if domain.pk in self._builders:
+                return
+            builder = threading.Thread(
+                target=self._run_builder, args=(domain, self._data_by_domain),
+                name="{}-index-builder".format(self.name), daemon=True)
+            self._builders[domain.pk] = builder
+        builder.start()
+
+    def invalidate(self):
+        """
+        Invalidate the structures of all workers.
+        """
+        with self._lock:
+            self._version = uuid.uuid4().hex
+            self._version_checked_at = time.monotonic()
+            cache.set(self._get_version_cache_key(), self._version, None)
+            self._data_by_domain = {}
+
+    def clear(self):
+        """
+        Drop the structures of the current worker.
+        """
+        with self._lock:
+            self._version = None
+            self._version_checked_at = None
+            self._data_by_domain = {}
+
+    def _check_version(self):
+        now = time.monotonic()
+        last_checked = self._version_checked_at
+        if last_checked is not None and now - last_checked < _get_check_interval():
+            return
+        version = cache.get(self._get_version_cache_key())
+        with self._lock:
+            if version != self._version:
+                self._data_by_domain = {}
+                self._version = version
+            self._version_checked_at = now
+
+    def _run_builder(self, domain, data_by_domain):
+        try:
+            data = self.build(domain)
+            with self._lock:
+                # Drop the result if the index was invalidated meanwhile,
+                # since the invalidation replaces the whole dictionary
+                if self._data_by_domain is data_by_domain:
+                    data_by_domain[domain.pk] = data
+        finally:
+            with self._lock:
+                self._builders.pop(domain.pk, None)
+            connections.close_all()
+
+    def _get_version_cache_key(self):
+        return "parkkihubi:worker-index-version:{}".format(self.name)
+
+
+def is_cache_shared():
+    """
+    Check if the default cache is shared by the worker processes.
+
+    The local memory and dummy caches are per process, so the version
+    tokens and marks stored to them never reach the other workers.
+    """
+    return not isinstance(caches["default"], (LocMemCache, DummyCache))
+
+
+def require_shared_cache(setting_name):
+    """
+    Refuse a setting which needs a cache shared by the workers.
+
+    :type setting_name: str
+    :raises ImproperlyConfigured: if the default cache is not shared
+    """
+    if not is_cache_shared():
+        raise ImproperlyConfigured(
+            "{} requires a cache backend shared by the worker processes, "
+            "e.g. Redis or Memcached, in CACHES".format(setting_name))
+
+
+def _get_check_interval(default=datetime.timedelta(seconds=10)):
+    value = getattr(settings, "PARKKIHUBI_WORKER_INDEX_CHECK_INTERVAL", None)
+    assert value is None or isinstance(value, datetime.timedelta)
+    return (value if value is not None else default).total_seconds()
@@ -0,0 +1,235 @@
+"""
+Offline enforcement bundles.
+
+A bundle is a compact snapshot of the rights of an enforcement domain
+for the enforcement devices which have to check registration numbers
+without a network connection.  It contains the parkings, event
+parkings and active permit lookup items which are valid or have ended
+at most the grace duration before the bundle was built, including the
+permit items which start later.
+
+The bundles are stored to the Django cache for
+PARKKIHUBI_ENFORCEMENT_BUNDLE_MAX_AGE and built on demand when missing.
+They can also be pre-generated with the generate_enforcement_bundles
+management command.
+
+The bundle is a gzip compressed binary of little-endian values:
+
+    Header:
+        4s  magic b"PKHB"
+        B   format version (1)
+        I   generation time (Unix time)
+        I   grace duration in seconds
+        I   number of registration numbers
+        H   number of permit areas
+    Permit areas, for each:
+        B   length of the identifier
+        *s  identifier (UTF-8)
+    Registration numbers in sorted order, for each:
+        B   length of the normalized registration number
+        *s  normalized registration number (UTF-8)
+        H   number of rights
+        Rights, for each:
+            B   kind: 0 parking, 1 permit, 2 event parking
+            i   zone number of a parking or index of the permit area of
+                a permit, -1 if none
+            I   start time (Unix time), 0 if before 1970
+            I   end time (Unix time), 0xFFFFFFFF if open-ended or after
+                the range of the field (2106-02-07)
+"""
+import collections
+import datetime
+import gzip
+import hashlib
+import math
+import struct
+
+from django.conf import settings
+from django.core.cache import cache
+from django.utils import timezone
+
+from ..api.enforcement.utils import get_grace_duration
+from ..models import EventParking, Parking, PermitLookupItem
+
+MAGIC = b"PKHB"
+VERSION = 1
+OPEN_END = 0xFFFFFFFF
+NO_REFERENCE = -1
+
+PARKING = 0
+PERMIT = 1
+EVENT_PARKING = 2
+
+_HEADER = struct.Struct("<4sBIIIH")
+_RIGHT = struct.Struct("<BiII")
+_COUNT = struct.Struct("<H")
+
+Bundle = collections.namedtuple("Bundle", ["data", "etag", "generated_at"])
+
+
+class BundleStore:
+    def get(self, domain):
+        """
+        Get the bundle of given domain from the cache or build it.
+
+        :type domain: parkings.models.EnforcementDomain
+        :rtype: Bundle
+        """
+        bundle = cache.get(_get_key(domain.pk))
+        if bundle is None:
+            bundle = self.refresh(domain)
+        return bundle
+
+    def refresh(self, domain):
+        """
+        Build the bundle of given domain and store it to the cache.
+
+        :type domain: parkings.models.EnforcementDomain
+        :rtype: Bundle
+        """
+        bundle = build_bundle(domain)
+        cache.set(_get_key(domain.pk), bundle, _get_max_age().total_seconds())
+        return bundle
+
+
+def build_bundle(domain, now=None):
+    """
+    Build the bundle of given domain.
+
+    :type domain: parkings.models.EnforcementDomain
+    :type now: datetime.datetime|None
+    :rtype: Bundle
+    """
+    now = now or timezone.now()
+    grace_duration = get_grace_duration()
+    horizon = now - grace_duration
+    parkings = (
+        Parking.objects
+        .filter(domain=domain)
+        .exclude(normalized_reg_num="")
+        .ends_after(horizon)
+        .values_list(
+            "normalized_reg_num", "zone__number", "time_start", "time_end"))
+    event_parkings = (
+        EventParking.objects
+        .filter(domain=domain)
+        .exclude(normalized_reg_num="")
+        .ends_after(horizon)
+        .values_list("normalized_reg_num", "time_start", "time_end"))
+    permit_items = (
+        PermitLookupItem.objects
+        .active()
+        .filter(domain=domain, end_time__gte=horizon)
+        .exclude(registration_number="")
+        .values_list(
+            "registration_number", "area__identifier",
+            "start_time", "end_time"))
+
+    areas = {}
+    rights = {}
+    for (reg_num, zone, start, end) in parkings.order_by():
+        rights.setdefault(reg_num, []).append(_RIGHT.pack(
+            PARKING, _or_no_reference(zone), *_get_interval(start, end)))
+    for (reg_num, area, start, end) in permit_items.order_by():
+        area_index = (
+            areas.setdefault(area, len(areas)) if area is not None else None)
+        rights.setdefault(reg_num, []).append(_RIGHT.pack(
+            PERMIT, _or_no_reference(area_index), *_get_interval(start, end)))
+    for (reg_num, start, end) in event_parkings.order_by():
+        rights.setdefault(reg_num, []).append(_RIGHT.pack(
+            EVENT_PARKING, NO_REFERENCE, *_get_interval(start, end)))
+
+    payload = b"".join(
+        [_pack_string(area) for area in areas] + [
+            _pack_string(reg_num) + _COUNT.pack(len(rights[reg_num])) +
+            b"".join(sorted(rights[reg_num]))
+            for reg_num in sorted(rights)])
+    grace_seconds = int(grace_duration.total_seconds())
+    header = _HEADER.pack(
+        MAGIC, VERSION, int(now.timestamp()), grace_seconds,
+        len(rights), len(areas))
+    # The ETag does not depend on the generation time, so that rebuilding
+    # the bundle without changes in the rights keeps it the same
+    digest = hashlib.sha256(header[:5] + header[9:] + payload)
+    return Bundle(
+        data=gzip.compress(header + payload, mtime=0),
+        etag='"{}"'.format(digest.hexdigest()[:32]),
+        generated_at=now)
+
+
+def parse_bundle(data):
+    """
+    Parse a bundle to a dictionary.
+
+    This is the reference implementation of reading the bundle format.
+
+    :type data: bytes
+    :param data: The gzip compressed bundle
+    :rtype: dict
+    """
+    data = gzip.decompress(data)
+    (magic, version, generated_at, grace_seconds, plate_count, area_count) = (
+        _HEADER.unpack_from(data))
+    if magic != MAGIC or version != VERSION:
+        raise ValueError("Unsupported bundle format")
+    offset = _HEADER.size
+    areas = []
+    for _n in range(area_count):
+        (area, offset) = _unpack_string(data, offset)
+        areas.append(area)
+    rights = {}
+    for _n in range(plate_count):
+        (reg_num, offset) = _unpack_string(data, offset)
+        (count,) = _COUNT.unpack_from(data, offset)
+        offset += _COUNT.size
+        rights[reg_num] = [
+            _RIGHT.unpack_from(data, offset + n * _RIGHT.size)
+            for n in range(count)]
+        offset += count * _RIGHT.size
+    return {
+        "generated_at": datetime.datetime.fromtimestamp(
+            generated_at, datetime.timezone.utc),
+        "grace_duration": datetime.timedelta(seconds=grace_seconds),
+        "areas": areas,
+        "rights": rights,
+    }
+
+
+def _get_interval(start, end):
+    # Clamp the times to the range of the unsigned 32-bit fields, e.g.
+    # for permits ending at 2999-12-31 to mark indefinite validity
+    start_time = int(start.timestamp())
+    end_time = math.ceil(end.timestamp()) if end is not None else OPEN_END
+    return (_clamp_time(start_time), _clamp_time(end_time))
+
+
+def _clamp_time(value):
+    return min(max(value, 0), OPEN_END)
+
+
+def _or_no_reference(value):
+    return value if value is not None else NO_REFERENCE
+
+
+def _pack_string(value):
+    encoded = value.encode("utf-8")
+    return struct.pack("<B", len(encoded)) + encoded
+
+
+def _unpack_string(data, offset):
+    length = data[offset]
+    start = offset + 1
+    return (data[start:start + length].decode("utf-8"), start + length)
+
+
+def _get_key(domain_id):
+    return "parkkihubi:enforcement-bundle:{}".format(domain_id)
+
+
+def _get_max_age(default=datetime.timedelta(minutes=5)):
+    value = getattr(settings, "PARKKIHUBI_ENFORCEMENT_BUNDLE_MAX_AGE", None)
+    assert value is None or isinstance(value, datetime.timedelta)
+    return value if value is not None else default
+
+
+bundle_store = BundleStore()
@@ -0,0 +1,212 @@
+"""
+In-process index of the currently valid parkings.
+
+The index of a domain contains the parkings which are valid or have
+ended at most the grace duration before the index was built.  It is
+kept current with the save and delete signals of the worker itself and
+with a periodic catch-up query of the parkings written by the other
+workers.  The catch-up is done at most once per
+PARKKIHUBI_HOT_PARKING_INDEX_CATCH_UP_INTERVAL and it reads the
+parkings by the ids of the transactions which wrote them: each query
+re-reads the parkings of the transactions which were still in progress
+at the previous one, so that also the transactions which were committed
+late are seen.  The index is rebuilt from scratch in a background
+thread once per PARKKIHUBI_HOT_PARKING_INDEX_REBUILD_INTERVAL, which
+also drops the parkings which have ended.
+
+Deleting a parking which may still be valid invalidates the index of
+all workers, since the catch-up cannot see deletions.
+
+The index is used only if enabled with the PARKKIHUBI_HOT_PARKING_INDEX
+setting.  It requires a cache backend shared by the worker processes,
+since the other workers learn about the deletions only through the
+version token in the cache.  Lookups for times before the index was built and lookups
+while it is being built return None, so that the caller can fall back
+to a database query.
+"""
+import datetime
+import time as time_module
+
+from django.conf import settings
+from django.utils import timezone
+
+from ..api.enforcement.utils import get_grace_duration
+from ..models import Parking
+from .base import WorkerIndex, require_shared_cache
+
+INDEXED_FIELDS = (
+    "id", "normalized_reg_num", "time_start", "time_end", "zone__number")
+
+
+class _DomainParkings:
+    def __init__(self, rows, horizon, caught_up_to):
+        self.horizon = horizon
+        self.caught_up_to = caught_up_to
+        self.built_at = time_module.monotonic()
+        self.checked_at = self.built_at
+        self._entries_by_reg_num = {}
+        self._reg_num_by_id = {}
+        for row in rows:
+            self.put(*row)
+
+    def put(self, id, reg_num, time_start, time_end, zone_number):
+        self.remove(id)
+        entries = self._entries_by_reg_num.setdefault(reg_num, {})
+        entries[id] = (time_start, time_end, zone_number)
+        self._reg_num_by_id[id] = reg_num
+
+    def remove(self, id):
+        reg_num = self._reg_num_by_id.pop(id, None)
+        if reg_num is not None:
+            entries = self._entries_by_reg_num[reg_num]
+            del entries[id]
+            if not entries:
+                del self._entries_by_reg_num[reg_num]
+
+    def find(self, reg_num, starts_before, ends_after):
+        return [
+            (id, time_start, time_end, zone_number)
+            for (id, (time_start, time_end, zone_number))
+            in self._entries_by_reg_num.get(reg_num, {}).items()
+            if time_start <= starts_before and (
+                time_end is None or time_end >= ends_after)
+        ]
+
+
+class HotParkingIndex(WorkerIndex):
+    name = "hot-parkings"
+
+    @property
+    def enabled(self):
+        if not getattr(settings, "PARKKIHUBI_HOT_PARKING_INDEX", False):
+            return False
+        require_shared_cache("PARKKIHUBI_HOT_PARKING_INDEX")
+        return True
+
+    def build(self, domain):
+        parkings = Parking.objects.filter(domain=domain)
+        # Take the transaction horizon before reading the parkings, so
+        # that the first catch-up reads what is committed meanwhile
+        caught_up_to = parkings.get_horizon()
+        horizon = timezone.now() - get_grace_duration()
+        rows = parkings.ends_after(horizon).values_list(*INDEXED_FIELDS)
+        return _DomainParkings(rows, horizon, caught_up_to)
+
+    def get_current(self, domain):
+        """
+        Get the index of given domain if it has been built.
+
+        Start rebuilding the index in the background if it is missing
+        or older than the rebuild interval and catch up the changes of
+        the other workers if the catch-up interval has passed.
+
+        :type domain: parkings.models.EnforcementDomain
+        :rtype: _DomainParkings|None
+        """
+        data = self.get_if_built(domain)
+        if data is None:
+            return None
+        now = time_module.monotonic()
+        if now - data.built_at >= _get_seconds("REBUILD_INTERVAL"):
+            self.start_rebuild(domain)
+        if now - data.checked_at >= _get_seconds("CATCH_UP_INTERVAL"):
+            self._catch_up(domain, data)
+        return data
+
+    def find(self, domain, reg_num, starts_before, ends_after):
+        """
+        Find parkings overlapping given time range.
+
+        Return the parkings of given normalized registration number
+        which start at or before `starts_before` and end at or after
+        `ends_after` as (id, time_start, time_end, zone_number) tuples.
+
+        Return None if the index is not enabled, not yet built or it
+        does not cover the given time range.
+
+        :type domain: parkings.models.EnforcementDomain
+        :type reg_num: str
+        :type starts_before: datetime.datetime
+        :type ends_after: datetime.datetime
+        :rtype: list[tuple]|None
+        """
+        if not self.enabled:
+            return None
+        data = self.get_current(domain)
+        if data is None or ends_after < data.horizon:
+            return None
+        with self._lock:
+            return data.find(reg_num, starts_before, ends_after)
+
+    def put(self, parking):
+        """
+        Add or update a saved parking in the index of this worker.
+
+        :type parking: parkings.models.Parking
+        """
+        data = self._data_by_domain.get(parking.domain_id)
+        if data is None:
+            return
+        row = (
+            parking.id, parking.normalized_reg_num,
+            parking.time_start, parking.time_end,
+            parking.zone.number if parking.zone_id else None)
+        with self._lock:
+            data.put(*row)
+
+    def remove(self, parking):
+        """
+        Remove a deleted parking from the index.
+
+        Call this after the deleting transaction is committed.  If the
+        parking may still be valid, the indexes of all workers are
+        invalidated.
+
+        :type parking: parkings.models.Parking
+        """
+        data = self._data_by_domain.get(parking.domain_id)
+        if data is not None:
+            with self._lock:
+                data.remove(parking.id)
+        ended_long_ago = (
+            parking.time_end is not None and
+            parking.time_end < timezone.now() - get_grace_duration())
+        if not ended_long_ago:
+            self.invalidate()
+
+    def _catch_up(self, domain, data):
+        with self._lock:
+            now = time_module.monotonic()
+            if now - data.checked_at < _get_seconds("CATCH_UP_INTERVAL"):
+                return  # Another thread is doing it already
+            data.checked_at = now
+        parkings = Parking.objects.filter(domain=domain)
+        caught_up_to = parkings.get_horizon()
+        rows = list(
+            parkings
+            .filter(transaction_id__gte=data.caught_up_to)
+            .values_list(*INDEXED_FIELDS))
+        with self._lock:
+            for row in rows:
+                data.put(*row)
+            data.caught_up_to = caught_up_to
+
+
+_DEFAULTS = {
+    "CATCH_UP_INTERVAL": datetime.timedelta(seconds=2),
+    "REBUILD_INTERVAL": datetime.timedelta(minutes=15),
+}
+
+
+def _get_setting(name):
+    value = getattr(settings, "PARKKIHUBI_HOT_PARKING_INDEX_" + name, None)
+    result = value if value is not None else _DEFAULTS[name]
+    assert isinstance(result, datetime.timedelta)
+    return result
+
+
+def _get_seconds(name):
+    return _get_setting(name).total_seconds()
+
+
+hot_parking_index = HotParkingIndex()
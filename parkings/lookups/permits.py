@@ -0,0 +1,106 @@
+"""
+In-process index of the lookup items of the active permits.
+
+The lookup items of the active permit series of a domain are kept in a
+dictionary keyed by normalized registration number and permit area.
+The items of a registration number and area are sorted by their start
+and end times, so that the first item valid at a given time can be
+found with a binary search.
+
+The index is invalidated when a permit series is activated or when a
+permit of an active series is created, changed or deleted.  A new index
+is then built in a background thread and swapped in when it is ready.
+Until then the lookups return None and the caller should fall back to a
+database query.
+
+The index is used only if enabled with the PARKKIHUBI_PERMIT_INDEX
+setting.  It requires a cache backend shared by the worker processes,
+since the other workers learn about the changes only through the
+version token in the cache.
+"""
+import bisect
+import itertools
+
+from django.conf import settings
+
+from ..models import PermitLookupItem
+from .base import WorkerIndex, require_shared_cache
+
+
+class _AreaItems:
+    def __init__(self, items):
+        self._starts = [start for (start, _end) in items]
+        self._ends = [end for (_start, end) in items]
+        # Running maximum of the end times.  The first item whose end
+        # reaches a time is the first one whose running maximum does.
+        self._max_ends = list(itertools.accumulate(self._ends, max))
+
+    def find(self, time):
+        """
+        Find the end time of the first item valid at given time.
+
+        :type time: datetime.datetime
+        :rtype: datetime.datetime|None
+        """
+        count = bisect.bisect_right(self._starts, time)
+        index = bisect.bisect_left(self._max_ends, time, hi=count)
+        return self._ends[index] if index < count else None
+
+
+_NO_ITEMS = _AreaItems([])
+
+
+class PermitIndex(WorkerIndex):
+    name = "permits"
+
+    @property
+    def enabled(self):
+        if not getattr(settings, "PARKKIHUBI_PERMIT_INDEX", False):
+            return False
+        require_shared_cache("PARKKIHUBI_PERMIT_INDEX")
+        return True
+
+    def build(self, domain):
+        items = (
+            PermitLookupItem.objects
+            .active()
+            .filter(domain=domain)
+            .order_by("start_time", "end_time")
+            .values_list("registration_number", "area", "start_time", "end_time"))
+        items_by_key = {}
+        for (reg_num, area_id, start, end) in items:
+            items_by_key.setdefault((reg_num, area_id), []).append((start, end))
+        return {key: _AreaItems(x) for (key, x) in items_by_key.items()}
+
+    def get_items(self, domain, reg_num, area):
+        """
+        Get the active permit lookup items of a registration number.
+
+        Return None if the index is not enabled or not yet built.  In
+        the latter case start building it in the background.
+
+        :type domain: parkings.models.EnforcementDomain
+        :type reg_num: str  # normalized
+        :type area: parkings.models.PermitArea|None
+        :rtype: _AreaItems|None
+        """
+        if not self.enabled:
+            return None
+        data = self.get_if_built(domain)
+        if data is None:
+            return None
+        if area is None:
+            return _NO_ITEMS
+        return data.get((reg_num, area.pk), _NO_ITEMS)
+
+    def invalidate_for_permits(self, permits):
+        """
+        Invalidate the index if any of given permits is active.
+
+        :type permits: Iterable[parkings.models.Permit]
+        """
+        if self.enabled and any(x.series.active for x in permits):
+            self.invalidate()
+
+
+permit_index = PermitIndex()
@@ -0,0 +1,187 @@
+"""
+Bloom filter of the registration numbers having any rights.
+
+The filter of a domain contains the normalized registration numbers of
+the parkings, event parkings and active permit lookup items which are
+valid or have ended at most the grace duration before the filter was
+built.  A registration number missing from the filter has therefore
+no rights at any time after that, unless one has been added since.
+
+Registration numbers of the rights saved after the build are added to
+the filter of the current worker and marked to the Django cache for
+the other workers, which check the mark only when the number is missing
+from their filter.  The filter is rebuilt from the database once per
+PARKKIHUBI_PLATE_FILTER_REBUILD_INTERVAL and after a permit series is
+activated.
+
+The filter is used only if enabled with the PARKKIHUBI_PLATE_FILTER
+setting.
+"""
+import datetime
+import hashlib
+import math
+import time as time_module
+
+from django.conf import settings
+from django.core.cache import cache
+from django.utils import timezone
+
+from ..api.enforcement.utils import get_grace_duration
+from ..models import EventParking, Parking, PermitLookupItem
+from ..models.utils import normalize_reg_num
+from .base import WorkerIndex, require_shared_cache
+
+
+class BloomFilter:
+    def __init__(self, capacity, false_positive_rate):
+        capacity = max(capacity, 1)
+        self.size = max(int(math.ceil(
+            -capacity * math.log(false_positive_rate) / (math.log(2) ** 2))), 8)
+        self.hash_count = max(int(round(self.size / capacity * math.log(2))), 1)
+        self._bits = bytearray((self.size + 7) // 8)
+
+    def add(self, value):
+        for index in self._get_indexes(value):
+            self._bits[index >> 3] |= 1 << (index & 7)
+
+    def __contains__(self, value):
+        return all(
+            self._bits[index >> 3] & (1 << (index & 7))
+            for index in self._get_indexes(value))
+
+    def _get_indexes(self, value):
+        # Double hashing: the k indexes are derived from two 64-bit
+        # halves of a single digest
+        digest = hashlib.blake2b(value.encode("utf-8"), digest_size=16).digest()
+        h1 = int.from_bytes(digest[:8], "little")
+        h2 = int.from_bytes(digest[8:], "little") | 1
+        return ((h1 + i * h2) % self.size for i in range(self.hash_count))
+
+
+class _DomainPlates:
+    def __init__(self, reg_nums, horizon):
+        self.horizon = horizon
+        self.built_at = time_module.monotonic()
+        # Leave room for the registration numbers added after the build
+        self.filter = BloomFilter(
+            capacity=(2 * len(reg_nums)),
+            false_positive_rate=_get_false_positive_rate())
+        for reg_num in reg_nums:
+            self.filter.add(reg_num)
+
+
+class PlateFilter(WorkerIndex):
+    name = "plates"
+
+    @property
+    def enabled(self):
+        if not getattr(settings, "PARKKIHUBI_PLATE_FILTER", False):
+            return False
+        require_shared_cache("PARKKIHUBI_PLATE_FILTER")
+        return True
+
+    def build(self, domain):
+        horizon = timezone.now() - get_grace_duration()
+        parkings = (
+            Parking.objects.filter(domain=domain).ends_after(horizon))
+        event_parkings = (
+            EventParking.objects.filter(domain=domain).ends_after(horizon))
+        permit_items = (
+            PermitLookupItem.objects.active()
+            .filter(domain=domain, end_time__gte=horizon))
+        reg_nums = set()
+        for (queryset, field) in [
+                (parkings, "normalized_reg_num"),
+                (event_parkings, "normalized_reg_num"),
+                (permit_items, "registration_number")]:
+            reg_nums.update(
+                queryset.order_by().values_list(field, flat=True).distinct())
+        return _DomainPlates(reg_nums, horizon)
+
+    def rules_out(self, domain, reg_num, time):
+        """
+        Check if given registration number surely has no rights.
+
+        Return False also when the filter is not enabled, not yet built
+        or it does not cover the given time, i.e. when the rights must
+        be checked.
+
+        :type domain: parkings.models.EnforcementDomain
+        :type reg_num: str  # normalized
+        :type time: datetime.datetime
+        :rtype: bool
+        """
+        if not self.enabled:
+            return False
+        data = self.get_if_built(domain)
+        if data is None:
+            return False
+        age = time_module.monotonic() - data.built_at
+        if age >= _get_rebuild_interval():
+            self.start_rebuild(domain)
+            if age >= 2 * _get_rebuild_interval():
+                return False  # The marks of the added numbers may be gone
+        if time - get_grace_duration() < data.horizon:
+            return False
+        if reg_num in data.filter:
+            return False
+        return cache.get(_get_added_key(domain.pk, reg_num)) is None
+
+    def add(self, domain_id, reg_nums):
+        """
+        Add registration numbers having new rights to the filters.
+
+        :type domain_id: int
+        :type reg_nums: Iterable[str]  # normalized
+        """
+        if not self.enabled:
+            return
+        reg_nums = set(reg_nums)
+        # The marks must stay until all the workers have rebuilt their
+        # filters after the registration numbers were saved
+        timeout = 2 * _get_rebuild_interval()
+        cache.set_many({
+            _get_added_key(domain_id, reg_num): True for reg_num in reg_nums
+        }, timeout)
+        data = self._data_by_domain.get(domain_id)
+        if data is not None:
+            with self._lock:
+                for reg_num in reg_nums:
+                    data.filter.add(reg_num)
+
+    def add_permits(self, permits):
+        """
+        Add the subjects of given new permits to the filters.
+
+        :type permits: Iterable[parkings.models.Permit]
+        """
+        if not self.enabled:
+            return
+        reg_nums_by_domain = {}
+        for permit in permits:
+            reg_nums_by_domain.setdefault(permit.domain_id, set()).update(
+                normalize_reg_num(subject["registration_number"])
+                for subject in permit.subjects)
+        for (domain_id, reg_nums) in reg_nums_by_domain.items():
+            self.add(domain_id, reg_nums)
+
+
+def _get_added_key(domain_id, reg_num):
+    return "parkkihubi:plate-filter-added:{}:{}".format(domain_id, reg_num)
+
+
+def _get_false_positive_rate(default=0.01):
+    value = getattr(settings, "PARKKIHUBI_PLATE_FILTER_FALSE_POSITIVE_RATE", None)
+    result = value if value is not None else default
+    assert 0 < result < 1
+    return result
+
+
+def _get_rebuild_interval(default=datetime.timedelta(minutes=10)):
+    value = getattr(settings, "PARKKIHUBI_PLATE_FILTER_REBUILD_INTERVAL", None)
+    result = value if value is not None else default
+    assert isinstance(result, datetime.timedelta)
+    return result.total_seconds()
+
+
+plate_filter = PlateFilter()
@@ -0,0 +1,117 @@
+"""
+Short-lived cache of the authenticated users and their role profiles.
+
+The users are cached to the Django cache by API key and by JWT username
+together with their enforcer, operator and monitor profiles and the
+domains of those, so that an authenticated request needs no queries
+for resolving the user or the role.  The entries of a user are deleted
+when the user, its API key or any of its role profiles is saved or
+deleted.  The deletions reach the other worker processes only with a
+cache backend shared by them.
+
+The cache is disabled when PARKKIHUBI_AUTH_CACHE_TTL is zero, which is
+the default.
+"""
+import datetime
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from rest_framework.authtoken.models import Token
+
+USER_RELATIONS = ("enforcer__enforced_domain", "operator", "monitor__domain")
+
+
+class UserCache:
+    @property
+    def enabled(self):
+        return _get_ttl() > 0
+
+    def get_by_api_key(self, key):
+        """
+        Get the cached (user, token) pair of an API key or None.
+
+        :type key: str
+        :rtype: tuple|None
+        """
+        if not self.enabled:
+            return None
+        return cache.get(_get_api_key_key(key))
+
+    def set_by_api_key(self, key, user, token):
+        if not self.enabled:
+            return
+        cache.set(_get_api_key_key(key), (user, token), _get_ttl())
+
+    def get_by_username(self, username):
+        """
+        Get the cached user of a username or None.
+
+        :type username: str
+        :rtype: django.contrib.auth.models.User|None
+        """
+        if not self.enabled:
+            return None
+        return cache.get(_get_username_key(username))
+
+    def set_by_username(self, username, user):
+        if not self.enabled:
+            return
+        cache.set(_get_username_key(username), user, _get_ttl())
+
+    def load_user(self, user_id):
+        """
+        Load a user with its role profiles.
+
+        :type user_id: int
+        :rtype: django.contrib.auth.models.User
+        """
+        return (
+            get_user_model().objects
+            .select_related(*USER_RELATIONS)
+            .get(pk=user_id))
+
+    def invalidate_user(self, user_id):
+        """
+        Delete the cached entries of given user.
+
+        :type user_id: int
+        """
+        if not self.enabled:
+            return
+        keys = [
+            _get_api_key_key(key) for key in
+            Token.objects.filter(user=user_id).values_list("key", flat=True)]
+        usernames = (
+            get_user_model().objects
+            .filter(pk=user_id)
+            .values_list("username", flat=True))
+        keys.extend(_get_username_key(x) for x in usernames)
+        cache.delete_many(keys)
+
+    def invalidate_api_key(self, key):
+        if not self.enabled:
+            return
+        cache.delete(_get_api_key_key(key))
+
+    def invalidate_usernames(self, usernames):
+        if not self.enabled:
+            return
+        cache.delete_many([_get_username_key(x) for x in usernames])
+
+
+def _get_api_key_key(key):
+    return "parkkihubi:auth:api-key:{}".format(key)
+
+
+def _get_username_key(username):
+    return "parkkihubi:auth:username:{}".format(username)
+
+
+def _get_ttl(default=datetime.timedelta(0)):
+    value = getattr(settings, "PARKKIHUBI_AUTH_CACHE_TTL", None)
+    assert value is None or isinstance(value, datetime.timedelta)
+    return (value if value is not None else default).total_seconds()
+
+
+user_cache = UserCache()
@@ -0,0 +1,126 @@
+"""
+Short-lived cache of parking check verdicts.
+
+The verdicts are stored to the Django cache with keys made of the
+enforcement domain, normalized registration number, payment zone,
+permit area and a time bucket of PARKKIHUBI_CHECK_PARKING_CACHE_TTL
+length.  The cache is disabled when the TTL is zero, which is the
+default.
+
+The keys also contain two version tokens: one per registration number
+of a domain and a global one.  Writes of parkings, event parkings and
+permits renew the version of the affected registration numbers and
+activation of a permit series renews the global version, which makes
+the old entries unreachable.  The key is resolved before the verdict
+is computed, so that a verdict computed concurrently with a write is
+stored under the versions preceding the write.
+"""
+import datetime
+import uuid
+
+from django.conf import settings
+from django.core.cache import cache
+
+from ..models.utils import normalize_reg_num
+
+GLOBAL_VERSION_KEY = "parkkihubi:verdict-version"
+
+
+class VerdictCache:
+    @property
+    def enabled(self):
+        return _get_ttl() > 0
+
+    def get_key(self, domain, reg_num, zone, area, time):
+        """
+        Get the cache key of a verdict or None if the cache is disabled.
+
+        The key contains the current version tokens, so it must be
+        resolved before the verdict is computed: a verdict computed
+        after an invalidation is then stored under the old versions
+        and never served as current.
+
+        :type domain: parkings.models.EnforcementDomain
+        :type reg_num: str  # normalized
+        :type zone: int|None
+        :type area: parkings.models.PermitArea|None
+        :type time: datetime.datetime
+        :rtype: str|None
+        """
+        if not self.enabled:
+            return None
+        return self._get_key(domain.pk, reg_num, zone, area, time)
+
+    def get(self, key):
+        """
+        Get the cached verdict or None if there is no such.
+
+        :type key: str|None
+        """
+        if key is None:
+            return None
+        return cache.get(key)
+
+    def set(self, key, verdict):
+        if key is None:
+            return
+        cache.set(key, verdict, _get_ttl())
+
+    def invalidate_registration_numbers(self, domain_id, reg_nums):
+        """
+        Invalidate the verdicts of given registration numbers.
+
+        :type domain_id: int
+        :type reg_nums: Iterable[str]  # normalized
+        """
+        if not self.enabled:
+            return
+        # The versions must outlive the entries they invalidate, since
+        # an expired version would make the older entries reachable
+        version = uuid.uuid4().hex
+        cache.set_many({
+            _get_version_key(domain_id, reg_num): version
+            for reg_num in set(reg_nums) if reg_num
+        }, 2 * _get_ttl())
+
+    def invalidate_permits(self, permits):
+        """
+        Invalidate the verdicts of the subjects of given permits.
+
+        :type permits: Iterable[parkings.models.Permit]
+        """
+        if not self.enabled:
+            return
+        reg_nums_by_domain = {}
+        for permit in permits:
+            reg_nums_by_domain.setdefault(permit.domain_id, set()).update(
+                normalize_reg_num(subject["registration_number"])
+                for subject in permit.subjects)
+        for (domain_id, reg_nums) in reg_nums_by_domain.items():
+            self.invalidate_registration_numbers(domain_id, reg_nums)
+
+    def invalidate_all(self):
+        if not self.enabled:
+            return
+        cache.set(GLOBAL_VERSION_KEY, uuid.uuid4().hex, None)
+
+    def _get_key(self, domain_id, reg_num, zone, area, time):
+        version_key = _get_version_key(domain_id, reg_num)
+        versions = cache.get_many([GLOBAL_VERSION_KEY, version_key])
+        bucket = int(time.timestamp() // _get_ttl())
+        return "parkkihubi:verdict:{}:{}:{}:{}:{}:{}:{}".format(
+            versions.get(GLOBAL_VERSION_KEY), versions.get(version_key),
+            domain_id, reg_num, zone, area.pk if area else None, bucket)
+
+
+def _get_version_key(domain_id, reg_num):
+    return "parkkihubi:verdict-version:{}:{}".format(domain_id, reg_num)
+
+
+def _get_ttl(default=datetime.timedelta(0)):
+    value = getattr(settings, "PARKKIHUBI_CHECK_PARKING_CACHE_TTL", None)
+    assert value is None or isinstance(value, datetime.timedelta)
+    return (value if value is not None else default).total_seconds()
+
+
+verdict_cache = VerdictCache()
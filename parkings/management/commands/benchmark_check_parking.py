@@ -0,0 +1,350 @@
+import datetime
+import json
+import multiprocessing
+import random
+import time
+import uuid
+
+import requests
+from django.contrib.gis.geos import Point
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, transaction
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from django.utils import timezone
+from rest_framework.authtoken.models import Token
+from rest_framework.test import APIClient
+
+from parkings.api.enforcement.parking_check_log import parking_check_log
+from parkings.factories import (
+    EnforcementDomainFactory, EnforcerFactory, OperatorFactory, ParkingFactory,
+    UserFactory)
+from parkings.factories.faker import fake
+from parkings.factories.gis import generate_location, generate_multi_polygon
+from parkings.factories.parking import create_payment_zone
+from parkings.factories.permit import create_permit_series
+from parkings.models import (
+    EnforcementDomain, Enforcer, Operator, Parking, ParkingCheck, PaymentZone,
+    Permit, PermitArea, PermitSeries)
+from parkings.models.constants import WGS84_SRID
+from parkings.utils.benchmarking import format_summary, summarize_durations
+from parkings.utils.coordinates import transform_point
+
+PLATE_LETTERS = "ABCDEFGHIJKLMNOPRSTUVXYZ"
+
+
+class Command(BaseCommand):
+    help = (
+        "Benchmark the check_parking endpoint against a synthetic "
+        "enforcement domain.  The domain is seeded with given number of "
+        "zones, permit areas, parkings and permits and it is deleted "
+        "after the run, unless --keep is given.")
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--zones", type=int, default=3,
+            help="Number of payment zones to create")
+        parser.add_argument(
+            "--areas", type=int, default=5,
+            help="Number of permit areas to create")
+        parser.add_argument(
+            "--parkings", type=int, default=1000,
+            help="Number of parkings to create")
+        parser.add_argument(
+            "--permits", type=int, default=200,
+            help="Number of permits to create")
+        parser.add_argument(
+            "--checks", "-c", type=int, default=1000,
+            help="Number of parking checks to do")
+        parser.add_argument(
+            "--warmup", type=int, default=20,
+            help="Number of parking checks to do before measuring")
+        parser.add_argument(
+            "--seed", type=int, default=777,
+            help="Seed of the random generators")
+        parser.add_argument(
+            "--url", metavar="BASE_URL",
+            help=(
+                "Send the checks over HTTP to a server running at given "
+                "base URL, e.g. http://localhost:8000, instead of using "
+                "the test client.  The server must use the same database."))
+        parser.add_argument(
+            "--processes", "-p", type=int, default=8,
+            help="Number of HTTP worker processes")
+        parser.add_argument(
+            "--keep", action="store_true",
+            help="Do not delete the seeded data after the run")
+
+    def handle(self, *args, **options):
+        if options["url"] and options["processes"] < 1:
+            raise CommandError("At least one process is needed")
+
+        rng = random.Random(options["seed"])
+        fake.seed(options["seed"])
+
+        self.stdout.write("Seeding...")
+        seeded = _seed(
+            rng,
+            zone_count=options["zones"],
+            area_count=options["areas"],
+            parking_count=options["parkings"],
+            permit_count=options["permits"])
+        self.stdout.write("Seeded domain {} in {:.1f} s".format(
+            seeded.domain.code, seeded.seeding_time))
+
+        try:
+            payloads = _generate_payloads(
+                rng, seeded, options["warmup"] + options["checks"])
+            warmup_payloads = payloads[:options["warmup"]]
+            payloads = payloads[options["warmup"]:]
+            if options["url"]:
+                (durations, total_time, queries) = _run_over_http(
+                    seeded, options["url"], options["processes"],
+                    warmup_payloads, payloads)
+            else:
+                (durations, total_time, queries) = _run_in_process(
+                    seeded, warmup_payloads, payloads)
+        finally:
+            parking_check_log.flush()
+            if not options["keep"]:
+                _delete_seeded(seeded)
+
+        for line in format_summary(summarize_durations(durations, total_time)):
+            self.stdout.write(line)
+        self.stdout.write("Queries:    {}".format(
+            "{:9.2f} per check".format(queries / len(durations))
+            if queries is not None and durations else "n/a"))
+
+
+class _Seeded:
+    def __init__(
+            self, domain, enforcer, operator, owner, series, plates,
+            geometries):
+        self.domain = domain
+        self.enforcer = enforcer
+        self.operator = operator
+        self.owner = owner
+        self.series = series
+        self.plates = plates
+        self.geometries = geometries
+        self.seeding_time = 0.0
+
+
+def _seed(rng, zone_count, area_count, parking_count, permit_count):
+    start = time.perf_counter()
+    run_id = uuid.UUID(int=rng.getrandbits(128)).hex[:8]
+    now = timezone.now()
+
+    with transaction.atomic():
+        domain = EnforcementDomainFactory(
+            code="BM{}".format(run_id), name="Benchmark {}".format(run_id))
+        enforcer = EnforcerFactory(
+            enforced_domain=domain,
+            user=UserFactory(username="benchmark-enforcer-{}".format(run_id)))
+        operator = OperatorFactory(
+            user=UserFactory(username="benchmark-operator-{}".format(run_id)))
+        owner = UserFactory(username="benchmark-owner-{}".format(run_id))
+        series = create_permit_series(active=True, owner=owner)
+
+        zones = [
+            create_payment_zone(
+                domain=domain, number=number, code=str(number),
+                name="Zone {}".format(number), geom=generate_multi_polygon())
+            for number in range(1, zone_count + 1)
+        ]
+        areas = []
+        for number in range(1, area_count + 1):
+            area = PermitArea.objects.create(
+                domain=domain, identifier="A{}".format(number),
+                name="Area {}".format(number), geom=generate_multi_polygon())
+            area.allowed_users.add(owner)
+            areas.append(area)
+
+        parked_plates = _create_parkings(
+            rng, domain, operator, zones, parking_count, now)
+        permit_plates = _create_permits(
+            rng, domain, series, areas, permit_count, now)
+
+    unknown_plates = [
+        _generate_plate(rng)
+        for _ in range(max(len(parked_plates), len(permit_plates), 1))]
+    plates = [x for x in [parked_plates, permit_plates, unknown_plates] if x]
+
+    geometries = [x.geom for x in zones + areas]
+    seeded = _Seeded(
+        domain, enforcer, operator, owner, series, plates, geometries)
+    seeded.seeding_time = time.perf_counter() - start
+    return seeded
+
+
+def _create_parkings(rng, domain, operator, zones, count, now):
+    plates = []
+    for _ in range(count):
+        plate = _generate_plate(rng)
+        # Most of the parkings are history and the rest are valid now
+        if rng.random() < 0.8:
+            time_start = now - datetime.timedelta(days=rng.uniform(1, 90))
+            time_end = time_start + datetime.timedelta(
+                minutes=rng.uniform(5, 240))
+        else:
+            time_start = now - datetime.timedelta(minutes=rng.uniform(1, 120))
+            time_end = now + datetime.timedelta(minutes=rng.uniform(1, 240))
+        ParkingFactory(
+            domain=domain, operator=operator,
+            zone=rng.choice(zones) if zones else None,
+            registration_number=plate,
+            time_start=time_start, time_end=time_end)
+        plates.append(plate)
+    return plates
+
+
+def _create_permits(rng, domain, series, areas, count, now):
+    plates = []
+    for _ in range(count):
+        start_time = now - datetime.timedelta(days=rng.uniform(0, 30))
+        end_time = start_time + datetime.timedelta(days=rng.uniform(1, 60))
+        subjects = [
+            {
+                "registration_number": _generate_plate(rng),
+                "start_time": start_time.isoformat(),
+                "end_time": end_time.isoformat(),
+            }
+            for _ in range(rng.randint(1, 2))
+        ]
+        permit_areas = [
+            {
+                "area": area.identifier,
+                "start_time": start_time.isoformat(),
+                "end_time": end_time.isoformat(),
+            }
+            for area in rng.sample(areas, min(len(areas), 2))
+        ]
+        Permit.objects.create(
+            domain=domain, series=series,
+            subjects=subjects, areas=permit_areas)
+        plates.extend(x["registration_number"] for x in subjects)
+    return plates
+
+
+def _generate_plate(rng):
+    letters = "".join(rng.choice(PLATE_LETTERS) for _ in range(3))
+    return "{}-{}".format(letters, rng.randint(1, 999))
+
+
+def _generate_payloads(rng, seeded, count):
+    # Check equally the plates with parkings, with permits and without
+    # any rights at random locations of the seeded zones and areas
+    payloads = []
+    for _ in range(count):
+        location = _generate_location(rng, seeded.geometries)
+        payloads.append({
+            "registration_number": rng.choice(rng.choice(seeded.plates)),
+            "location": {
+                "longitude": location.x,
+                "latitude": location.y,
+            },
+        })
+    return payloads
+
+
+def _generate_location(rng, geometries):
+    if not geometries:
+        return generate_location()
+    geometry = rng.choice(geometries)
+    (x_min, y_min, x_max, y_max) = geometry.extent
+    while True:
+        point = Point(
+            rng.uniform(x_min, x_max), rng.uniform(y_min, y_max),
+            srid=geometry.srid)
+        if geometry.contains(point):
+            return transform_point(point, WGS84_SRID)
+
+
+def _run_in_process(seeded, warmup_payloads, payloads):
+    client = APIClient()
+    client.force_authenticate(user=seeded.enforcer.user)
+    url = reverse("enforcement:v1:check_parking")
+
+    for payload in warmup_payloads:
+        _check_response(client.post(url, payload, format="json"))
+
+    durations = []
+    queries = 0
+    total_start = time.perf_counter()
+    for payload in payloads:
+        with CaptureQueriesContext(connection) as context:
+            start = time.perf_counter()
+            response = client.post(url, payload, format="json")
+            durations.append(time.perf_counter() - start)
+        _check_response(response)
+        queries += len(context.captured_queries)
+    total_time = time.perf_counter() - total_start
+    return (durations, total_time, queries)
+
+
+def _run_over_http(seeded, base_url, processes, warmup_payloads, payloads):
+    token = Token.objects.get_or_create(user=seeded.enforcer.user)[0]
+    url = base_url.rstrip("/") + reverse("enforcement:v1:check_parking")
+    headers = {
+        "Content-Type": "application/json",
+        "Authorization": "ApiKey {}".format(token.key),
+    }
+    post_datas = [
+        json.dumps(x, separators=(",", ":")).encode("utf-8")
+        for x in warmup_payloads + payloads]
+
+    with multiprocessing.Pool(
+            processes=processes, initializer=_init_http_worker,
+            initargs=(url, headers)) as pool:
+        for result in pool.map(_post, post_datas[:len(warmup_payloads)]):
+            _check_http_result(result)
+        total_start = time.perf_counter()
+        results = pool.map(_post, post_datas[len(warmup_payloads):])
+        total_time = time.perf_counter() - total_start
+
+    for result in results:
+        _check_http_result(result)
+    return ([duration for (duration, _status) in results], total_time, None)
+
+
+_http_worker = {}
+
+
+def _init_http_worker(url, headers):
+    _http_worker["url"] = url
+    _http_worker["session"] = requests.Session()
+    _http_worker["session"].headers.update(headers)
+
+
+def _post(post_data):
+    start = time.perf_counter()
+    response = _http_worker["session"].post(_http_worker["url"], data=post_data)
+    return (time.perf_counter() - start, response.status_code)
+
+
+def _check_response(response):
+    if response.status_code != 200:
+        raise CommandError("Parking check failed: {} {}".format(
+            response.status_code, response.content[:200]))
+
+
+def _check_http_result(result):
+    (_duration, status_code) = result
+    if status_code != 200:
+        raise CommandError("Parking check failed: HTTP {}".format(status_code))
+
+
+def _delete_seeded(seeded):
+    users = [seeded.enforcer.user, seeded.operator.user, seeded.owner]
+    with transaction.atomic():
+        ParkingCheck.objects.filter(performer=seeded.enforcer.user).delete()
+        Parking.objects.filter(domain=seeded.domain).delete()
+        Permit.objects.filter(domain=seeded.domain).delete()
+        PermitSeries.objects.filter(pk=seeded.series.pk).delete()
+        PermitArea.objects.filter(domain=seeded.domain).delete()
+        PaymentZone.objects.filter(domain=seeded.domain).delete()
+        Enforcer.objects.filter(pk=seeded.enforcer.pk).delete()
+        Operator.objects.filter(pk=seeded.operator.pk).delete()
+        EnforcementDomain.objects.filter(pk=seeded.domain.pk).delete()
+        for user in users:
+            user.delete()
@@ -5,13 +5,17 @@ Anonymize the registration numbers from old objects of all models.
 What is considered old is defined as something that has ended before a
 cutoff date, which is the current time minus the value in the setting
 PARKKIHUBI_REGISTRATION_NUMBERS_REMOVABLE_AFTER. Default is 24 hours.
+
+Also delete the permit lookup item changes which are older than
+PARKKIHUBI_PERMIT_ITEM_CHANGES_PRUNABLE_AFTER. Default is 7 days.
 """
 from datetime import timedelta
 
 from django.core.management.base import BaseCommand
 from django.utils import timezone
 
-from parkings.anonymization import anonymize_all
+from parkings.anonymization import (
+    anonymize_all, delete_prunable_permit_item_changes)
 
 
 class Command(BaseCommand):
@@ -22,7 +26,10 @@ class Command(BaseCommand):
             "--dry-run",
             "-n",
             action="store_true",
-            help="Do a dry-run, i.e. nothing is actually anonymized.",
+            help=(
+                "Do a dry-run, i.e. nothing is actually anonymized "
+                "or deleted."
+            ),
         )
         parser.add_argument(
             "--cutoff-in-hours",
@@ -44,3 +51,4 @@ class Command(BaseCommand):
             cutoff = None
 
         anonymize_all(cutoff=cutoff, dry_run=dry_run)
+        delete_prunable_permit_item_changes(dry_run=dry_run)
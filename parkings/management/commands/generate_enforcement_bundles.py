@@ -0,0 +1,36 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from parkings.lookups.bundles import bundle_store
+from parkings.models import EnforcementDomain
+
+
+class Command(BaseCommand):
+    help = "Generate the offline enforcement bundles to the cache."
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--domain",
+            "-d",
+            action="append",
+            dest="domains",
+            metavar="CODE",
+            help=(
+                "Code of the enforcement domain to generate the bundle "
+                "for. Can be given multiple times. Defaults to all."
+            ),
+        )
+
+    def handle(self, *args, **options):
+        domains = EnforcementDomain.objects.order_by("code")
+        codes = options["domains"]
+        if codes:
+            domains = domains.filter(code__in=codes)
+            missing = set(codes) - {x.code for x in domains}
+            if missing:
+                raise CommandError("Unknown domains: {}".format(
+                    ", ".join(sorted(missing))))
+        for domain in domains:
+            bundle = bundle_store.refresh(domain)
+            if options["verbosity"] >= 1:
+                self.stdout.write("{}: {} bytes, ETag {}".format(
+                    domain.code, len(bundle.data), bundle.etag))
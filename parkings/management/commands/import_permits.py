@@ -0,0 +1,57 @@
+import json
+import sys
+
+from django.core.management.base import BaseCommand, CommandError
+
+from parkings.importers import PermitImporter
+from parkings.models import EnforcementDomain, PermitSeries
+
+
+class Command(BaseCommand):
+    help = "Import permits from an NDJSON file to a permit series."
+
+    def add_arguments(self, parser):
+        parser.add_argument("series_id", type=int, metavar="SERIES_ID")
+        parser.add_argument(
+            "file",
+            metavar="FILE",
+            help="NDJSON file of the permits, or - for standard input",
+        )
+        parser.add_argument(
+            "--domain",
+            "-d",
+            metavar="CODE",
+            help=(
+                "Code of the enforcement domain of all the permits. "
+                "By default the domain is read from each line."
+            ),
+        )
+
+    def handle(self, *args, **options):
+        try:
+            series = PermitSeries.objects.get(pk=options["series_id"])
+        except PermitSeries.DoesNotExist:
+            raise CommandError("Unknown permit series: {}".format(
+                options["series_id"]))
+        domain = None
+        if options["domain"]:
+            try:
+                domain = EnforcementDomain.objects.get(code=options["domain"])
+            except EnforcementDomain.DoesNotExist:
+                raise CommandError("Unknown domain: {}".format(
+                    options["domain"]))
+
+        importer = PermitImporter(series, series.owner, domain=domain)
+        if options["file"] == "-":
+            result = importer.import_permits(sys.stdin.buffer)
+        else:
+            with open(options["file"], "rb") as fp:
+                result = importer.import_permits(fp)
+
+        if result.error_count:
+            for error in result.errors:
+                self.stderr.write(json.dumps(error))
+            raise CommandError("{} invalid lines, nothing imported".format(
+                result.error_count))
+        if options["verbosity"] >= 1:
+            self.stdout.write("Imported {} permits".format(result.created))
@@ -0,0 +1,192 @@
+import argparse
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import requests
+from django.core.management.base import BaseCommand, CommandError
+from django.urls import reverse
+from django.utils import timezone
+from django.utils.dateparse import parse_datetime
+from rest_framework.authtoken.models import Token
+
+from parkings.models import ParkingCheck
+from parkings.utils.benchmarking import format_summary, summarize_durations
+
+
+def _aware_datetime(value):
+    parsed = parse_datetime(value)
+    if parsed is None:
+        raise argparse.ArgumentTypeError(
+            "Invalid date time: {!r}".format(value))
+    if timezone.is_naive(parsed):
+        parsed = timezone.make_aware(parsed)
+    return parsed
+
+
+class Command(BaseCommand):
+    help = (
+        "Replay the parking checks recorded within a time window against "
+        "a target instance and compare the results to the recorded ones. "
+        "Note that the target records the replayed checks too.")
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "url", metavar="BASE_URL",
+            help="Base URL of the target, e.g. http://localhost:8000")
+        parser.add_argument(
+            "--since", type=_aware_datetime, required=True,
+            help="Replay the checks created at or after this time")
+        parser.add_argument(
+            "--until", type=_aware_datetime,
+            help="Replay the checks created before this time")
+        parser.add_argument(
+            "--speed", "-s", type=float, default=1.0,
+            help=(
+                "Speed-up factor of the original pacing.  Use 0 to send "
+                "the checks as fast as possible."))
+        parser.add_argument(
+            "--concurrency", "-c", type=int, default=8,
+            help="Maximum number of concurrent requests")
+        parser.add_argument(
+            "--limit", "-l", type=int,
+            help="Maximum number of checks to replay")
+        parser.add_argument(
+            "--api-key",
+            help=(
+                "API key to do all the checks with.  By default the "
+                "checks are done with the API keys of their performers, "
+                "which must then exist also in the target."))
+
+    def handle(self, *args, **options):
+        if options["speed"] < 0:
+            raise CommandError("Speed must not be negative")
+        if options["concurrency"] < 1:
+            raise CommandError("Concurrency must be at least 1")
+
+        # The anonymized checks cannot be replayed
+        checks = (
+            ParkingCheck.objects
+            .filter(created_at__gte=options["since"])
+            .exclude(registration_number=""))
+        if options["until"]:
+            checks = checks.filter(created_at__lt=options["until"])
+        checks = checks.order_by("created_at", "id").only(
+            "created_at", "performer", "time", "registration_number",
+            "location", "allowed")
+        if options["limit"]:
+            checks = checks[:options["limit"]]
+        checks = list(checks)
+        if not checks:
+            self.stdout.write("No parking checks to replay")
+            return
+
+        replayer = _Replayer(
+            url=options["url"].rstrip("/") + reverse(
+                "enforcement:v1:check_parking"),
+            api_keys=_get_api_keys(checks, options["api_key"]),
+            speed=options["speed"],
+            concurrency=options["concurrency"])
+        self.stdout.write("Replaying {} parking checks...".format(len(checks)))
+        results = replayer.replay(checks)
+        self._show_results(checks, results, replayer.total_time)
+
+    def _show_results(self, checks, results, total_time):
+        durations = []
+        errors = 0
+        mismatches = []
+        for (check, (duration, status_code, allowed)) in zip(checks, results):
+            durations.append(duration)
+            if status_code != 200:
+                errors += 1
+            elif allowed != check.allowed:
+                mismatches.append((check, allowed))
+
+        for line in format_summary(summarize_durations(durations, total_time)):
+            self.stdout.write(line)
+        self.stdout.write("Errors:     {:9d}".format(errors))
+        self.stdout.write("Mismatches: {:9d}".format(len(mismatches)))
+        if self.verbosity >= 2:
+            for (check, allowed) in mismatches:
+                self.stdout.write(
+                    "  {}: recorded {}, replayed {}".format(
+                        check, check.allowed, allowed))
+
+
+def _get_api_keys(checks, api_key):
+    if api_key:
+        return {check.performer_id: api_key for check in checks}
+    performer_ids = {check.performer_id for check in checks}
+    api_keys = dict(
+        Token.objects.filter(user__in=performer_ids)
+        .values_list("user", "key"))
+    missing = performer_ids - set(api_keys)
+    if missing:
+        raise CommandError(
+            "No API key for the performers {}.  Use --api-key.".format(
+                ", ".join(str(x) for x in sorted(missing))))
+    return api_keys
+
+
+class _Replayer:
+    def __init__(self, url, api_keys, speed, concurrency):
+        self.url = url
+        self.api_keys = api_keys
+        self.speed = speed
+        self.concurrency = concurrency
+        self.total_time = 0.0
+        self._local = threading.local()
+
+    def replay(self, checks):
+        """
+        Replay given checks at the configured pace.
+
+        Return the (duration, status_code, allowed) tuples of the
+        checks in the same order.  The status code is None if the
+        request failed or its response could not be parsed.
+
+        :type checks: list[ParkingCheck]
+        :rtype: list[tuple]
+        """
+        first_created_at = checks[0].created_at
+        start = time.perf_counter()
+        with ThreadPoolExecutor(max_workers=self.concurrency) as executor:
+            futures = []
+            for check in checks:
+                if self.speed:
+                    offset = (
+                        check.created_at - first_created_at).total_seconds()
+                    delay = start + offset / self.speed - time.perf_counter()
+                    if delay > 0:
+                        time.sleep(delay)
+                futures.append(executor.submit(self._send, check))
+            results = [future.result() for future in futures]
+        self.total_time = time.perf_counter() - start
+        return results
+
+    def _send(self, check):
+        session = getattr(self._local, "session", None)
+        if session is None:
+            session = self._local.session = requests.Session()
+        data = {
+            "registration_number": check.registration_number,
+            "location": {
+                "longitude": check.location.x,
+                "latitude": check.location.y,
+            },
+            "time": check.time.isoformat(),
+        }
+        headers = {
+            "Authorization": "ApiKey {}".format(
+                self.api_keys[check.performer_id]),
+        }
+        start = time.perf_counter()
+        try:
+            response = session.post(self.url, json=data, headers=headers)
+            status_code = response.status_code
+            allowed = (
+                response.json()["allowed"] if status_code == 200 else None)
+        except (requests.RequestException, ValueError, LookupError, TypeError):
+            (status_code, allowed) = (None, None)
+        duration = time.perf_counter() - start
+        return (duration, status_code, allowed)
@@ -0,0 +1,29 @@
+from django.contrib.postgres.operations import AddIndexConcurrently
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+    # The indexes are created concurrently, so that the writes of the
+    # parkings are not blocked meanwhile
+    atomic = False
+
+    dependencies = [
+        ('parkings', '0065_eventarea_is_test'),
+    ]
+
+    operations = [
+        AddIndexConcurrently(
+            model_name='parking',
+            index=models.Index(
+                fields=['domain', 'normalized_reg_num', 'time_start'],
+                include=['time_end', 'zone', 'id'],
+                name='parking_domain_regnum_idx'),
+        ),
+        AddIndexConcurrently(
+            model_name='eventparking',
+            index=models.Index(
+                fields=['domain', 'normalized_reg_num', 'time_start'],
+                include=['time_end', 'id'],
+                name='eventparking_domain_regnum_idx'),
+        ),
+    ]
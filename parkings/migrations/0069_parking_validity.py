@@ -0,0 +1,75 @@
+"""
+Add the generated validity ranges of the parkings.
+
+Adding a stored generated column rewrites the table while holding an
+ACCESS EXCLUSIVE lock, which blocks also the reads of the table.  The
+rewrite takes time in proportion to the size of the table, so the
+archived parkings take the longest.  Run this migration when the
+enforcement and the operator APIs can be paused, e.g. in a maintenance
+break.
+
+The GiST indexes are built concurrently after the rewrites, so they do
+not block the writes.
+"""
+import django.contrib.postgres.indexes
+from django.contrib.postgres.operations import (
+    AddIndexConcurrently, BtreeGistExtension)
+from django.db import migrations
+
+import parkings.fields
+
+ADD_VALIDITY_COLUMN_SQL = """
+ALTER TABLE {table} ADD COLUMN validity tstzrange
+GENERATED ALWAYS AS (
+    CASE WHEN time_end < time_start THEN 'empty'::tstzrange
+    ELSE tstzrange(time_start, time_end, '[]') END
+) STORED
+"""
+
+DROP_VALIDITY_COLUMN_SQL = "ALTER TABLE {table} DROP COLUMN validity"
+
+
+def add_validity_field(model_name):
+    table = "parkings_{}".format(model_name)
+    return migrations.SeparateDatabaseAndState(
+        database_operations=[
+            migrations.RunSQL(
+                ADD_VALIDITY_COLUMN_SQL.format(table=table),
+                DROP_VALIDITY_COLUMN_SQL.format(table=table)),
+        ],
+        state_operations=[
+            migrations.AddField(
+                model_name=model_name,
+                name='validity',
+                field=parkings.fields.GeneratedRangeField(
+                    editable=False, null=True, verbose_name='validity'),
+            ),
+        ],
+    )
+
+
+class Migration(migrations.Migration):
+    atomic = False
+
+    dependencies = [
+        ('parkings', '0067_right_lookup_covering_indexes'),
+    ]
+
+    operations = [
+        BtreeGistExtension(),
+        add_validity_field('archivedparking'),
+        add_validity_field('eventparking'),
+        add_validity_field('parking'),
+        AddIndexConcurrently(
+            model_name='parking',
+            index=django.contrib.postgres.indexes.GistIndex(
+                fields=['domain', 'normalized_reg_num', 'validity'],
+                name='parking_regnum_validity_gist'),
+        ),
+        AddIndexConcurrently(
+            model_name='eventparking',
+            index=django.contrib.postgres.indexes.GistIndex(
+                fields=['domain', 'normalized_reg_num', 'validity'],
+                name='eventparking_regnum_valid_gist'),
+        ),
+    ]
@@ -0,0 +1,46 @@
+import django.contrib.postgres.indexes
+from django.contrib.postgres.operations import AddIndexConcurrently
+from django.db import migrations
+
+import parkings.fields
+
+ADD_VALIDITY_COLUMN_SQL = """
+ALTER TABLE parkings_permitlookupitem ADD COLUMN validity tstzrange
+GENERATED ALWAYS AS (tstzrange(start_time, end_time, '[]')) STORED
+"""
+
+DROP_VALIDITY_COLUMN_SQL = (
+    "ALTER TABLE parkings_permitlookupitem DROP COLUMN validity")
+
+
+class Migration(migrations.Migration):
+    # The GiST index is created concurrently, so that the writes of the
+    # permits are not blocked meanwhile
+    atomic = False
+
+    dependencies = [
+        ('parkings', '0069_parking_validity'),
+    ]
+
+    operations = [
+        migrations.SeparateDatabaseAndState(
+            database_operations=[
+                migrations.RunSQL(
+                    ADD_VALIDITY_COLUMN_SQL, DROP_VALIDITY_COLUMN_SQL),
+            ],
+            state_operations=[
+                migrations.AddField(
+                    model_name='permitlookupitem',
+                    name='validity',
+                    field=parkings.fields.GeneratedRangeField(
+                        editable=False, null=True),
+                ),
+            ],
+        ),
+        AddIndexConcurrently(
+            model_name='permitlookupitem',
+            index=django.contrib.postgres.indexes.GistIndex(
+                fields=['registration_number', 'area', 'validity'],
+                name='permitlookup_regnum_area_gist'),
+        ),
+    ]
@@ -0,0 +1,60 @@
+import django.db.models.deletion
+from django.contrib.postgres.operations import AddIndexConcurrently
+from django.db import migrations, models
+
+FILL_DOMAIN_AND_IS_ACTIVE_SQL = """
+UPDATE parkings_permitlookupitem AS pli
+SET domain_id = pe.domain_id, is_active = ps.active
+FROM parkings_permit AS pe
+JOIN parkings_permitseries AS ps ON ps.id = pe.series_id
+WHERE pe.id = pli.permit_id
+"""
+
+
+class Migration(migrations.Migration):
+    # The indexes are created concurrently, so that the writes of the
+    # permits are not blocked meanwhile
+    atomic = False
+
+    dependencies = [
+        ('parkings', '0070_permitlookupitem_validity'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='permitlookupitem',
+            name='domain',
+            field=models.ForeignKey(
+                db_index=False, null=True,
+                on_delete=django.db.models.deletion.PROTECT,
+                related_name='+', to='parkings.enforcementdomain'),
+        ),
+        migrations.AddField(
+            model_name='permitlookupitem',
+            name='is_active',
+            field=models.BooleanField(default=False),
+        ),
+        migrations.RunSQL(
+            FILL_DOMAIN_AND_IS_ACTIVE_SQL, migrations.RunSQL.noop),
+        migrations.AlterField(
+            model_name='permitlookupitem',
+            name='domain',
+            field=models.ForeignKey(
+                db_index=False,
+                on_delete=django.db.models.deletion.PROTECT,
+                related_name='+', to='parkings.enforcementdomain'),
+        ),
+        AddIndexConcurrently(
+            model_name='permitlookupitem',
+            index=models.Index(
+                fields=['registration_number', 'area', 'start_time', 'end_time'],
+                include=['permit', 'domain', 'is_active'],
+                name='permitlookup_regnum_area_idx'),
+        ),
+        AddIndexConcurrently(
+            model_name='permitlookupitem',
+            index=models.Index(
+                fields=['domain', 'is_active', 'end_time'],
+                name='permitlookup_domain_active_idx'),
+        ),
+    ]
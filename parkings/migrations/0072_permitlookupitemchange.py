@@ -0,0 +1,46 @@
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('parkings', '0071_permitlookupitem_domain_is_active'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='PermitLookupItemChange',
+            fields=[
+                ('id', models.BigAutoField(primary_key=True, serialize=False)),
+                ('transaction_id', models.BigIntegerField(verbose_name='transaction id')),
+                ('created_at', models.DateTimeField(verbose_name='time created')),
+                ('kind', models.CharField(
+                    choices=[('added', 'added'), ('removed', 'removed')],
+                    max_length=7, verbose_name='kind')),
+                ('domain', models.ForeignKey(
+                    db_index=False,
+                    on_delete=django.db.models.deletion.CASCADE,
+                    related_name='+', to='parkings.enforcementdomain')),
+                ('item_id', models.IntegerField(verbose_name='lookup item id')),
+                ('permit_id', models.IntegerField(verbose_name='permit id')),
+                ('registration_number', models.CharField(max_length=20)),
+                ('area', models.CharField(blank=True, max_length=10, null=True, verbose_name='area')),
+                ('start_time', models.DateTimeField()),
+                ('end_time', models.DateTimeField()),
+            ],
+            options={
+                'verbose_name': 'permit lookup item change',
+                'verbose_name_plural': 'permit lookup item changes',
+                'ordering': ('transaction_id', 'id'),
+                'indexes': [
+                    models.Index(
+                        fields=['domain', 'transaction_id', 'id'],
+                        name='permitlookupchange_feed_idx'),
+                    models.Index(
+                        fields=['created_at', 'id'],
+                        name='permitlookupchange_created_idx'),
+                ],
+            },
+        ),
+    ]
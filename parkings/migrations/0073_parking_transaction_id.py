@@ -0,0 +1,48 @@
+from django.contrib.postgres.operations import AddIndexConcurrently
+from django.db import migrations, models
+
+import parkings.fields
+
+CREATE_TRIGGER_SQL = """
+CREATE FUNCTION parkings_parking_set_transaction_id() RETURNS trigger AS $$
+BEGIN
+    NEW.transaction_id := pg_current_xact_id()::text::bigint;
+    RETURN NEW;
+END;
+$$ LANGUAGE plpgsql;
+
+CREATE TRIGGER parkings_parking_transaction_id
+BEFORE INSERT OR UPDATE ON parkings_parking
+FOR EACH ROW EXECUTE FUNCTION parkings_parking_set_transaction_id();
+"""
+
+DROP_TRIGGER_SQL = """
+DROP TRIGGER parkings_parking_transaction_id ON parkings_parking;
+DROP FUNCTION parkings_parking_set_transaction_id();
+"""
+
+
+class Migration(migrations.Migration):
+    # The index is created concurrently, so that the writes of the
+    # parkings are not blocked meanwhile
+    atomic = False
+
+    dependencies = [
+        ('parkings', '0072_permitlookupitemchange'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='parking',
+            name='transaction_id',
+            field=parkings.fields.TransactionIdField(
+                editable=False, null=True, verbose_name='transaction id'),
+        ),
+        migrations.RunSQL(CREATE_TRIGGER_SQL, DROP_TRIGGER_SQL),
+        AddIndexConcurrently(
+            model_name='parking',
+            index=models.Index(
+                fields=['domain', 'transaction_id'],
+                name='parking_domain_xact_idx'),
+        ),
+    ]
@@ -0,0 +1,19 @@
+import django.utils.timezone
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('parkings', '0073_parking_transaction_id'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='parkingcheck',
+            name='created_at',
+            field=models.DateTimeField(
+                db_index=True, default=django.utils.timezone.now,
+                editable=False, verbose_name='time created'),
+        ),
+    ]
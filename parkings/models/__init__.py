@@ -8,8 +8,8 @@ from .parking_area import ParkingArea
 from .parking_check import ParkingCheck
 from .parking_terminal import ParkingTerminal
 from .permit import (
-    Permit, PermitArea, PermitAreaItem, PermitLookupItem, PermitSeries,
-    PermitSubjectItem)
+    Permit, PermitArea, PermitAreaItem, PermitLookupItem,
+    PermitLookupItemChange, PermitSeries, PermitSubjectItem)
 from .region import Region
 from .zone import PaymentZone
 
@@ -32,6 +32,7 @@ __all__ = [
     'PermitArea',
     'PermitAreaItem',
     'PermitLookupItem',
+    'PermitLookupItemChange',
     'PermitSeries',
     'PermitSubjectItem',
     'Region',
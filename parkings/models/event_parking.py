@@ -1,4 +1,5 @@
 from django.contrib.gis.db import models
+from django.contrib.postgres.indexes import GistIndex
 from django.utils.translation import ugettext_lazy as _
 
 from parkings.models.event_area import EventArea
@@ -18,6 +19,16 @@ class EventParking(AbstractParking):
         verbose_name = _("event parking")
         verbose_name_plural = _("event parkings")
         default_related_name = "event_parkings"
+        indexes = [
+            # Covers the lookups of the event parkings of a vehicle
+            models.Index(
+                fields=['domain', 'normalized_reg_num', 'time_start'],
+                include=['time_end', 'id'],
+                name='eventparking_domain_regnum_idx'),
+            GistIndex(
+                fields=['domain', 'normalized_reg_num', 'validity'],
+                name='eventparking_regnum_valid_gist'),
+        ]
 
     objects = EventParkingQuerySet.as_manager()
     event_area = models.ForeignKey(
@@ -1,5 +1,9 @@
 from django.contrib.gis.db import models
+from django.contrib.gis.db.models.functions import GeometryDistance
+from django.contrib.gis.measure import D
+from django.contrib.postgres.indexes import GistIndex
 from django.db import connections, router, transaction
+from django.db.backends.postgresql.psycopg_any import DateTimeTZRange
 from django.utils import timezone
 from django.utils.timezone import localtime, now
 from django.utils.translation import gettext_lazy as _
@@ -11,15 +15,15 @@ from parkings.models.parking_area import ParkingArea
 from parkings.models.zone import PaymentZone
 from parkings.utils.sanitizing import sanitize_registration_number
 
+from ..fields import GeneratedRangeField, TransactionIdField
+from ..utils.coordinates import transform_point
 from ..utils.model_fields import with_model_field_modifications
 from ..utils.querysets import make_batches
 from .enforcement_domain import EnforcementDomain
 from .mixins import AnonymizableRegNumQuerySet
 from .parking_terminal import ParkingTerminal
 from .region import Region
-from .utils import get_closest_area, normalize_reg_num
-
-Q = models.Q
+from .utils import get_closest_area, get_transaction_horizon, normalize_reg_num
 
 
 class ParkingQuerySet(AnonymizableRegNumQuerySet, models.QuerySet):
@@ -30,17 +34,63 @@ class ParkingQuerySet(AnonymizableRegNumQuerySet, models.QuerySet):
         :type time: datetime.datetime
         :rtype: ParkingQuerySet
         """
-        return self.starts_before(time).ends_after(time)
+        return self.filter(validity__contains=time)
+
+    def overlapping(self, start, end):
+        """
+        Filter to parkings which are valid at some point between given times.
+
+        Same as `starts_before(end).ends_after(start)`, but with a single
+        range predicate.
+
+        :type start: datetime.datetime
+        :type end: datetime.datetime
+        :rtype: ParkingQuerySet
+        """
+        return self.filter(validity__overlap=DateTimeTZRange(start, end, '[]'))
 
     def starts_before(self, time):
-        return self.filter(time_start__lte=time)
+        return self.filter(validity__overlap=DateTimeTZRange(None, time, '[]'))
 
     def ends_after(self, time):
-        return self.filter(Q(time_end__gte=time) | Q(time_end=None))
+        return self.filter(validity__overlap=DateTimeTZRange(time, None, '[]'))
 
     def ends_before(self, time):
         return self.exclude(time_end=None).filter(time_end__lt=time)
 
+    def nearest(self, location, radius):
+        """
+        Filter to parkings within radius from location, nearest first.
+
+        The parkings are annotated with their distance in meters.  The
+        filtering is done with ST_DWithin and the ordering with the KNN
+        distance operator <->, so that both are served by the spatial
+        index of location_gk25fin.
+
+        :type location: django.contrib.gis.geos.Point
+        :param location: Location in GK25-FIN
+        :type radius: float
+        :param radius: Radius in meters
+        :rtype: ParkingQuerySet
+        """
+        distance = GeometryDistance('location_gk25fin', location)
+        return (
+            self.filter(location_gk25fin__dwithin=(location, D(m=radius)))
+            .annotate(distance=distance)
+            .order_by(distance))
+
+    def get_horizon(self):
+        """
+        Get the oldest transaction id which may still be in progress.
+
+        All parkings written by transactions with a smaller id are
+        visible, so the parkings written after this are found later with
+        `transaction_id__gte` of the returned value.
+
+        :rtype: int
+        """
+        return get_transaction_horizon(self.db)
+
     def anonymize(self):  # override to also anonymize normalized_reg_num
         return self.update(registration_number="", normalized_reg_num="")
 
@@ -82,6 +132,17 @@ class ParkingQuerySet(AnonymizableRegNumQuerySet, models.QuerySet):
         normalized_reg_num = normalize_reg_num(registration_number)
         return self.filter(normalized_reg_num=normalized_reg_num)
 
+    def registration_numbers_like(self, registration_numbers):
+        """
+        Filter to parkings having registration number like any given value.
+
+        :type registration_numbers: Iterable[str]
+        :rtype: ParkingQuerySet
+        """
+        normalized_reg_nums = {
+            normalize_reg_num(x) for x in registration_numbers}
+        return self.filter(normalized_reg_num__in=normalized_reg_nums)
+
 
 class AbstractParking(TimestampedModelMixin, UUIDPrimaryKeyMixin):
 
@@ -107,6 +168,11 @@ class AbstractParking(TimestampedModelMixin, UUIDPrimaryKeyMixin):
     time_end = models.DateTimeField(
         verbose_name=_("parking end time"), db_index=True, null=True, blank=True,
     )
+    # Generated from time_start and time_end by the database, see the
+    # migration 0069.  Empty if the parking ends before it starts.
+    validity = GeneratedRangeField(
+        verbose_name=_("validity"), null=True, editable=False,
+    )
     domain = models.ForeignKey(
         EnforcementDomain, on_delete=models.PROTECT,
         null=True,)
@@ -142,7 +208,7 @@ class AbstractParking(TimestampedModelMixin, UUIDPrimaryKeyMixin):
         if update_fields is None or 'normalized_reg_num' in update_fields:
             self.normalized_reg_num = normalize_reg_num(self.registration_number)
         if (update_fields is None or 'location' in update_fields) and self.location:
-            self.location_gk25fin = self.location.transform(GK25FIN_SRID, clone=True)
+            self.location_gk25fin = transform_point(self.location, GK25FIN_SRID)
 
         super().save(update_fields=update_fields, *args, **kwargs)
 
@@ -177,11 +243,28 @@ class AbstractArchivedParking(AbstractParking):
 
 
 class Parking(AbstractArchivedParking):
+    # Set by the database, see TransactionIdField.  Used by the hot
+    # parking index to catch up the parkings in their commit order.
+    transaction_id = TransactionIdField(
+        verbose_name=_("transaction id"), null=True, editable=False)
 
     class Meta:
         verbose_name = _("parking")
         verbose_name_plural = _("parkings")
         default_related_name = "parkings"
+        indexes = [
+            # Covers the lookups of the parkings of a vehicle
+            models.Index(
+                fields=['domain', 'normalized_reg_num', 'time_start'],
+                include=['time_end', 'zone', 'id'],
+                name='parking_domain_regnum_idx'),
+            GistIndex(
+                fields=['domain', 'normalized_reg_num', 'validity'],
+                name='parking_regnum_validity_gist'),
+            models.Index(
+                fields=['domain', 'transaction_id'],
+                name='parking_domain_xact_idx'),
+        ]
 
     def archive(self):
         archived_parking = self.make_archived_parking()
@@ -191,7 +274,9 @@ class Parking(AbstractArchivedParking):
             return archived_parking
 
     def make_archived_parking(self):
-        fields = [field.name for field in self._meta.fields]
+        fields = [
+            field.name for field in self._meta.fields
+            if not getattr(field, "generated", False)]
         values = {field: getattr(self, field) for field in fields}
         return ArchivedParking(**values)
 
@@ -199,7 +284,7 @@ class Parking(AbstractArchivedParking):
         if not self.location:
             return None
         region_srid = Region._meta.get_field('geom').srid
-        location = self.location.transform(region_srid, clone=True)
+        location = transform_point(self.location, region_srid)
         regions = Region.objects.filter(domain=self.domain)
         intersecting = regions.filter(geom__intersects=location)
         return intersecting.first()
@@ -301,7 +386,9 @@ class ArchivedParking(AbstractArchivedParking):
         pk_field = parkings.model._meta.pk
         ids_queryset = parkings.values(pk_field.name)
         (ids_sql, ids_params) = ids_queryset.query.sql_with_params()
-        common_columns = [quote(x.column) for x in parkings.model._meta.fields]
+        common_columns = [
+            quote(x.column) for x in parkings.model._meta.fields
+            if not getattr(x, "generated", False)]
         dest_columns = common_columns + [quote("archived_at")]
         src_columns = common_columns + ["%s"]
         copy_values_with_insert_select_sql = (
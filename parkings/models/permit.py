@@ -2,19 +2,22 @@ from datetime import datetime
 
 from django.conf import settings
 from django.contrib.gis.db import models as gis_models
+from django.contrib.postgres.indexes import GistIndex
+from django.core.exceptions import EmptyResultSet
 from django.core.serializers.json import DjangoJSONEncoder
 from django.db import connections, models, router, transaction
-from django.db.models import JSONField
+from django.db.backends.postgresql.psycopg_any import DateTimeTZRange
+from django.db.models import Exists, JSONField, OuterRef, Q
 from django.db.models.expressions import RawSQL
 from django.utils import timezone
 from django.utils.translation import gettext_lazy as _
 
-from ..fields import CleaningJsonField
+from ..fields import CleaningJsonField, GeneratedRangeField
 from ..validators import DictListValidator, TextField, TimestampField
 from .constants import GK25FIN_SRID
 from .enforcement_domain import EnforcementDomain
 from .mixins import AnonymizableRegNumQuerySet, TimestampedModelMixin
-from .utils import normalize_reg_num
+from .utils import get_transaction_horizon, normalize_reg_num
 
 
 class PermitAreaQuerySet(models.QuerySet):
@@ -64,6 +67,54 @@ class PermitSeriesQuerySet(models.QuerySet):
             timezone.now() - settings.PARKKIHUBI_PERMITS_PRUNABLE_AFTER)
         return self.filter(created_at__lt=limit, active=False)
 
+    def update_lookup_item_activity(self):
+        """
+        Update is_active of the lookup items of the series in this queryset.
+
+        The items are updated with a single UPDATE statement which
+        copies the activity of the series to the items whose activity
+        differs from it.
+
+        :rtype: int
+        :returns: Number of the updated lookup items
+        """
+        connection = connections[self.db]
+        quote = connection.ops.quote_name
+        (ids_sql, ids_params) = self.values("pk").query.sql_with_params()
+        # The updated items are also recorded to the change log: items
+        # of an activated series are added and items of a deactivated
+        # series are removed
+        sql = """
+            WITH updated AS (
+                UPDATE {item_table} AS pli SET is_active = ps.active
+                FROM {permit_table} AS pe
+                JOIN {series_table} AS ps ON ps.id = pe.series_id
+                WHERE pe.id = pli.permit_id
+                  AND ps.id IN ({series_ids})
+                  AND pli.is_active <> ps.active
+                RETURNING pli.*
+            )
+            {insert_changes}
+            FROM updated AS pli
+            LEFT JOIN {area_table} AS pa ON pa.id = pli.area_id
+        """.format(
+            item_table=quote(PermitLookupItem._meta.db_table),
+            permit_table=quote(Permit._meta.db_table),
+            series_table=quote(PermitSeries._meta.db_table),
+            series_ids=ids_sql,
+            insert_changes=_get_insert_changes_sql(
+                quote, kind="""
+                    CASE WHEN pli.is_active THEN '{added}'
+                    ELSE '{removed}' END
+                """.format(
+                    added=PermitLookupItemChange.ADDED,
+                    removed=PermitLookupItemChange.REMOVED)),
+            area_table=quote(PermitArea._meta.db_table),
+        )
+        with connection.cursor() as cursor:
+            cursor.execute(sql, ids_params)
+            return cursor.rowcount
+
 
 class PermitSeries(TimestampedModelMixin, models.Model):
     active = models.BooleanField(default=False)
@@ -91,16 +142,36 @@ class PermitQuerySet(models.QuerySet):
         return self.filter(series__active=True)
 
     def by_time(self, timestamp):
-        lookup_items = PermitLookupItem.objects.by_time(timestamp)
-        return self.filter(lookup_items__in=lookup_items).distinct()
+        return self.by_lookup(time=timestamp)
 
     def by_subject(self, registration_number):
-        lookup_items = PermitLookupItem.objects.by_subject(registration_number)
-        return self.filter(lookup_items__in=lookup_items).distinct()
+        return self.by_lookup(subject=registration_number)
 
     def by_area(self, area):
-        lookup_items = PermitLookupItem.objects.by_area(area)
-        return self.filter(lookup_items__in=lookup_items).distinct()
+        return self.by_lookup(area=area)
+
+    def by_lookup(self, time=None, subject=None, area=None):
+        """
+        Filter to permits which have a lookup item matching given values.
+
+        All the given values must match the same lookup item.  The
+        filtering is done with a correlated EXISTS subquery, so the
+        permits are not duplicated and there is no need for DISTINCT.
+
+        :type time: datetime.datetime|str|None
+        :type subject: str|None
+        :param subject: Registration number
+        :type area: PermitArea|None
+        :rtype: PermitQuerySet
+        """
+        lookup_items = PermitLookupItem.objects.filter(permit=OuterRef('pk'))
+        if time is not None:
+            lookup_items = lookup_items.by_time(time)
+        if subject is not None:
+            lookup_items = lookup_items.by_subject(subject)
+        if area is not None:
+            lookup_items = lookup_items.by_area(area)
+        return self.filter(Exists(lookup_items))
 
     def all_items_end_before(self, time: datetime) -> "PermitQuerySet":
         """
@@ -131,7 +202,7 @@ class PermitQuerySet(models.QuerySet):
             """
             SELECT DISTINCT(permit_id)
             FROM {item_table} AS pli
-            WHERE pli.end_time >= %s
+            WHERE pli.validity && tstzrange(%s, NULL, '[]')
             """.format(
                 item_table=quote(PermitLookupItem._meta.db_table),
             ),
@@ -143,9 +214,10 @@ class PermitQuerySet(models.QuerySet):
         """
         Filter to permits that have not been fully anonymized.
         """
-        subjects = PermitSubjectItem.objects.unanonymized()
-        permits_which_have_data = subjects.values("permit")
-        return self.filter(id__in=permits_which_have_data)
+        subjects_with_data = (
+            PermitSubjectItem.objects.unanonymized()
+            .filter(permit=OuterRef("pk")))
+        return self.filter(Exists(subjects_with_data))
 
     @transaction.atomic
     def anonymize(self, batch_size=1000):
@@ -171,6 +243,13 @@ class PermitQuerySet(models.QuerySet):
             subjects.anonymize()
         return count
 
+    def delete(self):
+        with transaction.atomic(using=self.db, savepoint=False):
+            (PermitLookupItem.objects.using(self.db)
+             .filter(permit__in=self.values("pk"))
+             .record_changes(PermitLookupItemChange.REMOVED))
+            return super().delete()
+
     def bulk_create(self, permits, *args, **kwargs):
         for permit in permits:
             assert isinstance(permit, Permit)
@@ -186,6 +265,9 @@ class PermitQuerySet(models.QuerySet):
                         permit.domain_id,
                         PermitArea.get_identifier_map(permit.domain, self.db)))
                 permit._create_all_items(area_ids, using=self.db, is_new=True)
+            (PermitLookupItem.objects.using(self.db)
+             .filter(permit__in=created_permits)
+             .record_changes(PermitLookupItemChange.ADDED))
             return created_permits
 
 
@@ -240,11 +322,22 @@ class Permit(TimestampedModelMixin, models.Model):
         with transaction.atomic(using=using, savepoint=False):
             super(Permit, self).save(using=using, *args, **kwargs)
             self._create_all_items(using=using, is_new=is_new)
+            (self.lookup_items.all().using(using)
+             .record_changes(PermitLookupItemChange.ADDED))
+
+    def delete(self, using=None, *args, **kwargs):
+        using = using or router.db_for_write(type(self), instance=self)
+        with transaction.atomic(using=using, savepoint=False):
+            (self.lookup_items.all().using(using)
+             .record_changes(PermitLookupItemChange.REMOVED))
+            return super().delete(using=using, *args, **kwargs)
 
     def _create_all_items(self, area_ids=None, using="default", is_new=False):
         if area_ids is None:
             area_ids = PermitArea.get_identifier_map(self.domain, using)
         if not is_new:
+            (self.lookup_items.all().using(using)
+             .record_changes(PermitLookupItemChange.REMOVED))
             self.lookup_items.all().using(using).delete()
             self.subject_items.all().using(using).delete()
             self.area_items.all().using(using).delete()
@@ -309,6 +402,8 @@ class Permit(TimestampedModelMixin, models.Model):
                     continue
                 yield PermitLookupItem(
                     permit=self,
+                    domain_id=self.domain_id,
+                    is_active=self.series.active,
                     subject_item=subject_item,
                     area_item=area_item,
                     registration_number=normalize_reg_num(
@@ -357,20 +452,73 @@ class PermitAreaItem(models.Model):
 
 class PermitLookupItemQuerySet(AnonymizableRegNumQuerySet, models.QuerySet):
     def active(self):
-        return self.filter(permit__series__active=True)
+        return self.filter(is_active=True)
 
     def by_time(self, timestamp):
-        return self.filter(start_time__lte=timestamp, end_time__gte=timestamp)
+        # Compare to a single point range, since the timestamp may also
+        # be given as a string
+        point = DateTimeTZRange(timestamp, timestamp, '[]')
+        return self.filter(validity__contains=point)
+
+    def overlapping(self, start, end):
+        """
+        Filter to items which are valid at some point between given times.
+
+        :type start: datetime.datetime
+        :type end: datetime.datetime
+        :rtype: PermitLookupItemQuerySet
+        """
+        return self.filter(validity__overlap=DateTimeTZRange(start, end, '[]'))
 
     def by_subject(self, registration_number):
         normalized_reg_num = normalize_reg_num(registration_number)
         return self.filter(registration_number=normalized_reg_num)
 
+    def by_subjects(self, registration_numbers):
+        normalized_reg_nums = {
+            normalize_reg_num(x) for x in registration_numbers}
+        return self.filter(registration_number__in=normalized_reg_nums)
+
     def by_area(self, area):
         return self.filter(area=area)
 
     def ends_before(self, time):
-        return self.filter(end_time__lt=time)
+        return self.filter(validity__fully_lt=DateTimeTZRange(time, None, '[]'))
+
+    def record_changes(self, kind):
+        """
+        Record the active items of this queryset to the change log.
+
+        The changes are inserted with a single INSERT ... SELECT
+        statement.  Inactive items are skipped, since they are not
+        visible to the enforcement.
+
+        :type kind: str
+        :param kind: PermitLookupItemChange.ADDED or REMOVED
+        :rtype: int
+        :returns: Number of the recorded changes
+        """
+        connection = connections[self.db]
+        quote = connection.ops.quote_name
+        try:
+            (ids_sql, ids_params) = (
+                self.order_by().values("pk").query.sql_with_params())
+        except EmptyResultSet:
+            return 0
+        sql = """
+            {insert_changes}
+            FROM {item_table} AS pli
+            LEFT JOIN {area_table} AS pa ON pa.id = pli.area_id
+            WHERE pli.is_active AND pli.id IN ({item_ids})
+        """.format(
+            insert_changes=_get_insert_changes_sql(quote, kind="%s"),
+            item_table=quote(PermitLookupItem._meta.db_table),
+            area_table=quote(PermitArea._meta.db_table),
+            item_ids=ids_sql,
+        )
+        with connection.cursor() as cursor:
+            cursor.execute(sql, (kind,) + tuple(ids_params))
+            return cursor.rowcount
 
 
 class PermitLookupItem(models.Model):
@@ -386,6 +534,14 @@ class PermitLookupItem(models.Model):
     area = models.ForeignKey(PermitArea, on_delete=models.PROTECT, default=None, null=True, blank=True)
     start_time = models.DateTimeField()
     end_time = models.DateTimeField()
+    # Copies of the domain of the permit and the activity of its series
+    # to avoid joining those to the lookups
+    domain = models.ForeignKey(
+        EnforcementDomain, on_delete=models.PROTECT, related_name='+',
+        db_index=False)
+    is_active = models.BooleanField(default=False)
+    # Generated from start_time and end_time by the database
+    validity = GeneratedRangeField(null=True, editable=False)
 
     objects = PermitLookupItemQuerySet.as_manager()
 
@@ -394,6 +550,17 @@ class PermitLookupItem(models.Model):
             models.Index(fields=[
                 'registration_number', 'start_time', 'end_time',
                 'area', 'permit']),
+            # Covers the lookups of the permits of a vehicle in an area
+            models.Index(
+                fields=['registration_number', 'area', 'start_time', 'end_time'],
+                include=['permit', 'domain', 'is_active'],
+                name='permitlookup_regnum_area_idx'),
+            models.Index(
+                fields=['domain', 'is_active', 'end_time'],
+                name='permitlookup_domain_active_idx'),
+            GistIndex(
+                fields=['registration_number', 'area', 'validity'],
+                name='permitlookup_regnum_area_gist'),
         ]
         ordering = ('registration_number', 'start_time', 'end_time')
 
@@ -405,3 +572,123 @@ class PermitLookupItem(models.Model):
             start_time=self.start_time, end_time=self.end_time,
             registration_number=self.registration_number,
             area=self.area.identifier)
+
+
+class PermitLookupItemChangeQuerySet(AnonymizableRegNumQuerySet):
+    def ends_before(self, time):
+        return self.filter(end_time__lt=time)
+
+    def prunable(self, time_limit=None):
+        limit = time_limit or (
+            timezone.now() -
+            settings.PARKKIHUBI_PERMIT_ITEM_CHANGES_PRUNABLE_AFTER)
+        return self.filter(created_at__lt=limit)
+
+    def after(self, position):
+        """
+        Filter to changes after given position of the change log.
+
+        :type position: (int, int)
+        :param position: Pair of transaction id and change id
+        :rtype: PermitLookupItemChangeQuerySet
+        """
+        (transaction_id, change_id) = position
+        return self.filter(
+            Q(transaction_id__gt=transaction_id) |
+            Q(transaction_id=transaction_id, id__gt=change_id))
+
+    def get_horizon(self):
+        """
+        Get the oldest transaction id which may still be in progress.
+
+        All changes with a smaller transaction id are either committed
+        or rolled back, so no new changes can appear before it.
+
+        :rtype: int
+        """
+        return get_transaction_horizon(self.db)
+
+
+class PermitLookupItemChange(models.Model):
+    """
+    Change log of the active permit lookup items.
+
+    A change is recorded when an active lookup item is created or
+    deleted, or when its activity changes with the activity of its
+    series.  Since the lookup items of a permit are recreated when the
+    permit is saved, a modification is recorded as a removal and an
+    addition.
+
+    The changes are ordered by the id of the writing transaction and
+    then by their id, because ids of concurrent transactions may become
+    visible out of order.
+
+    The changes older than PARKKIHUBI_PERMIT_ITEM_CHANGES_PRUNABLE_AFTER
+    are deleted by the clean_reg_nums command, so a client with an older
+    cursor has to fetch the full list of valid permit items again.
+    """
+    ADDED = 'added'
+    REMOVED = 'removed'
+    KIND_CHOICES = [
+        (ADDED, _("added")),
+        (REMOVED, _("removed")),
+    ]
+
+    id = models.BigAutoField(primary_key=True)
+    transaction_id = models.BigIntegerField(verbose_name=_("transaction id"))
+    created_at = models.DateTimeField(verbose_name=_("time created"))
+    kind = models.CharField(
+        max_length=7, choices=KIND_CHOICES, verbose_name=_("kind"))
+    domain = models.ForeignKey(
+        EnforcementDomain, on_delete=models.CASCADE, related_name='+',
+        db_index=False)
+    # The item and its permit may already be deleted, so these are not
+    # foreign keys
+    item_id = models.IntegerField(verbose_name=_("lookup item id"))
+    permit_id = models.IntegerField(verbose_name=_("permit id"))
+    registration_number = models.CharField(max_length=20)
+    area = models.CharField(
+        max_length=10, null=True, blank=True, verbose_name=_("area"))
+    start_time = models.DateTimeField()
+    end_time = models.DateTimeField()
+
+    objects = PermitLookupItemChangeQuerySet.as_manager()
+
+    class Meta:
+        indexes = [
+            models.Index(
+                fields=['domain', 'transaction_id', 'id'],
+                name='permitlookupchange_feed_idx'),
+            models.Index(
+                fields=['created_at', 'id'],
+                name='permitlookupchange_created_idx'),
+        ]
+        ordering = ('transaction_id', 'id')
+        verbose_name = _("permit lookup item change")
+        verbose_name_plural = _("permit lookup item changes")
+
+    def __str__(self):
+        return '{kind} {item_id} / {registration_number} / {area}'.format(
+            kind=self.kind, item_id=self.item_id,
+            registration_number=self.registration_number, area=self.area)
+
+
+def _get_insert_changes_sql(quote, kind):
+    """
+    Get the INSERT part of a statement which records changes.
+
+    The rest of the statement should select the lookup items as "pli"
+    and their areas as "pa".
+    """
+    return """
+        INSERT INTO {change_table} (
+            transaction_id, created_at, kind, domain_id, item_id,
+            permit_id, registration_number, area, start_time, end_time)
+        SELECT
+            pg_current_xact_id()::text::bigint, now(), {kind},
+            pli.domain_id, pli.id, pli.permit_id, pli.registration_number,
+            pa.identifier, pli.start_time, pli.end_time
+    """.format(
+        change_table=quote(PermitLookupItemChange._meta.db_table),
+        kind=kind,
+    )
@@ -14,9 +14,7 @@ from .parking_area import ParkingArea
 class RegionQuerySet(models.QuerySet):
     def with_parking_count(self, at_time=None):
         time = at_time if at_time else timezone.now()
-        valid_parkings_q = (
-            Q(parkings__time_start__lte=time) &
-            (Q(parkings__time_end__gte=time) | Q(parkings__time_end=None)))
+        valid_parkings_q = Q(parkings__validity__contains=time)
         return self.annotate(
             parking_count=Count(Case(When(valid_parkings_q, then=1))))
 
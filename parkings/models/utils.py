@@ -1,5 +1,7 @@
 from django.contrib.gis.db.models.functions import Distance
+from django.db import connections
 
+from ..utils.coordinates import transform_point
 from .parking_area import ParkingArea
 
 
@@ -13,9 +15,26 @@ def get_closest_area(location, domain, max_distance=50, area_model=ParkingArea):
     if not location:
         return None
     area_srid = area_model._meta.get_field('geom').srid
-    location = location.transform(area_srid, clone=True)
+    location = transform_point(location, area_srid)
     areas = area_model.objects.filter(domain=domain)
     with_distance = areas.annotate(distance=Distance('geom', location))
     within_range = with_distance.filter(distance__lte=max_distance)
     closest_area = within_range.order_by('distance').first()
     return closest_area
+
+
+def get_transaction_horizon(using):
+    """
+    Get the oldest transaction id which may still be in progress.
+
+    All transactions with a smaller id are either committed or rolled
+    back, so no new rows written by them can appear after this.
+
+    :type using: str
+    :param using: Alias of the database
+    :rtype: int
+    """
+    with connections[using].cursor() as cursor:
+        cursor.execute(
+            "SELECT pg_snapshot_xmin(pg_current_snapshot())::text::bigint")
+        return cursor.fetchone()[0]
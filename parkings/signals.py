@@ -1,12 +1,24 @@
 from decimal import Decimal
 from math import ceil
 
+from django.conf import settings
 from django.db import transaction
-from django.db.models.signals import post_delete, post_save, pre_delete
+from django.db.models.signals import (
+    post_delete, post_save, pre_delete, pre_save)
 from django.dispatch import receiver
 from django.utils import timezone
+from rest_framework.authtoken.models import Token
 
-from parkings.models import EventArea, EventAreaStatistics, EventParking
+from parkings.lookups.areas import area_index
+from parkings.lookups.parkings import hot_parking_index
+from parkings.lookups.permits import permit_index
+from parkings.lookups.plates import plate_filter
+from parkings.lookups.users import user_cache
+from parkings.lookups.verdicts import verdict_cache
+from parkings.models import (
+    Enforcer, EventArea, EventAreaStatistics, EventParking, Monitor, Operator,
+    Parking, PaymentZone, Permit, PermitArea, PermitLookupItem, PermitSeries)
+from parkings.models.utils import normalize_reg_num
 
 
 @transaction.atomic
@@ -50,3 +62,149 @@ def event_area_on_delete(sender, **kwargs):
     # Only test event areas can be deleted.
     if obj.is_test:
         EventAreaStatistics.objects.filter(event_area=obj).delete()
+
+
+@receiver(post_save, sender=PaymentZone)
+@receiver(post_delete, sender=PaymentZone)
+@receiver(post_save, sender=PermitArea)
+@receiver(post_delete, sender=PermitArea)
+def area_geometry_on_change(sender, **kwargs):
+    transaction.on_commit(area_index.invalidate)
+
+
+def invalidate_verdicts_on_commit(domain_id, reg_nums):
+    transaction.on_commit(
+        lambda: verdict_cache.invalidate_registration_numbers(
+            domain_id, reg_nums))
+
+
+@receiver(pre_save, sender=Parking)
+@receiver(pre_save, sender=EventParking)
+def parking_on_pre_save(sender, instance, **kwargs):
+    # Remember the old registration number of an updated parking, so
+    # that the verdicts of both the old and the new one are invalidated
+    if verdict_cache.enabled and not instance._state.adding:
+        instance._old_reg_nums = set(
+            sender.objects.filter(pk=instance.pk)
+            .values_list("normalized_reg_num", flat=True))
+
+
+@receiver(post_save, sender=Parking)
+@receiver(post_save, sender=EventParking)
+@receiver(post_delete, sender=Parking)
+@receiver(post_delete, sender=EventParking)
+def parking_on_change(sender, instance, **kwargs):
+    if verdict_cache.enabled:
+        reg_nums = getattr(instance, "_old_reg_nums", set())
+        reg_nums.add(instance.normalized_reg_num)
+        invalidate_verdicts_on_commit(instance.domain_id, reg_nums)
+
+
+@receiver(pre_save, sender=Permit)
+def permit_on_pre_save(sender, instance, **kwargs):
+    if verdict_cache.enabled and not instance._state.adding:
+        instance._old_reg_nums = set(
+            PermitLookupItem.objects.filter(permit=instance)
+            .values_list("registration_number", flat=True))
+
+
+@receiver(post_save, sender=Permit)
+def permit_on_save(sender, instance, **kwargs):
+    subject_reg_nums = {
+        normalize_reg_num(subject["registration_number"])
+        for subject in instance.subjects}
+    if verdict_cache.enabled:
+        reg_nums = getattr(instance, "_old_reg_nums", set())
+        invalidate_verdicts_on_commit(
+            instance.domain_id, reg_nums | subject_reg_nums)
+    if plate_filter.enabled:
+        transaction.on_commit(
+            lambda: plate_filter.add(instance.domain_id, subject_reg_nums))
+    if permit_index.enabled and instance.series.active:
+        transaction.on_commit(permit_index.invalidate)
+
+
+def update_permit_series_activity(series_queryset):
+    """
+    Copy the activity of permit series to their lookup items.
+
+    The lookups depending on the activity are invalidated when the
+    current transaction is committed, if any of the items changed.
+    Used both for the saves of single series and for the activation
+    endpoint, which may deactivate other series with a bulk update.
+
+    :type series_queryset: parkings.models.permit.PermitSeriesQuerySet
+    """
+    if series_queryset.update_lookup_item_activity():
+        transaction.on_commit(verdict_cache.invalidate_all)
+        transaction.on_commit(permit_index.invalidate)
+        transaction.on_commit(plate_filter.invalidate)
+
+
+@receiver(post_save, sender=PermitSeries)
+def permit_series_on_save(sender, instance, created, **kwargs):
+    if not created:
+        update_permit_series_activity(
+            PermitSeries.objects.filter(pk=instance.pk))
+
+
+@receiver(post_save, sender=Parking)
+@receiver(post_save, sender=EventParking)
+def parking_plate_on_save(sender, instance, **kwargs):
+    if plate_filter.enabled:
+        transaction.on_commit(lambda: plate_filter.add(
+            instance.domain_id, [instance.normalized_reg_num]))
+
+
+@receiver(post_save, sender=Parking)
+def parking_on_save(sender, instance, **kwargs):
+    if hot_parking_index.enabled:
+        transaction.on_commit(lambda: hot_parking_index.put(instance))
+
+
+@receiver(post_delete, sender=Parking)
+def parking_on_delete(sender, instance, **kwargs):
+    if hot_parking_index.enabled:
+        transaction.on_commit(lambda: hot_parking_index.remove(instance))
+
+
+@receiver(post_save, sender=Token)
+@receiver(post_delete, sender=Token)
+def token_on_change(sender, instance, **kwargs):
+    if user_cache.enabled:
+        transaction.on_commit(
+            lambda: user_cache.invalidate_api_key(instance.key))
+
+
+@receiver(pre_save, sender=settings.AUTH_USER_MODEL)
+def user_on_pre_save(sender, instance, **kwargs):
+    # Remember the old username of an updated user, so that the cached
+    # entry of a renamed user is invalidated too
+    if user_cache.enabled and not instance._state.adding:
+        instance._old_usernames = set(
+            sender.objects.filter(pk=instance.pk)
+            .values_list("username", flat=True))
+
+
+@receiver(post_save, sender=settings.AUTH_USER_MODEL)
+@receiver(post_delete, sender=settings.AUTH_USER_MODEL)
+def user_on_change(sender, instance, **kwargs):
+    if user_cache.enabled:
+        user_id = instance.pk
+        usernames = getattr(instance, "_old_usernames", set())
+        usernames.add(instance.username)
+        transaction.on_commit(
+            lambda: user_cache.invalidate_usernames(usernames))
+        transaction.on_commit(lambda: user_cache.invalidate_user(user_id))
+
+
+@receiver(post_save, sender=Enforcer)
+@receiver(post_delete, sender=Enforcer)
+@receiver(post_save, sender=Operator)
+@receiver(post_delete, sender=Operator)
+@receiver(post_save, sender=Monitor)
+@receiver(post_delete, sender=Monitor)
+def user_profile_on_change(sender, instance, **kwargs):
+    if user_cache.enabled:
+        transaction.on_commit(
+            lambda: user_cache.invalidate_user(instance.user_id))
@@ -3,18 +3,27 @@
 import datetime
 import json
 from datetime import timedelta
+from unittest import mock
 
 import pytest
 from django.contrib.gis.geos import MultiPolygon, Point, Polygon
+from django.core.cache import cache
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
 from django.urls import reverse
 from django.utils import timezone
 from rest_framework.status import HTTP_200_OK, HTTP_400_BAD_REQUEST
 
+from parkings.api.enforcement.parking_check_log import parking_check_log
 from parkings.api.monitoring.region import WGS84_SRID
 from parkings.factories import EnforcerFactory
 from parkings.factories.parking import create_payment_zone
 from parkings.factories.permit import create_permit_series
-from parkings.models import ParkingCheck, Permit, PermitArea
+from parkings.lookups.parkings import hot_parking_index
+from parkings.lookups.permits import permit_index
+from parkings.lookups.plates import plate_filter
+from parkings.models import (
+    Parking, ParkingCheck, PaymentZone, Permit, PermitArea)
 from parkings.models.constants import GK25FIN_SRID
 from parkings.tests.api.utils import check_required_fields
 
@@ -375,3 +384,450 @@ def test_enforcer_can_view_only_own_permit(enforcer_api_client, staff_user, enfo
     assert response.status_code == HTTP_200_OK
     assert response.data["allowed"] is True
     assert response.data["end_time"] == end_time
+
+
+def test_area_lookups_do_not_query_geometries(enforcer_api_client, enforcer):
+    create_payment_zone(domain=enforcer.enforced_domain)
+    create_permit_area(enforcer_api_client)
+    enforcer_api_client.post(list_url, data=PARKING_DATA)
+
+    with CaptureQueriesContext(connection) as context:
+        response = enforcer_api_client.post(list_url, data=PARKING_DATA)
+
+    assert response.data["location"] == {
+        "payment_zone": 1, "permit_area": "A"}
+    queried_sql = " ".join(x["sql"] for x in context.captured_queries)
+    assert "ST_Contains" not in queried_sql
+
+
+def test_changed_zone_is_noticed(enforcer_api_client, enforcer):
+    zone = create_payment_zone(domain=enforcer.enforced_domain)
+    response = enforcer_api_client.post(list_url, data=PARKING_DATA)
+    assert response.data["location"]["payment_zone"] == 1
+
+    zone.number = 3
+    zone.save()
+    response = enforcer_api_client.post(list_url, data=PARKING_DATA)
+    assert response.data["location"]["payment_zone"] == 3
+
+    zone.delete()
+    response = enforcer_api_client.post(list_url, data=PARKING_DATA)
+    assert response.data["location"]["payment_zone"] is None
+
+
+def test_zone_changed_by_other_worker_is_noticed_after_max_age(
+        enforcer_api_client, enforcer, settings):
+    settings.PARKKIHUBI_AREA_INDEX_MAX_AGE = timedelta(0)
+    zone = create_payment_zone(domain=enforcer.enforced_domain)
+    response = enforcer_api_client.post(list_url, data=PARKING_DATA)
+    assert response.data["location"]["payment_zone"] == 1
+
+    # Update without signals, like another worker process would
+    PaymentZone.objects.filter(pk=zone.pk).update(number=3)
+    response = enforcer_api_client.post(list_url, data=PARKING_DATA)
+
+    assert response.data["location"]["payment_zone"] == 3
+
+
+@pytest.mark.parametrize("ended_minutes_ago,expected_end_time", [
+    (5, "end_time"),
+    (20, None),
+])
+def test_recently_expired_parking_is_returned_within_grace_duration(
+        enforcer_api_client, enforcer, parking_factory,
+        ended_minutes_ago, expected_end_time):
+    zone = create_payment_zone(domain=enforcer.enforced_domain)
+    now = timezone.now()
+    parking = parking_factory(
+        registration_number="ABC-123", zone=zone, domain=zone.domain,
+        time_start=(now - timedelta(hours=1)),
+        time_end=(now - timedelta(minutes=ended_minutes_ago)))
+
+    response = enforcer_api_client.post(list_url, data=PARKING_DATA)
+
+    assert response.status_code == HTTP_200_OK
+    assert response.data["allowed"] is False
+    if expected_end_time:
+        assert response.data["end_time"] == parking.time_end
+        assert ParkingCheck.objects.get().found_parking == parking
+    else:
+        assert response.data["end_time"] is None
+        assert ParkingCheck.objects.get().found_parking is None
+
+
+def test_valid_permit_is_preferred_to_expired_parking(
+        enforcer_api_client, enforcer, parking_factory):
+    create_permit_area(enforcer_api_client)
+    end_time = timezone.now() + datetime.timedelta(days=3)
+    create_permit(domain=enforcer.enforced_domain, end_time=end_time)
+    now = timezone.now()
+    parking_factory(
+        registration_number="ABC-123", domain=enforcer.enforced_domain,
+        time_start=(now - timedelta(hours=1)),
+        time_end=(now - timedelta(minutes=5)))
+
+    response = enforcer_api_client.post(list_url, data=PARKING_DATA)
+
+    assert response.data["allowed"] is True
+    assert response.data["end_time"] == end_time
+    assert ParkingCheck.objects.get().found_parking is None
+
+
+def test_rights_are_checked_with_single_query(enforcer_api_client, enforcer):
+    create_payment_zone(domain=enforcer.enforced_domain)
+    create_permit_area(enforcer_api_client)
+    enforcer_api_client.post(list_url, data=PARKING_DATA)
+
+    with CaptureQueriesContext(connection) as context:
+        response = enforcer_api_client.post(list_url, data=PARKING_DATA)
+
+    assert response.data["allowed"] is False
+    parking_queries = [
+        x for x in context.captured_queries
+        if '"parkings_parking"' in x["sql"]]
+    assert len(parking_queries) == 1
+    assert '"parkings_permitlookupitem"' in parking_queries[0]["sql"]
+    assert '"parkings_eventparking"' in parking_queries[0]["sql"]
+
+
+def test_checks_are_written_behind(enforcer_api_client, settings):
+    settings.PARKKIHUBI_PARKING_CHECK_WRITE_BEHIND = True
+    settings.PARKKIHUBI_PARKING_CHECK_FLUSH_SIZE = 3
+    settings.PARKKIHUBI_PARKING_CHECK_FLUSH_INTERVAL = timedelta(hours=1)
+
+    for _ in range(2):
+        response = enforcer_api_client.post(list_url, data=PARKING_DATA)
+        assert response.status_code == HTTP_200_OK
+    assert ParkingCheck.objects.count() == 0
+
+    enforcer_api_client.post(list_url, data=PARKING_DATA)
+    assert ParkingCheck.objects.count() == 3
+
+    enforcer_api_client.post(list_url, data=PARKING_DATA)
+    assert ParkingCheck.objects.count() == 3
+    parking_check_log.flush()
+    assert ParkingCheck.objects.count() == 4
+    assert ParkingCheck.objects.first().registration_number == "ABC-123"
+
+
+def test_checks_written_behind_keep_their_time(enforcer_api_client, settings):
+    settings.PARKKIHUBI_PARKING_CHECK_WRITE_BEHIND = True
+    settings.PARKKIHUBI_PARKING_CHECK_FLUSH_INTERVAL = timedelta(hours=1)
+    enforcer_api_client.post(list_url, data=PARKING_DATA)
+    checked_at = timezone.now()
+
+    parking_check_log.flush()
+
+    assert ParkingCheck.objects.get().created_at <= checked_at
+
+
+def test_checks_of_deleted_parkings_are_written_behind(
+        enforcer_api_client, enforcer, parking_factory, settings):
+    settings.PARKKIHUBI_PARKING_CHECK_WRITE_BEHIND = True
+    settings.PARKKIHUBI_PARKING_CHECK_FLUSH_INTERVAL = timedelta(hours=1)
+    zone = create_payment_zone(domain=enforcer.enforced_domain)
+    parking = parking_factory(
+        registration_number="ABC-123", zone=zone,
+        domain=enforcer.enforced_domain)
+    other_parking = parking_factory(
+        registration_number="XYZ-987", zone=zone,
+        domain=enforcer.enforced_domain)
+    enforcer_api_client.post(list_url, data=PARKING_DATA)
+    enforcer_api_client.post(
+        list_url, data=dict(PARKING_DATA, registration_number="XYZ-987"))
+    parking.delete()
+
+    parking_check_log.flush()
+
+    checks = ParkingCheck.objects.order_by("id")
+    assert [x.found_parking for x in checks] == [None, other_parking]
+
+
+def test_cached_verdict_is_invalidated_by_parking_change(
+        enforcer_api_client, enforcer, parking_factory, settings):
+    settings.PARKKIHUBI_CHECK_PARKING_CACHE_TTL = timedelta(minutes=1)
+    zone = create_payment_zone(domain=enforcer.enforced_domain)
+    data = dict(PARKING_DATA, time=timezone.now())
+    parking = parking_factory(
+        registration_number="ABC-123", zone=zone,
+        domain=enforcer.enforced_domain,
+        time_start=(data["time"] - timedelta(hours=1)),
+        time_end=(data["time"] + timedelta(hours=1)))
+    response = enforcer_api_client.post(list_url, data=data)
+    assert response.data["allowed"] is True
+
+    with CaptureQueriesContext(connection) as context:
+        response = enforcer_api_client.post(list_url, data=data)
+
+    assert response.data["allowed"] is True
+    assert ParkingCheck.objects.first().found_parking == parking
+    assert not any(
+        '"parkings_parking"' in x["sql"] for x in context.captured_queries)
+
+    parking.time_end = data["time"] - timedelta(minutes=30)
+    parking.save()
+    response = enforcer_api_client.post(list_url, data=data)
+
+    assert response.data["allowed"] is False
+
+
+def test_cached_verdict_is_invalidated_by_parking_deletion(
+        enforcer_api_client, enforcer, parking_factory, settings):
+    settings.PARKKIHUBI_CHECK_PARKING_CACHE_TTL = timedelta(minutes=1)
+    zone = create_payment_zone(domain=enforcer.enforced_domain)
+    parking = parking_factory(
+        registration_number="ABC-123", zone=zone,
+        domain=enforcer.enforced_domain)
+    response = enforcer_api_client.post(list_url, data=PARKING_DATA)
+    assert response.data["allowed"] is True
+
+    parking.delete()
+    response = enforcer_api_client.post(list_url, data=PARKING_DATA)
+
+    assert response.data["allowed"] is False
+
+
+def test_verdict_is_not_cached_before_right_starts(
+        enforcer_api_client, enforcer, parking_factory, settings):
+    settings.PARKKIHUBI_CHECK_PARKING_CACHE_TTL = timedelta(days=1)
+    zone = create_payment_zone(domain=enforcer.enforced_domain)
+    now = timezone.now()
+    parking_factory(
+        registration_number="ABC-123", zone=zone,
+        domain=enforcer.enforced_domain,
+        time_start=(now + timedelta(seconds=10)),
+        time_end=(now + timedelta(hours=1)))
+
+    before = enforcer_api_client.post(list_url, data=dict(PARKING_DATA, time=now))
+    during = enforcer_api_client.post(
+        list_url, data=dict(PARKING_DATA, time=(now + timedelta(seconds=20))))
+    earlier = enforcer_api_client.post(
+        list_url, data=dict(PARKING_DATA, time=(now + timedelta(seconds=5))))
+
+    assert before.data["allowed"] is False
+    assert during.data["allowed"] is True
+    assert earlier.data["allowed"] is False
+
+
+def test_cached_verdict_is_invalidated_by_activation(
+        enforcer_api_client, enforcer, settings):
+    settings.PARKKIHUBI_CHECK_PARKING_CACHE_TTL = timedelta(minutes=1)
+    create_permit_area(enforcer_api_client)
+    series = create_permit_series(active=False, owner=enforcer.user)
+    create_permit(domain=enforcer.enforced_domain, permit_series=series)
+    response = enforcer_api_client.post(list_url, data=PARKING_DATA)
+    assert response.data["allowed"] is False
+
+    activate_url = reverse(
+        "enforcement:v1:permitseries-detail", kwargs={"pk": series.pk})
+    enforcer_api_client.post(activate_url + "activate/")
+    response = enforcer_api_client.post(list_url, data=PARKING_DATA)
+
+    assert response.data["allowed"] is True
+
+
+def test_cached_verdict_expires_with_parking(
+        enforcer_api_client, enforcer, parking_factory, settings):
+    settings.PARKKIHUBI_CHECK_PARKING_CACHE_TTL = timedelta(days=1)
+    zone = create_payment_zone(domain=enforcer.enforced_domain)
+    now = timezone.now()
+    parking_factory(
+        registration_number="ABC-123", zone=zone,
+        domain=enforcer.enforced_domain,
+        time_start=(now - timedelta(hours=1)),
+        time_end=(now + timedelta(minutes=1)))
+    response = enforcer_api_client.post(list_url, data=PARKING_DATA)
+    assert response.data["allowed"] is True
+
+    data = dict(PARKING_DATA, time=(now + timedelta(minutes=2)))
+    response = enforcer_api_client.post(list_url, data=data)
+
+    assert response.data["allowed"] is False
+
+
+def test_parkings_are_found_from_hot_index(
+        enforcer_api_client, enforcer, parking_factory, settings,
+        shared_cache):
+    settings.PARKKIHUBI_HOT_PARKING_INDEX = True
+    settings.PARKKIHUBI_HOT_PARKING_INDEX_CATCH_UP_INTERVAL = timedelta(hours=1)
+    zone = create_payment_zone(domain=enforcer.enforced_domain)
+    response = enforcer_api_client.post(list_url, data=PARKING_DATA)
+    assert response.data["allowed"] is False
+    hot_parking_index.get(enforcer.enforced_domain)  # Build synchronously
+    parking = parking_factory(
+        registration_number="ABC-123", zone=zone,
+        domain=enforcer.enforced_domain)
+
+    with CaptureQueriesContext(connection) as context:
+        response = enforcer_api_client.post(list_url, data=PARKING_DATA)
+
+    assert response.data["allowed"] is True
+    assert response.data["end_time"] == parking.time_end
+    assert ParkingCheck.objects.first().found_parking == parking
+    assert not any(
+        '"parkings_parking"' in x["sql"] for x in context.captured_queries)
+
+
+def test_hot_index_catches_up_changes_of_other_workers(
+        enforcer_api_client, enforcer, parking_factory, settings,
+        shared_cache):
+    settings.PARKKIHUBI_HOT_PARKING_INDEX = True
+    settings.PARKKIHUBI_HOT_PARKING_INDEX_CATCH_UP_INTERVAL = timedelta(0)
+    zone = create_payment_zone(domain=enforcer.enforced_domain)
+    parking = parking_factory(
+        registration_number="XYZ-999", zone=zone,
+        domain=enforcer.enforced_domain)
+    hot_parking_index.get(enforcer.enforced_domain)  # Build synchronously
+    response = enforcer_api_client.post(list_url, data=PARKING_DATA)
+    assert response.data["allowed"] is False
+
+    # Update without signals, like another worker process would.  The
+    # old modification time is like that of a transaction committed
+    # long after it saved the parking.
+    Parking.objects.filter(pk=parking.pk).update(
+        registration_number="ABC-123", normalized_reg_num="ABC123",
+        modified_at=timezone.now() - timedelta(hours=1))
+    response = enforcer_api_client.post(list_url, data=PARKING_DATA)
+
+    assert response.data["allowed"] is True
+
+
+def test_hot_index_is_not_used_before_it_is_built(
+        enforcer_api_client, enforcer, parking_factory, settings,
+        shared_cache):
+    settings.PARKKIHUBI_HOT_PARKING_INDEX = True
+    zone = create_payment_zone(domain=enforcer.enforced_domain)
+    parking_factory(
+        registration_number="ABC-123", zone=zone,
+        domain=enforcer.enforced_domain)
+
+    with mock.patch.object(hot_parking_index, "start_rebuild") as rebuild:
+        response = enforcer_api_client.post(list_url, data=PARKING_DATA)
+
+    assert response.data["allowed"] is True
+    rebuild.assert_called_once_with(enforcer.enforced_domain)
+
+
+def test_hot_index_is_not_used_for_historic_times(
+        enforcer_api_client, enforcer, parking_factory, settings,
+        shared_cache):
+    settings.PARKKIHUBI_HOT_PARKING_INDEX = True
+    zone = create_payment_zone(domain=enforcer.enforced_domain)
+    now = timezone.now()
+    parking_factory(
+        registration_number="ABC-123", zone=zone,
+        domain=enforcer.enforced_domain,
+        time_start=(now - timedelta(days=2)),
+        time_end=(now - timedelta(days=1)))
+    hot_parking_index.get(enforcer.enforced_domain)
+
+    data = dict(PARKING_DATA, time=(now - timedelta(days=1, hours=1)))
+    response = enforcer_api_client.post(list_url, data=data)
+
+    assert response.data["allowed"] is True
+
+
+def test_permits_are_found_from_permit_index(
+        enforcer_api_client, enforcer, settings, shared_cache):
+    settings.PARKKIHUBI_PERMIT_INDEX = True
+    domain = enforcer.enforced_domain
+    create_permit_area(enforcer_api_client)
+    end_time = timezone.now() + timedelta(days=1)
+    create_permit(domain=domain, end_time=end_time)
+    permit_index.get(domain)  # Build the index synchronously
+
+    with CaptureQueriesContext(connection) as context:
+        response = enforcer_api_client.post(list_url, data=PARKING_DATA)
+
+    assert response.data["allowed"] is True
+    assert response.data["end_time"] == end_time
+    assert not any(
+        '"parkings_permitlookupitem"' in x["sql"]
+        for x in context.captured_queries)
+
+
+def test_permit_index_is_invalidated_by_activation(
+        enforcer_api_client, enforcer, settings, shared_cache):
+    settings.PARKKIHUBI_PERMIT_INDEX = True
+    domain = enforcer.enforced_domain
+    create_permit_area(enforcer_api_client)
+    series = create_permit_series(active=False, owner=enforcer.user)
+    create_permit(domain=domain, permit_series=series)
+    permit_index.get(domain)
+    response = enforcer_api_client.post(list_url, data=PARKING_DATA)
+    assert response.data["allowed"] is False
+
+    activate_url = reverse(
+        "enforcement:v1:permitseries-detail", kwargs={"pk": series.pk})
+    enforcer_api_client.post(activate_url + "activate/")
+    response = enforcer_api_client.post(list_url, data=PARKING_DATA)
+
+    assert response.data["allowed"] is True
+
+
+def test_plate_filter_is_invalidated_by_series_save(
+        enforcer_api_client, enforcer, settings, shared_cache):
+    settings.PARKKIHUBI_PLATE_FILTER = True
+    domain = enforcer.enforced_domain
+    create_permit_area(enforcer_api_client)
+    series = create_permit_series(active=False, owner=enforcer.user)
+    create_permit(domain=domain, permit_series=series)
+    cache.clear()  # Let the marks of the added plates expire
+    plate_filter.get(domain)
+    response = enforcer_api_client.post(list_url, data=PARKING_DATA)
+    assert response.data["allowed"] is False
+
+    # Like an activation in the admin
+    series.active = True
+    series.save()
+    response = enforcer_api_client.post(list_url, data=PARKING_DATA)
+
+    assert response.data["allowed"] is True
+
+
+def test_permit_index_and_verdicts_are_invalidated_by_series_save(
+        enforcer_api_client, enforcer, settings, shared_cache):
+    settings.PARKKIHUBI_PERMIT_INDEX = True
+    settings.PARKKIHUBI_CHECK_PARKING_CACHE_TTL = timedelta(minutes=1)
+    domain = enforcer.enforced_domain
+    create_permit_area(enforcer_api_client)
+    series = create_permit_series(active=True, owner=enforcer.user)
+    create_permit(domain=domain, permit_series=series)
+    permit_index.get(domain)
+    response = enforcer_api_client.post(list_url, data=PARKING_DATA)
+    assert response.data["allowed"] is True
+
+    # Like a deactivation in the admin
+    series.active = False
+    series.save()
+    response = enforcer_api_client.post(list_url, data=PARKING_DATA)
+
+    assert response.data["allowed"] is False
+
+
+def test_plates_without_rights_are_ruled_out_by_plate_filter(
+        enforcer_api_client, enforcer, parking_factory, settings,
+        shared_cache):
+    settings.PARKKIHUBI_PLATE_FILTER = True
+    zone = create_payment_zone(domain=enforcer.enforced_domain)
+    parking_factory(
+        registration_number="XYZ-999", zone=zone,
+        domain=enforcer.enforced_domain)
+    plate_filter.get(enforcer.enforced_domain)  # Build synchronously
+    enforcer_api_client.post(list_url, data=PARKING_DATA)
+
+    with CaptureQueriesContext(connection) as context:
+        response = enforcer_api_client.post(list_url, data=PARKING_DATA)
+
+    assert response.data["allowed"] is False
+    assert not any(
+        '"parkings_parking"' in x["sql"] for x in context.captured_queries)
+    assert ParkingCheck.objects.count() == 2
+
+    parking = parking_factory(
+        registration_number="ABC-123", zone=zone,
+        domain=enforcer.enforced_domain)
+    response = enforcer_api_client.post(list_url, data=PARKING_DATA)
+
+    assert response.data["allowed"] is True
+    assert response.data["end_time"] == parking.time_end
@@ -0,0 +1,98 @@
+import datetime
+
+from django.urls import reverse
+from django.utils import timezone
+from rest_framework.status import HTTP_200_OK, HTTP_400_BAD_REQUEST
+
+from parkings.factories.parking import create_payment_zone
+from parkings.models import ParkingCheck
+
+from .test_check_parking import PARKING_DATA, create_permit, create_permit_area
+
+list_url = reverse("enforcement:v1:check_parking_batch")
+single_url = reverse("enforcement:v1:check_parking")
+
+
+def test_results_are_returned_in_order(
+        enforcer_api_client, enforcer, parking_factory,
+        event_parking_factory):
+    domain = enforcer.enforced_domain
+    zone = create_payment_zone(domain=domain)
+    create_permit_area(enforcer_api_client)
+    create_permit(domain=domain)
+    parking = parking_factory(
+        registration_number="XYZ-1", zone=zone, domain=domain)
+    event_parking = event_parking_factory(
+        registration_number="XYZ-2", domain=domain)
+    now = timezone.now()
+    expired_parking = parking_factory(
+        registration_number="XYZ-3", zone=zone, domain=domain,
+        time_start=(now - datetime.timedelta(hours=1)),
+        time_end=(now - datetime.timedelta(minutes=5)))
+    data = [
+        dict(PARKING_DATA, registration_number=reg_num)
+        for reg_num in ["XYZ-1", "ABC-123", "XYZ-2", "XYZ-3", "XYZ-4"]
+    ]
+
+    response = enforcer_api_client.post(list_url, data=data)
+
+    assert response.status_code == HTTP_200_OK
+    assert [x["allowed"] for x in response.data] == [
+        True, True, True, False, False]
+    assert [x["end_time"] for x in response.data[2:]] == [
+        event_parking.time_end, expired_parking.time_end, None]
+    assert response.data[0]["end_time"] == parking.time_end
+    assert response.data[1]["end_time"] is not None
+    assert response.data[0]["location"] == {
+        "payment_zone": 1, "permit_area": "A"}
+
+    checks = ParkingCheck.objects.order_by("registration_number")
+    assert [x.registration_number for x in checks] == [
+        "ABC-123", "XYZ-1", "XYZ-2", "XYZ-3", "XYZ-4"]
+    assert checks[1].found_parking == parking
+    assert checks[2].found_event_parking == event_parking
+    assert checks[3].found_parking == expired_parking
+
+
+def test_results_match_single_checks(
+        enforcer_api_client, enforcer, parking_factory):
+    domain = enforcer.enforced_domain
+    create_payment_zone(domain=domain)
+    zone2 = create_payment_zone(domain=domain, number=2, code="2")
+    parking_factory(registration_number="XYZ-1", zone=zone2, domain=domain)
+    time = timezone.now().replace(microsecond=0)
+    data = [
+        dict(PARKING_DATA, registration_number=reg_num, time=time)
+        for reg_num in ["XYZ-1", "ABC-123"]
+    ]
+
+    response = enforcer_api_client.post(list_url, data=data)
+
+    assert response.status_code == HTTP_200_OK
+    for (item, result) in zip(data, response.data):
+        single = enforcer_api_client.post(single_url, data=item)
+        assert result == single.data
+
+
+def test_empty_list_is_ok(enforcer_api_client):
+    response = enforcer_api_client.post(list_url, data=[])
+
+    assert (response.status_code, response.data) == (HTTP_200_OK, [])
+
+
+def test_too_many_items_is_bad_request(enforcer_api_client):
+    response = enforcer_api_client.post(list_url, data=[PARKING_DATA] * 201)
+
+    assert response.status_code == HTTP_400_BAD_REQUEST
+    assert ParkingCheck.objects.count() == 0
+
+
+def test_invalid_item_is_bad_request(enforcer_api_client):
+    data = [PARKING_DATA, dict(PARKING_DATA, registration_number="")]
+
+    response = enforcer_api_client.post(list_url, data=data)
+
+    assert response.status_code == HTTP_400_BAD_REQUEST
+    assert response.data[1]["registration_number"] == [
+        "This field may not be blank."]
+    assert ParkingCheck.objects.count() == 0
@@ -0,0 +1,47 @@
+import pytest
+from django.db import connection, transaction
+from django.utils import timezone
+
+from parkings.api.enforcement.check_parking import (
+    RIGHT_KINDS, _get_check_parking_sql, get_grace_duration)
+from parkings.factories import (
+    EnforcementDomainFactory, EventParkingFactory, ParkingFactory)
+
+EXPECTED_INDEXES = {
+    "parking": "parking_domain_regnum_idx",
+    "permit": "permitlookup_regnum_area_idx",
+    "event parking": "eventparking_domain_regnum_idx",
+}
+
+
+def explain(sql, params):
+    with transaction.atomic(), connection.cursor() as cursor:
+        # The test tables are tiny, so make the planner pick the plan
+        # it would use with a large table
+        cursor.execute("SET LOCAL enable_seqscan = off")
+        cursor.execute("SET LOCAL enable_bitmapscan = off")
+        cursor.execute("EXPLAIN " + sql, params)
+        return "\n".join(row[0] for row in cursor.fetchall())
+
+
+@pytest.mark.parametrize("kind", RIGHT_KINDS)
+def test_check_parking_query_uses_covering_index(kind):
+    domain = EnforcementDomainFactory()
+    ParkingFactory.create_batch(5, domain=domain)
+    EventParkingFactory.create_batch(5, domain=domain)
+    now = timezone.now()
+    params = {
+        "reg_num": "ABC123",
+        "zone": 1,
+        "area": 1,
+        "domain": domain.pk,
+        "time": now,
+        "past_time": now - get_grace_duration(),
+    }
+
+    plan = explain(_get_check_parking_sql(connection, [kind]), params)
+
+    index_name = EXPECTED_INDEXES[kind]
+    assert (
+        "Index Scan using {}".format(index_name) in plan or
+        "Index Only Scan using {}".format(index_name) in plan), plan
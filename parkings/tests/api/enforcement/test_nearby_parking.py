@@ -0,0 +1,93 @@
+import datetime
+
+import pytest
+from django.contrib.gis.geos import Point
+from django.urls import reverse
+from django.utils import timezone
+from rest_framework.status import (
+    HTTP_400_BAD_REQUEST, HTTP_401_UNAUTHORIZED, HTTP_403_FORBIDDEN)
+
+from parkings.factories import (
+    EnforcementDomainFactory, EventParkingFactory, ParkingFactory)
+
+from ..utils import get
+
+url = reverse('enforcement:v1:nearby_parking')
+
+LATITUDE = 60.17
+LONGITUDE = 24.94
+
+
+def url_for(**params):
+    query = dict({'latitude': LATITUDE, 'longitude': LONGITUDE}, **params)
+    return '{}?{}'.format(
+        url, '&'.join('{}={}'.format(k, v) for (k, v) in query.items()))
+
+
+def location_north(meters):
+    # A degree of latitude is about 111 km
+    return Point(LONGITUDE, LATITUDE + meters / 111000, srid=4326)
+
+
+@pytest.fixture
+def create_nearby(enforcer):
+    now = timezone.now()
+    hour = datetime.timedelta(hours=1)
+
+    def create(meters, factory=ParkingFactory, ended=False, **kwargs):
+        kwargs.setdefault('domain', enforcer.enforced_domain)
+        return factory(
+            location=location_north(meters),
+            time_start=now - 2 * hour,
+            time_end=(now - hour if ended else now + hour),
+            **kwargs)
+
+    return create
+
+
+def test_requires_enforcer(api_client, operator_api_client):
+    assert api_client.get(url_for()).status_code == HTTP_401_UNAUTHORIZED
+    assert operator_api_client.get(url_for()).status_code == (
+        HTTP_403_FORBIDDEN)
+
+
+def test_location_is_required(enforcer_api_client):
+    data = get(enforcer_api_client, url, HTTP_400_BAD_REQUEST)
+
+    assert set(data) == {'latitude', 'longitude'}
+
+
+def test_radius_is_limited(enforcer_api_client):
+    data = get(enforcer_api_client, url_for(radius=5000), HTTP_400_BAD_REQUEST)
+
+    assert set(data) == {'radius'}
+
+
+def test_valid_parkings_are_listed_nearest_first(
+        enforcer_api_client, create_nearby):
+    parking_10 = create_nearby(10)
+    parking_30 = create_nearby(30)
+    event_parking_20 = create_nearby(20, factory=EventParkingFactory)
+    create_nearby(5, ended=True)
+    create_nearby(5, domain=EnforcementDomainFactory())
+    create_nearby(200)
+
+    results = get(enforcer_api_client, url_for(radius=100))['results']
+
+    assert [(x['kind'], x['id']) for x in results] == [
+        ('parking', str(parking_10.id)),
+        ('event_parking', str(event_parking_20.id)),
+        ('parking', str(parking_30.id)),
+    ]
+    assert [round(x['distance'] / 10) for x in results] == [1, 2, 3]
+    assert results[0]['registration_number'] == (
+        parking_10.registration_number)
+
+
+def test_limit(enforcer_api_client, create_nearby):
+    nearest = [create_nearby(meters) for meters in [10, 20]]
+    create_nearby(30, factory=EventParkingFactory)
+
+    results = get(enforcer_api_client, url_for(limit=2))['results']
+
+    assert [x['id'] for x in results] == [str(x.id) for x in nearest]
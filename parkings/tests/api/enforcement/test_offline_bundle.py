@@ -0,0 +1,131 @@
+import datetime
+import math
+
+import pytest
+from django.core.management import call_command
+from django.urls import reverse
+from django.utils import timezone
+from rest_framework.status import (
+    HTTP_200_OK, HTTP_304_NOT_MODIFIED, HTTP_401_UNAUTHORIZED,
+    HTTP_403_FORBIDDEN)
+
+from parkings.factories import EventParkingFactory
+from parkings.factories.parking import create_payment_zone
+from parkings.factories.permit import (
+    create_permit, create_permit_area, create_permit_series)
+from parkings.lookups.bundles import (
+    EVENT_PARKING, NO_REFERENCE, OPEN_END, PARKING, PERMIT, build_bundle,
+    bundle_store, parse_bundle)
+from parkings.models import Permit
+
+url = reverse('enforcement:v1:offline_bundle')
+
+
+def test_requires_enforcer(api_client, operator_api_client):
+    assert api_client.get(url).status_code == HTTP_401_UNAUTHORIZED
+    assert operator_api_client.get(url).status_code == HTTP_403_FORBIDDEN
+
+
+def test_bundle_contains_current_rights(
+        enforcer_api_client, enforcer, parking_factory):
+    domain = enforcer.enforced_domain
+    now = timezone.now()
+    hour = datetime.timedelta(hours=1)
+    zone = create_payment_zone(domain=domain, number=2, code='2')
+    parking = parking_factory(
+        registration_number='ABC-123', zone=zone, domain=domain,
+        time_start=now - hour, time_end=None)
+    parking_factory(  # Ended before the grace duration
+        registration_number='OLD-1', domain=domain,
+        time_start=now - 3 * hour, time_end=now - 2 * hour)
+    event_parking = EventParkingFactory(
+        registration_number='XYZ-987', domain=domain,
+        time_start=now - hour, time_end=now + hour)
+    permit = create_permit(
+        active=True, domain=domain, subject_count=1, area_count=1)
+    inactive_permit = create_permit(
+        domain=domain, subject_count=1, area_count=1)
+    item = permit.lookup_items.get()
+
+    response = enforcer_api_client.get(url, HTTP_ACCEPT='application/gzip')
+
+    assert response.status_code == HTTP_200_OK
+    assert response['Content-Type'] == 'application/gzip'
+    assert not response.has_header('Content-Encoding')
+    assert response['ETag']
+    bundle = parse_bundle(response.content)
+    rights = bundle['rights']
+    assert set(rights) == {'ABC123', 'XYZ987', item.registration_number}
+    assert inactive_permit.lookup_items.get().registration_number not in rights
+    assert rights['ABC123'] == [(
+        PARKING, 2, int(parking.time_start.timestamp()), OPEN_END)]
+    assert rights['XYZ987'] == [(
+        EVENT_PARKING, NO_REFERENCE,
+        int(event_parking.time_start.timestamp()),
+        math.ceil(event_parking.time_end.timestamp()))]
+    [(kind, area_index, _start, _end)] = rights[item.registration_number]
+    assert kind == PERMIT
+    assert bundle['areas'][area_index] == item.area.identifier
+
+
+def test_not_modified_with_current_etag(enforcer_api_client):
+    response = enforcer_api_client.get(url)
+
+    response = enforcer_api_client.get(
+        url, HTTP_IF_NONE_MATCH=response['ETag'])
+
+    assert response.status_code == HTTP_304_NOT_MODIFIED
+    assert not response.content
+
+
+@pytest.mark.parametrize('if_none_match,status_code', [
+    ('*', HTTP_304_NOT_MODIFIED),
+    ('"other", {etag}', HTTP_304_NOT_MODIFIED),
+    ('W/{etag}', HTTP_304_NOT_MODIFIED),
+    ('"x{etag_value}x"', HTTP_200_OK),
+    ('{etag_value}', HTTP_200_OK),
+])
+def test_if_none_match_is_parsed(
+        enforcer_api_client, if_none_match, status_code):
+    etag = enforcer_api_client.get(url)['ETag']
+
+    response = enforcer_api_client.get(url, HTTP_IF_NONE_MATCH=(
+        if_none_match.format(etag=etag, etag_value=etag.strip('"'))))
+
+    assert response.status_code == status_code
+
+
+def test_command_generates_bundles(enforcer, parking_factory):
+    domain = enforcer.enforced_domain
+    call_command('generate_enforcement_bundles', '--domain', domain.code)
+    bundle = bundle_store.get(domain)
+    parking_factory(registration_number='ABC-123', domain=domain)
+
+    assert bundle_store.get(domain) == bundle  # Cached
+    assert bundle_store.refresh(domain).etag != bundle.etag
+
+
+def test_times_outside_the_field_range_are_clamped(enforcer, parking_factory):
+    domain = enforcer.enforced_domain
+    create_permit_area('A', domain=domain)
+    utc = datetime.timezone.utc
+    indefinite = '2999-12-31T00:00:00+00:00'
+    Permit.objects.create(
+        series=create_permit_series(active=True), domain=domain,
+        subjects=[{
+            'registration_number': 'ABC-123',
+            'start_time': '1960-01-01T00:00:00+00:00',
+            'end_time': indefinite}],
+        areas=[{
+            'area': 'A',
+            'start_time': '1960-01-01T00:00:00+00:00',
+            'end_time': indefinite}])
+    parking_factory(
+        registration_number='XYZ-987', domain=domain,
+        time_start=datetime.datetime(1960, 1, 1, tzinfo=utc),
+        time_end=datetime.datetime(2999, 12, 31, tzinfo=utc))
+
+    rights = parse_bundle(build_bundle(domain).data)['rights']
+
+    assert rights['ABC123'] == [(PERMIT, 0, 0, OPEN_END)]
+    assert rights['XYZ987'] == [(PARKING, NO_REFERENCE, 0, OPEN_END)]
@@ -1,3 +1,5 @@
+import json
+
 import pytest
 from django.urls import reverse
 from rest_framework.status import (
@@ -386,3 +388,29 @@ def test_permit_series_visibility_is_limited_to_owner(
     assert response.json()['count'] == 1
     assert PermitSeries.objects.count() == 2
     assert response.json()['results'][0]['id'] == enforcer_owned_permitseries.id
+
+
+@pytest.mark.django_db
+def test_permits_are_imported_to_enforced_domain(enforcer_api_client):
+    series = create_permit_series(owner=enforcer_api_client.auth_user)
+    url = reverse(
+        'enforcement:v1:permitseries-import-permits', kwargs={'pk': series.pk})
+    permit_data = {
+        'external_id': generate_external_ids(),
+        'subjects': generate_subjects(),
+        'areas': generate_areas_data(enforcer_api_client),
+    }
+    body = json.dumps(permit_data) + '\n'
+
+    response = enforcer_api_client.post(
+        url, data=body, content_type='application/x-ndjson')
+    body_with_domain = json.dumps(dict(permit_data, domain='TESTDOM'))
+    rejected = enforcer_api_client.post(
+        url, data=body_with_domain, content_type='application/x-ndjson')
+
+    assert response.status_code == HTTP_201_CREATED
+    permit = Permit.objects.get(series=series)
+    assert permit.domain == enforcer_api_client.enforcer.enforced_domain
+    assert rejected.status_code == HTTP_400_BAD_REQUEST
+    assert rejected.json()['errors'] == [
+        {'line': 1, 'errors': {'domain': ['Not allowed']}}]
@@ -0,0 +1,149 @@
+import pytest
+from django.urls import reverse
+from django.utils.dateparse import parse_datetime
+from rest_framework.status import (
+    HTTP_400_BAD_REQUEST, HTTP_401_UNAUTHORIZED, HTTP_403_FORBIDDEN)
+
+from parkings.api.enforcement import valid_permit_item
+from parkings.factories import EnforcementDomainFactory
+from parkings.factories.permit import create_permit
+from parkings.models import PermitLookupItem
+
+from ..utils import get
+
+url = reverse('enforcement:v1:valid_permit_item-changes')
+
+# The changes of a transaction are listed only after it has committed,
+# so these tests cannot be run inside a transaction
+pytestmark = pytest.mark.django_db(transaction=True)
+
+
+def get_changes(api_client, cursor, status_code=200):
+    return get(api_client, '{}?cursor={}'.format(url, cursor), status_code)
+
+
+def get_ids(changes, kind):
+    return {x['id'] for x in changes if x['kind'] == kind}
+
+
+def create_enforced_permit(enforcer, **kwargs):
+    return create_permit(
+        active=True, owner=enforcer.user, domain=enforcer.enforced_domain,
+        **kwargs)
+
+
+def test_requires_enforcer(api_client, operator_api_client):
+    assert api_client.get(url).status_code == HTTP_401_UNAUTHORIZED
+    assert operator_api_client.get(url).status_code == HTTP_403_FORBIDDEN
+
+
+def test_without_cursor_returns_only_cursor(enforcer_api_client, enforcer):
+    create_enforced_permit(enforcer)
+
+    data = get(enforcer_api_client, url)
+
+    assert data['changes'] == []
+    assert data['has_more'] is False
+    assert get_changes(enforcer_api_client, data['cursor'])['changes'] == []
+
+
+def test_invalid_cursor(enforcer_api_client):
+    data = get_changes(enforcer_api_client, 'abc', HTTP_400_BAD_REQUEST)
+
+    assert data == {'cursor': ['Invalid cursor']}
+
+
+def test_added_permit(enforcer_api_client, enforcer):
+    cursor = get(enforcer_api_client, url)['cursor']
+
+    permit = create_enforced_permit(enforcer, subject_count=1, area_count=1)
+
+    data = get_changes(enforcer_api_client, cursor)
+    item = PermitLookupItem.objects.get(permit=permit)
+    assert len(data['changes']) == 1
+    change = data['changes'][0]
+    assert {k: v for (k, v) in change.items() if not k.endswith('_time')} == {
+        'kind': 'added',
+        'id': item.id,
+        'permit_id': permit.id,
+        'area': item.area.identifier,
+        'registration_number': item.registration_number,
+    }
+    assert parse_datetime(change['start_time']) == item.start_time
+    assert parse_datetime(change['end_time']) == item.end_time
+    assert get_changes(enforcer_api_client, data['cursor'])['changes'] == []
+
+
+def test_modified_permit(enforcer_api_client, enforcer):
+    permit = create_enforced_permit(enforcer)
+    old_ids = set(permit.lookup_items.values_list('id', flat=True))
+    cursor = get(enforcer_api_client, url)['cursor']
+
+    permit.subjects = permit.subjects[:1]
+    permit.save()
+
+    changes = get_changes(enforcer_api_client, cursor)['changes']
+    new_ids = set(permit.lookup_items.values_list('id', flat=True))
+    assert [x['kind'] for x in changes] == (
+        ['removed'] * len(old_ids) + ['added'] * len(new_ids))
+    assert get_ids(changes, 'removed') == old_ids
+    assert get_ids(changes, 'added') == new_ids
+
+
+def test_deleted_permit(enforcer_api_client, enforcer):
+    permit = create_enforced_permit(enforcer)
+    item_ids = set(permit.lookup_items.values_list('id', flat=True))
+    cursor = get(enforcer_api_client, url)['cursor']
+
+    permit.delete()
+
+    changes = get_changes(enforcer_api_client, cursor)['changes']
+    assert get_ids(changes, 'removed') == item_ids
+    assert get_ids(changes, 'added') == set()
+
+
+def test_deactivated_and_activated_series(enforcer_api_client, enforcer):
+    permit = create_enforced_permit(enforcer)
+    item_ids = set(permit.lookup_items.values_list('id', flat=True))
+    series = permit.series
+    cursor = get(enforcer_api_client, url)['cursor']
+
+    series.active = False
+    series.save()
+    data = get_changes(enforcer_api_client, cursor)
+    assert get_ids(data['changes'], 'removed') == item_ids
+    assert get_ids(data['changes'], 'added') == set()
+
+    series.active = True
+    series.save()
+    data = get_changes(enforcer_api_client, data['cursor'])
+    assert get_ids(data['changes'], 'removed') == set()
+    assert get_ids(data['changes'], 'added') == item_ids
+
+
+def test_inactive_and_other_domain_permits_are_not_listed(
+        enforcer_api_client, enforcer):
+    cursor = get(enforcer_api_client, url)['cursor']
+
+    create_permit(
+        active=False, owner=enforcer.user, domain=enforcer.enforced_domain)
+    create_permit(active=True, domain=EnforcementDomainFactory())
+
+    assert get_changes(enforcer_api_client, cursor)['changes'] == []
+
+
+def test_changes_are_paged(enforcer_api_client, enforcer, monkeypatch):
+    monkeypatch.setattr(valid_permit_item, 'CHANGES_PAGE_SIZE', 4)
+    cursor = get(enforcer_api_client, url)['cursor']
+    permit = create_enforced_permit(enforcer, subject_count=3, area_count=3)
+
+    pages = []
+    has_more = True
+    while has_more:
+        data = get_changes(enforcer_api_client, cursor)
+        (cursor, has_more) = (data['cursor'], data['has_more'])
+        pages.append(data['changes'])
+
+    assert [len(x) for x in pages] == [4, 4, 1]
+    assert get_ids(sum(pages, []), 'added') == set(
+        permit.lookup_items.values_list('id', flat=True))
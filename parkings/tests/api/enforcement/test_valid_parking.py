@@ -1,14 +1,22 @@
-from datetime import datetime
+import json
+from datetime import datetime, timedelta
 
 import pytest
+from django.db import connection
 from django.test import override_settings
+from django.test.utils import CaptureQueriesContext
 from django.urls import reverse
+from django.utils import timezone
 from django.utils.timezone import utc
+from rest_framework.renderers import JSONRenderer
 from rest_framework.status import (
     HTTP_400_BAD_REQUEST, HTTP_401_UNAUTHORIZED, HTTP_403_FORBIDDEN)
 
+from parkings.api.enforcement.valid_parking import ValidParkingSerializer
 from parkings.factories import EnforcerFactory
 from parkings.factories.parking import create_payment_zone
+from parkings.lookups.parkings import hot_parking_index
+from parkings.models import Parking
 
 from ..utils import (
     ALL_METHODS, check_list_endpoint_base_fields, check_method_status_codes,
@@ -143,11 +151,21 @@ def iso8601_us(dt):
     return dt.strftime('%Y-%m-%dT%H:%M:%S.%fZ')
 
 
-def test_registration_number_filter(operator, enforcer_api_client, parking_factory, enforcer):
+def build_hot_index(hot_index, domain):
+    if hot_index:
+        hot_parking_index.get(domain)  # Build synchronously
+
+
+@pytest.mark.parametrize('hot_index', [False, True])
+def test_registration_number_filter(
+        operator, enforcer_api_client, parking_factory, enforcer,
+        hot_index, settings, shared_cache):
+    settings.PARKKIHUBI_HOT_PARKING_INDEX = hot_index
     p1 = parking_factory(registration_number='ABC-123', operator=operator, domain=enforcer.enforced_domain)
     p2 = parking_factory(registration_number='ZYX-987', operator=operator, domain=enforcer.enforced_domain)
     p3 = parking_factory(registration_number='ZYX-987', operator=operator, domain=enforcer.enforced_domain)
     p4 = parking_factory(registration_number='Zyx987 ', operator=operator, domain=enforcer.enforced_domain)
+    build_hot_index(hot_index, enforcer.enforced_domain)
 
     results = get(enforcer_api_client, list_url_for('ABC-123'))['results']
     assert get_ids_from_results(results) == {p1.id}
@@ -177,7 +195,11 @@ def test_registration_number_filter(operator, enforcer_api_client, parking_facto
     'more_than_day_after_2nd',
     'now',
 ])
-def test_time_filtering(operator, enforcer_api_client, parking_factory, name, enforcer):
+@pytest.mark.parametrize('hot_index', [False, True])
+def test_time_filtering(
+        operator, enforcer_api_client, parking_factory, name, enforcer,
+        hot_index, settings, shared_cache):
+    settings.PARKKIHUBI_HOT_PARKING_INDEX = hot_index
     p1 = parking_factory(
         registration_number='ABC-123',
         time_start=datetime(2012, 1, 1, 12, 0, 0, tzinfo=utc),
@@ -191,6 +213,7 @@ def test_time_filtering(operator, enforcer_api_client, parking_factory, name, en
         operator=operator,
         domain=enforcer.enforced_domain)
     p3 = parking_factory(registration_number='ABC-123', domain=enforcer.enforced_domain)
+    build_hot_index(hot_index, enforcer.enforced_domain)
 
     (time, expected_parkings) = {
         'before_all': ('2000-01-01T12:00:00Z', []),
@@ -288,3 +311,88 @@ def test_endpoint_returns_parkings_with_same_zone_code_in_correct_domain(
     parking_data_2 = data_2['results'][0]
     assert parking_data_2['id'] == str(parking_2.id)
     assert parking_data_2['zone'] == 'Z'
+
+
+@pytest.mark.parametrize('time,expected_indexes', [
+    ('2016-01-01T10:30:00Z', [0, 1]),  # Valid parkings
+    ('2016-01-01T12:10:00Z', [0]),  # Parking ended within grace duration
+])
+def test_valid_or_last_within_grace_duration_in_one_query(
+        operator, enforcer_api_client, parking_factory, enforcer,
+        time, expected_indexes):
+    parkings = [
+        parking_factory(
+            registration_number='ABC-123',
+            time_start=datetime(2016, 1, 1, 10, 0, 0, tzinfo=utc),
+            time_end=datetime(2016, 1, 1, end_hour, 0, 0, tzinfo=utc),
+            operator=operator,
+            domain=enforcer.enforced_domain)
+        for end_hour in [12, 11]]
+
+    with CaptureQueriesContext(connection) as context:
+        response = get(enforcer_api_client, list_url_for_abc + '&time=' + time)
+
+    check_response_objects(response, [parkings[i] for i in expected_indexes])
+    parking_queries = [
+        x for x in context.captured_queries
+        if '"parkings_parking"' in x['sql']]
+    assert len(parking_queries) == 2  # Count and page
+
+
+@pytest.mark.parametrize('hot_index', [False, True])
+def test_multiple_registration_numbers(
+        operator, enforcer_api_client, parking_factory, enforcer,
+        hot_index, settings, shared_cache):
+    settings.PARKKIHUBI_HOT_PARKING_INDEX = hot_index
+    now = timezone.now()
+    minute = timedelta(minutes=1)
+
+    def create(reg_num, ended_minutes_ago):
+        return parking_factory(
+            registration_number=reg_num,
+            time_start=now - 120 * minute,
+            time_end=now - ended_minutes_ago * minute,
+            operator=operator,
+            domain=enforcer.enforced_domain)
+
+    valid_abc = create('ABC-123', -10)
+    create('ABC-123', 5)  # Ended within grace, but ABC-123 has a valid one
+    last_xyz = create('XYZ-987', 5)
+    create('XYZ-987', 10)  # Ended within grace, but not the last one
+    create('QWE-111', 60)  # Ended before grace
+    build_hot_index(hot_index, enforcer.enforced_domain)
+
+    response = get(enforcer_api_client, list_url + (
+        '?reg_num=ABC-123&reg_num=xyz987&reg_num=QWE-111&reg_num=LOL-777'))
+
+    check_response_objects(response, [valid_abc, last_xyz])
+
+
+@pytest.mark.parametrize('none_end_time_replacement', [None, '2100-01-01T00:00:00Z'])
+def test_list_data_matches_serializer(
+        operator, enforcer_api_client, parking_factory, enforcer,
+        none_end_time_replacement, settings):
+    settings.PARKKIHUBI_NONE_END_TIME_REPLACEMENT = none_end_time_replacement
+    domain = enforcer.enforced_domain
+    now = timezone.now()
+    hour = timedelta(hours=1)
+
+    def create(end_hours, **kwargs):
+        return parking_factory(
+            registration_number='ABC-123', operator=operator, domain=domain,
+            time_start=now - hour,
+            time_end=(now + end_hours * hour if end_hours else None),
+            **kwargs)
+
+    create(1, zone=create_payment_zone(code='5', domain=domain))
+    create(2, zone=create_payment_zone(code='5A', domain=domain))
+    create(3, zone=None)
+    create(4, zone=None, is_disc_parking=True)
+    create(None, zone=None)
+    parkings = Parking.objects.filter(domain=domain).order_by('-time_end')
+
+    data = get(enforcer_api_client, list_url_for_abc)
+
+    expected = json.loads(JSONRenderer().render(
+        ValidParkingSerializer(parkings, many=True).data))
+    assert data['results'] == expected
@@ -1,11 +1,17 @@
 import datetime
+import json
 
 import pytest
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
 from django.urls import reverse
 from django.utils import timezone
+from rest_framework.renderers import JSONRenderer
 from rest_framework.status import (
     HTTP_200_OK, HTTP_401_UNAUTHORIZED, HTTP_403_FORBIDDEN)
 
+from parkings.api.enforcement.valid_permit_item import (
+    ValidPermitItemSerializer)
 from parkings.factories.permit import create_permit, create_permits
 from parkings.models import PermitLookupItem
 from parkings.tests.api.enforcement.test_operator import iso8601_us
@@ -123,6 +129,22 @@ def test_registration_number_filter(enforcer_api_client, enforcer):
             assert result['registration_number'] == permit_item.registration_number
 
 
+def test_multiple_registration_numbers(enforcer_api_client, enforcer):
+    create_permit(
+        active=True, owner=enforcer.user, domain=enforcer.enforced_domain,
+        subject_count=3, area_count=1)
+    items = list(PermitLookupItem.objects.order_by('id'))
+    reg_nums = [items[0].registration_number, items[1].registration_number]
+
+    response = get(enforcer_api_client, '{url}?{params}'.format(
+        url=list_url, params='&'.join('reg_num=' + x for x in reg_nums)))
+
+    assert {x['registration_number'] for x in response['results']} == set(
+        reg_nums)
+    assert {x['id'] for x in response['results']} == {
+        x.id for x in items if x.registration_number in reg_nums}
+
+
 def test_time_filter(enforcer_api_client, enforcer):
     create_permit(active=True, owner=enforcer.user, domain=enforcer.enforced_domain, subject_count=2, area_count=1)
     permit_1 = PermitLookupItem.objects.all()[0]
@@ -163,3 +185,27 @@ def test_enforcer_can_view_only_permit_items_from_domain_they_enforce(enforcer_a
     assert len(response['results']) == 6
     for results in response['results']:
         assert results['registration_number'] in enforcer_permits.values_list('registration_number', flat=True)
+
+
+def test_list_data_matches_serializer_with_one_query(
+        enforcer_api_client, enforcer, operator_factory):
+    operator_factory(user=enforcer.user)
+    permits = create_permits(
+        active=True, owner=enforcer.user, domain=enforcer.enforced_domain)
+    permits[0].properties = {'permit_type': 'resident', 'vehicles': [1, 2]}
+    permits[0].save()
+    create_permits(active=True, domain=enforcer.enforced_domain, count=1)
+    items = PermitLookupItem.objects.order_by('-id')
+
+    with CaptureQueriesContext(connection) as context:
+        data = get(enforcer_api_client, list_url_for(time=timezone.now()))
+
+    expected = json.loads(JSONRenderer().render(
+        ValidPermitItemSerializer(items, many=True).data))
+    assert data['results'] == expected
+    assert {x['operator'] for x in data['results']} == {
+        str(enforcer.user.operator.id), None}
+    item_queries = [
+        x for x in context.captured_queries
+        if '"parkings_permitlookupitem"' in x['sql']]
+    assert len(item_queries) == 1
@@ -0,0 +1,174 @@
+import json
+
+import pytest
+from django.urls import reverse
+from rest_framework.status import (
+    HTTP_201_CREATED, HTTP_400_BAD_REQUEST, HTTP_404_NOT_FOUND)
+
+from parkings.factories import EnforcementDomainFactory
+from parkings.factories.permit import (
+    create_permit, create_permit_area, create_permit_series, generate_subjects)
+from parkings.importers import permits as permit_importer
+from parkings.models import Permit, PermitLookupItem, PermitLookupItemChange
+
+
+def _get_import_url(series):
+    return reverse(
+        'operator:v1:permitseries-import-permits', kwargs={'pk': series.pk})
+
+
+def _post_lines(api_client, series, lines):
+    body = ''.join(
+        (x if isinstance(x, str) else json.dumps(x)) + '\n' for x in lines)
+    return api_client.post(
+        _get_import_url(series), data=body,
+        content_type='application/x-ndjson')
+
+
+@pytest.fixture
+def domain(operator):
+    domain = EnforcementDomainFactory(code='IMPDOM')
+    for identifier in ['A', 'B']:
+        create_permit_area(identifier, domain, allowed_user=operator.user)
+    return domain
+
+
+def _make_permit_data(external_id, subject_count=1, areas=('A',)):
+    return {
+        'domain': 'IMPDOM',
+        'external_id': external_id,
+        'subjects': generate_subjects(count=subject_count),
+        'areas': [{
+            'area': identifier,
+            'start_time': '2000-01-01T00:00:00+00:00',
+            'end_time': '2100-01-01T00:00:00+00:00',
+        } for identifier in areas],
+    }
+
+
+def test_permits_are_imported(operator_api_client, operator, domain):
+    series = create_permit_series(active=True, owner=operator.user)
+    lines = [
+        _make_permit_data('EXT-1', subject_count=2, areas=['A', 'B']),
+        dict(_make_permit_data('EXT-2'), properties={'permit_type': 'x'}),
+        '',
+    ]
+
+    response = _post_lines(operator_api_client, series, lines)
+
+    assert response.status_code == HTTP_201_CREATED
+    assert response.json() == {'created': 2}
+    permits = list(Permit.objects.filter(series=series).order_by('id'))
+    assert [x.external_id for x in permits] == ['EXT-1', 'EXT-2']
+    assert permits[0].subjects == lines[0]['subjects']
+    assert permits[0].areas == lines[0]['areas']
+    assert permits[0].domain == domain
+    assert permits[1].properties == {'permit_type': 'x'}
+    assert permits[0].subject_items.count() == 2
+    assert permits[0].area_items.count() == 2
+    lookup_items = PermitLookupItem.objects.filter(permit=permits[0])
+    assert lookup_items.count() == 4
+    assert all(x.is_active and x.domain == domain for x in lookup_items)
+    assert {x.registration_number for x in lookup_items} == {
+        x['registration_number'].replace('-', '')
+        for x in lines[0]['subjects']}
+    assert PermitLookupItemChange.objects.filter(
+        permit_id__in=[x.id for x in permits]).count() == 5
+
+
+def test_lookup_items_match_saved_permit(
+        operator_api_client, operator, domain):
+    series = create_permit_series(active=False, owner=operator.user)
+    data = _make_permit_data('EXT-1', subject_count=3, areas=['A', 'B'])
+
+    _post_lines(operator_api_client, series, [data])
+
+    imported = Permit.objects.get(series=series)
+    saved = Permit.objects.create(
+        series=create_permit_series(owner=operator.user), domain=domain,
+        external_id='EXT-1', subjects=data['subjects'], areas=data['areas'])
+
+    def get_items(permit):
+        return sorted(permit.lookup_items.values_list(
+            'registration_number', 'area', 'start_time', 'end_time',
+            'domain', 'is_active'))
+
+    assert get_items(imported) == get_items(saved)
+
+
+def test_invalid_lines_are_reported(operator_api_client, operator, domain):
+    series = create_permit_series(owner=operator.user)
+    lines = [
+        _make_permit_data('EXT-1'),
+        'not json',
+        dict(_make_permit_data('EXT-3'), domain='UNKNOWN'),
+        _make_permit_data('EXT-4', areas=['C']),
+        {'external_id': 'EXT-5', 'domain': 'IMPDOM'},
+    ]
+
+    response = _post_lines(operator_api_client, series, lines)
+
+    assert response.status_code == HTTP_400_BAD_REQUEST
+    assert response.json() == {
+        'errors': [
+            {'line': 2, 'errors': {'non_field_errors': ['Invalid JSON']}},
+            {'line': 3, 'errors': {
+                'domain': ['Object with code=UNKNOWN does not exist.']}},
+            {'line': 4, 'errors': {'areas': ['Unknown identifiers: C']}},
+            {'line': 5, 'errors': {
+                'subjects': ['This field is required.'],
+                'areas': ['This field is required.']}},
+        ],
+        'error_count': 4,
+    }
+    assert not Permit.objects.filter(series=series).exists()
+
+
+def test_duplicate_external_ids_are_reported(
+        operator_api_client, operator, domain):
+    series = create_permit_series(owner=operator.user)
+    create_permit(series=series, domain=domain, external_id='EXT-OLD')
+    lines = [
+        _make_permit_data('EXT-1'),
+        _make_permit_data('EXT-OLD'),
+        _make_permit_data('EXT-1'),
+    ]
+
+    response = _post_lines(operator_api_client, series, lines)
+
+    assert response.status_code == HTTP_400_BAD_REQUEST
+    assert [x['line'] for x in response.json()['errors']] == [2, 3]
+    assert Permit.objects.filter(series=series).count() == 1
+
+
+def test_reported_errors_are_limited(
+        operator_api_client, operator, domain, monkeypatch):
+    monkeypatch.setattr(permit_importer, 'MAX_REPORTED_ERRORS', 2)
+    series = create_permit_series(owner=operator.user)
+
+    response = _post_lines(operator_api_client, series, ['[]'] * 5)
+
+    assert response.status_code == HTTP_400_BAD_REQUEST
+    data = response.json()
+    assert [x['line'] for x in data['errors']] == [1, 2]
+    assert data['error_count'] == 5
+
+
+def test_empty_body(operator_api_client, operator):
+    series = create_permit_series(owner=operator.user)
+
+    response = operator_api_client.post(_get_import_url(series))
+
+    assert response.status_code == HTTP_201_CREATED
+    assert response.json() == {'created': 0}
+
+
+def test_cannot_import_to_series_of_other_operator(
+        operator_api_client, operator_2, domain):
+    series = create_permit_series(owner=operator_2.user)
+
+    response = _post_lines(
+        operator_api_client, series, [_make_permit_data('EXT-1')])
+
+    assert response.status_code == HTTP_404_NOT_FOUND
+    assert not Permit.objects.filter(series=series).exists()
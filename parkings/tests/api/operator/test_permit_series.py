@@ -3,8 +3,8 @@ from django.urls import reverse
 from rest_framework.status import (
     HTTP_200_OK, HTTP_201_CREATED, HTTP_204_NO_CONTENT, HTTP_404_NOT_FOUND)
 
-from parkings.factories.permit import create_permit_series
-from parkings.models import PermitSeries
+from parkings.factories.permit import create_permit, create_permit_series
+from parkings.models import PermitLookupItem, PermitSeries
 
 url_list = reverse('operator:v1:permitseries-list')
 
@@ -192,3 +192,22 @@ def test_activate_wont_deactivate_series_owned_by_others(
         assert series.id in operator_series_to_deactivate
 
     assert PermitSeries.objects.filter(owner=staff_user, active=True).count() == 5
+
+
+def test_activate_updates_permit_lookup_items(operator_api_client, operator):
+    old_series = create_permit_series(owner=operator.user, active=True)
+    new_series = create_permit_series(owner=operator.user)
+    old_permit = create_permit(series=old_series)
+    new_permit = create_permit(series=new_series)
+    assert set(PermitLookupItem.objects.active()) == set(
+        old_permit.lookup_items.all())
+
+    response = operator_api_client.post(
+        get_activate_url(new_series), data={'deactivate_others': True})
+
+    assert response.status_code == HTTP_200_OK
+    assert set(PermitLookupItem.objects.active()) == set(
+        new_permit.lookup_items.all())
+    assert all(
+        x.domain_id == new_permit.domain_id
+        for x in new_permit.lookup_items.all())
@@ -119,6 +119,23 @@ def test_overlapping_event_areas(api_client, event_parking_factory, enforcer, op
     assert parking_area_west.parkings.count() == 5
 
 
+def test_future_open_ended_parkings_are_not_counted(api_client, event_parking_factory, enforcer, operator):
+    now = timezone.now()
+    event_area = create_event_area("center", enforcer.enforced_domain, GEOM_CENTER,
+                                   now - timedelta(hours=2), now + timedelta(hours=2))
+    event_parking_factory.create_batch(4, event_area=event_area)
+    parking_area = create_parking_area("center", enforcer.enforced_domain, GEOM_CENTER)
+    centroid = parking_area.geom.centroid.transform(4326, clone=True)
+    create_parking(centroid, operator, enforcer.enforced_domain,
+                   now - timedelta(hours=1), None)
+    create_parking(centroid, operator, enforcer.enforced_domain,
+                   now + timedelta(hours=1), None)
+
+    results = get(api_client, list_url)['results']
+    stats_data = find_by_obj_id(event_area, results)
+    assert stats_data['current_parking_count'] == 5
+
+
 def test_disallowed_methods(api_client, event_area):
     disallowed_methods = ('post', 'put', 'patch', 'delete')
     urls = (list_url, get_detail_url(event_area))
@@ -0,0 +1,100 @@
+from datetime import timedelta
+
+import pytest
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from rest_framework.authtoken.models import Token
+
+from parkings.factories import EnforcementDomainFactory
+from parkings.lookups.users import user_cache
+
+list_url = reverse("enforcement:v1:valid_parking-list")
+
+
+@pytest.fixture
+def auth_cache(settings):
+    settings.PARKKIHUBI_AUTH_CACHE_TTL = timedelta(minutes=1)
+
+
+def get_auth_queries(api_client):
+    with CaptureQueriesContext(connection) as context:
+        response = api_client.get(list_url, {"reg_num": "ABC-123"})
+    auth_tables = ["authtoken_token", "parkings_enforcer", "auth_user"]
+    queries = [
+        x["sql"] for x in context.captured_queries
+        if any(table in x["sql"].split(" WHERE ")[0] for table in auth_tables)
+    ]
+    return (response, queries)
+
+
+def test_api_key_resolves_profile_in_one_query(enforcer_api_client):
+    (response, queries) = get_auth_queries(enforcer_api_client)
+
+    assert response.status_code == 200
+    assert len(queries) == 1
+
+
+def test_api_key_is_cached(enforcer_api_client, auth_cache):
+    get_auth_queries(enforcer_api_client)
+
+    (response, queries) = get_auth_queries(enforcer_api_client)
+
+    assert response.status_code == 200
+    assert queries == []
+
+
+def test_deleted_api_key_is_not_accepted(enforcer_api_client, auth_cache):
+    get_auth_queries(enforcer_api_client)
+
+    Token.objects.filter(user=enforcer_api_client.auth_user).delete()
+    (response, queries) = get_auth_queries(enforcer_api_client)
+
+    assert response.status_code == 401
+
+
+def test_deactivated_user_is_not_accepted(enforcer_api_client, auth_cache):
+    get_auth_queries(enforcer_api_client)
+
+    user = enforcer_api_client.auth_user
+    user.is_active = False
+    user.save()
+    (response, queries) = get_auth_queries(enforcer_api_client)
+
+    assert response.status_code == 401
+
+
+def test_deleted_enforcer_is_not_accepted(enforcer_api_client, auth_cache):
+    get_auth_queries(enforcer_api_client)
+
+    enforcer_api_client.enforcer.delete()
+    (response, queries) = get_auth_queries(enforcer_api_client)
+
+    assert response.status_code == 403
+
+
+def test_changed_enforcer_domain_is_used(
+        enforcer_api_client, auth_cache, parking_factory):
+    enforcer = enforcer_api_client.enforcer
+    other_domain = EnforcementDomainFactory()
+    parking_factory(registration_number="ABC-123", domain=other_domain)
+    (response, queries) = get_auth_queries(enforcer_api_client)
+    assert response.data["results"] == []
+
+    enforcer.enforced_domain = other_domain
+    enforcer.save()
+    (response, queries) = get_auth_queries(enforcer_api_client)
+
+    assert len(response.data["results"]) == 1
+
+
+def test_renamed_user_is_not_found_by_old_username(
+        enforcer_api_client, auth_cache):
+    user = enforcer_api_client.auth_user
+    old_username = user.username
+    user_cache.set_by_username(old_username, user)
+
+    user.username = "renamed"
+    user.save()
+
+    assert user_cache.get_by_username(old_username) is None
@@ -1,6 +1,8 @@
 import pytest
+from django.core.cache import cache
 from pytest_factoryboy import register
 
+from parkings.api.enforcement.parking_check_log import parking_check_log
 from parkings.factories import (
     AdminUserFactory, CompleteEventParkingFactory, DiscParkingFactory,
     EnforcementDomainFactory, EnforcerFactory, EventAreaFactory,
@@ -8,6 +10,10 @@ from parkings.factories import (
     HistoryEventParkingFactory, HistoryParkingFactory, MonitorFactory,
     OperatorFactory, ParkingAreaFactory, ParkingFactory, RegionFactory,
     StaffUserFactory, UserFactory)
+from parkings.lookups.areas import area_index
+from parkings.lookups.parkings import hot_parking_index
+from parkings.lookups.permits import permit_index
+from parkings.lookups.plates import plate_filter
 
 register(OperatorFactory)
 register(ParkingFactory, 'parking')
@@ -32,3 +38,29 @@ register(MonitorFactory)
 def set_faker_random_seed():
     from parkings.factories.faker import fake
     fake.seed(777)
+
+
+@pytest.fixture(autouse=True)
+def clear_worker_indexes():
+    cache.clear()
+    area_index.clear()
+    hot_parking_index.clear()
+    permit_index.clear()
+    plate_filter.clear()
+
+
+@pytest.fixture
+def shared_cache(settings, tmp_path):
+    # The file based cache is shared by the processes of a host, which
+    # makes it acceptable for the settings requiring a shared cache
+    settings.CACHES = {
+        "default": {
+            "BACKEND": "django.core.cache.backends.filebased.FileBasedCache",
+            "LOCATION": str(tmp_path / "cache"),
+        },
+    }
+
+
+@pytest.fixture(autouse=True)
+def clear_parking_check_log():
+    parking_check_log.clear()
@@ -10,7 +10,8 @@ from parkings.factories import (
 from parkings.factories.permit import create_permits
 from parkings.management.commands import clean_reg_nums
 from parkings.models import (
-    ArchivedParking, Parking, ParkingCheck, Permit, PermitLookupItem)
+    ArchivedParking, Parking, ParkingCheck, Permit, PermitLookupItem,
+    PermitLookupItemChange)
 
 
 @pytest.mark.django_db
@@ -148,6 +149,21 @@ def test_partly_ended_permits_are_not_anonymized(user_factory):
     assert Permit.objects.unanonymized().count() == 6
 
 
+@pytest.mark.django_db
+def test_anonymization_of_ended_permit_lookup_item_changes(user_factory):
+    permits = create_permits(active=True, owner=user_factory(), count=2)
+    change_subjects_validity_time_to_past(permits[0])
+    changes = PermitLookupItemChange.objects.all()
+    ended_changes = changes.ends_before(timezone.now())
+    assert ended_changes.count() > 0
+
+    anonymize_model(PermitLookupItemChange)
+
+    assert ended_changes.unanonymized().count() == 0
+    assert changes.unanonymized().count() == changes.count() - (
+        ended_changes.count())
+
+
 @pytest.mark.django_db
 @pytest.mark.parametrize(
     'batch, hours, result, permit_batch, permit_result',
@@ -177,3 +193,20 @@ def test_parkings_anonymization_mgmt_cmd(batch, hours, result, permit_batch, per
     assert ArchivedParking.objects.filter(registration_number="").count() == result
     assert Parking.objects.filter(registration_number="").count() == result
     assert PermitLookupItem.objects.exclude(registration_number="").count() == permit_result
+
+
+@pytest.mark.django_db
+def test_old_permit_lookup_item_changes_are_deleted(user_factory, settings):
+    settings.PARKKIHUBI_PERMIT_ITEM_CHANGES_PRUNABLE_AFTER = (
+        datetime.timedelta(days=7))
+    create_permits(active=True, owner=user_factory(), count=2)
+    changes = PermitLookupItemChange.objects.all()
+    old_ids = list(changes.values_list('id', flat=True)[:2])
+    changes.filter(id__in=old_ids).update(
+        created_at=timezone.now() - datetime.timedelta(days=8))
+    count = changes.count()
+
+    call_command(clean_reg_nums.Command())
+
+    assert changes.count() == count - 2
+    assert not changes.filter(id__in=old_ids).exists()
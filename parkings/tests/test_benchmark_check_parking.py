@@ -0,0 +1,74 @@
+import random
+
+import pytest
+
+from parkings.factories.gis import generate_multi_polygon
+from parkings.management.commands import benchmark_check_parking
+from parkings.models import EnforcementDomain, Parking, ParkingCheck, Permit
+from parkings.tests.utils import call_mgmt_cmd_with_output
+from parkings.utils.benchmarking import get_percentile, summarize_durations
+
+
+@pytest.mark.parametrize("percent, expected", [
+    (50, 5), (95, 10), (99, 10), (100, 10), (0, 1)])
+def test_get_percentile(percent, expected):
+    assert get_percentile(list(range(1, 11)), percent) == expected
+
+
+def test_summarize_durations():
+    summary = summarize_durations([0.3, 0.1, 0.2, 0.4], total_time=2.0)
+    assert summary["count"] == 4
+    assert summary["throughput"] == 2.0
+    assert summary["p50"] == 0.2
+    assert summary["max"] == 0.4
+
+
+def test_summarize_durations_empty():
+    summary = summarize_durations([], total_time=0)
+    assert summary["count"] == 0
+    assert summary["throughput"] is None
+    assert summary["p99"] is None
+
+
+def test_generated_locations_are_within_the_geometries():
+    rng = random.Random(777)
+    geometry = generate_multi_polygon()
+
+    locations = [
+        benchmark_check_parking._generate_location(rng, [geometry])
+        for _ in range(20)]
+
+    assert all(
+        geometry.contains(x.transform(geometry.srid, clone=True))
+        for x in locations)
+
+
+@pytest.mark.django_db
+def test_benchmark_check_parking_deletes_seeded_data():
+    domain_count = EnforcementDomain.objects.count()
+
+    (result, stdout, stderr) = call_mgmt_cmd_with_output(
+        benchmark_check_parking.Command,
+        "--parkings", "5", "--permits", "3", "--checks", "10", "--warmup", "2")
+
+    assert "Requests:          10" in stdout
+    assert "Throughput:" in stdout
+    assert "p99:" in stdout
+    assert "per check" in stdout
+    assert stderr == ""
+    assert EnforcementDomain.objects.count() == domain_count
+    assert not Parking.objects.exists()
+    assert not Permit.objects.exists()
+    assert not ParkingCheck.objects.exists()
+
+
+@pytest.mark.django_db
+def test_benchmark_check_parking_keep():
+    call_mgmt_cmd_with_output(
+        benchmark_check_parking.Command,
+        "--parkings", "4", "--permits", "2", "--checks", "3", "--keep")
+
+    domain = EnforcementDomain.objects.get(code__startswith="BM")
+    assert Parking.objects.filter(domain=domain).count() == 4
+    assert Permit.objects.filter(domain=domain).count() == 2
+    assert ParkingCheck.objects.count() == 3 + 20
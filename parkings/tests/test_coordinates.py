@@ -0,0 +1,84 @@
+import threading
+
+import pytest
+from django.contrib.gis.gdal import GDALException
+from django.contrib.gis.geos import MultiPolygon, Point, Polygon
+
+from parkings.models.constants import GK25FIN_SRID, WGS84_SRID
+from parkings.utils.coordinates import (
+    TransformError, get_coord_transform, transform_coordinates,
+    transform_geometry, transform_point, transform_points)
+
+COORDINATES = [(24.9205277, 60.1666692), (24.9384063, 60.1734532)]
+
+
+def test_transform_point_matches_gdal():
+    point = Point(*COORDINATES[0], srid=WGS84_SRID)
+
+    result = transform_point(point, GK25FIN_SRID)
+
+    assert result.srid == GK25FIN_SRID
+    assert result.wkt == point.transform(GK25FIN_SRID, clone=True).wkt
+    assert point.srid == WGS84_SRID  # Not modified
+
+
+def test_transform_coordinates_many_at_once():
+    result = transform_coordinates(COORDINATES, WGS84_SRID, GK25FIN_SRID)
+
+    assert result == [
+        Point(*x, srid=WGS84_SRID).transform(GK25FIN_SRID, clone=True).coords
+        for x in COORDINATES]
+
+
+def test_transform_coordinates_same_srid():
+    assert transform_coordinates(COORDINATES, WGS84_SRID, WGS84_SRID) == (
+        COORDINATES)
+
+
+def test_transform_points_keeps_order_and_marks_failures():
+    points = [
+        Point(*COORDINATES[0], srid=WGS84_SRID),
+        Point(*transform_coordinates(
+            COORDINATES[1:], WGS84_SRID, GK25FIN_SRID)[0], srid=GK25FIN_SRID),
+        Point(180.0, 90.0, srid=WGS84_SRID),
+    ]
+
+    result = transform_points(points, GK25FIN_SRID)
+
+    assert result[0] == transform_point(points[0], GK25FIN_SRID)
+    assert result[1] == points[1]
+    assert result[2] is None or result[2].srid == GK25FIN_SRID
+
+
+def test_transform_point_raises_on_failure():
+    with pytest.raises(TransformError):
+        transform_point(Point(0.0, float("inf"), srid=WGS84_SRID), GK25FIN_SRID)
+
+
+def test_transform_error_is_gdal_exception():
+    with pytest.raises(GDALException):
+        transform_point(Point(0.0, float("inf"), srid=WGS84_SRID), GK25FIN_SRID)
+
+
+def test_transform_geometry_matches_gdal():
+    polygon = Polygon(COORDINATES + [(24.93, 60.18), COORDINATES[0]])
+    geometry = MultiPolygon(polygon, srid=WGS84_SRID)
+
+    result = transform_geometry(geometry, GK25FIN_SRID)
+
+    assert isinstance(result, MultiPolygon)
+    assert result.srid == GK25FIN_SRID
+    assert result.wkt == geometry.transform(GK25FIN_SRID, clone=True).wkt
+
+
+def test_coord_transform_is_cached_per_thread():
+    transform = get_coord_transform(WGS84_SRID, GK25FIN_SRID)
+    other_thread_transforms = []
+    thread = threading.Thread(target=(
+        lambda: other_thread_transforms.append(
+            get_coord_transform(WGS84_SRID, GK25FIN_SRID))))
+    thread.start()
+    thread.join()
+
+    assert get_coord_transform(WGS84_SRID, GK25FIN_SRID) is transform
+    assert other_thread_transforms[0] is not transform
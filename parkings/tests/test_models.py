@@ -2,11 +2,13 @@ import datetime
 
 import pytest
 from django.contrib.gis.geos import Point
+from django.db import connection, transaction
 from django.test import override_settings
 from django.utils.timezone import now, utc
 
 from parkings.factories.parking import create_payment_zone
-from parkings.models import Operator, Parking, ParkingCheck, ParkingTerminal
+from parkings.models import (
+    ArchivedParking, Operator, Parking, ParkingCheck, ParkingTerminal)
 from parkings.models.utils import normalize_reg_num
 
 
@@ -172,3 +174,85 @@ def test_normalize_reg_num_function(reg_num, result):
 def test_zone_casted_code(code, result):
     zone = create_payment_zone(code=code)
     assert zone.casted_code == result
+
+
+@pytest.mark.django_db
+def test_parking_ends_after_includes_open_ended(parking_factory):
+    time = now()
+    ended = parking_factory(
+        time_start=time - datetime.timedelta(hours=2),
+        time_end=time - datetime.timedelta(hours=1))
+    ending_later = parking_factory(
+        time_start=time - datetime.timedelta(hours=2),
+        time_end=time + datetime.timedelta(hours=1))
+    open_ended = parking_factory(
+        time_start=time - datetime.timedelta(hours=2), time_end=None)
+
+    result = set(Parking.objects.ends_after(time))
+
+    assert result == {ending_later, open_ended}
+    assert ended not in result
+    assert set(Parking.objects.ends_before(time)) == {ended}
+
+
+def explain(queryset):
+    (sql, params) = queryset.query.sql_with_params()
+    with transaction.atomic(), connection.cursor() as cursor:
+        cursor.execute("SET LOCAL enable_seqscan = off")
+        cursor.execute("EXPLAIN " + sql, params)
+        return "\n".join(row[0] for row in cursor.fetchall())
+
+
+@pytest.mark.django_db
+def test_parking_ends_after_uses_validity_index():
+    plan = explain(Parking.objects.ends_after(now()))
+
+    assert "parking_regnum_validity_gist" in plan, plan
+
+
+@pytest.mark.django_db
+def test_parking_validity_is_generated(parking_factory):
+    time = now()
+    parking = parking_factory(
+        time_start=time - datetime.timedelta(hours=2), time_end=None)
+
+    assert parking.validity.lower == parking.time_start
+    assert parking.validity.upper is None
+
+    parking.time_end = time
+    parking.save()
+    parking.refresh_from_db()
+
+    assert parking.validity.upper == time
+    assert parking.validity.upper_inc
+
+
+@pytest.mark.django_db
+def test_parking_valid_at_and_overlapping(parking_factory):
+    time = now()
+    hour = datetime.timedelta(hours=1)
+    ended = parking_factory(time_start=time - 2 * hour, time_end=time - hour)
+    valid = parking_factory(time_start=time - 2 * hour, time_end=time)
+    open_ended = parking_factory(time_start=time - hour, time_end=None)
+    future = parking_factory(time_start=time + hour, time_end=None)
+
+    assert set(Parking.objects.valid_at(time)) == {valid, open_ended}
+    assert set(Parking.objects.starts_before(time)) == {
+        ended, valid, open_ended}
+    assert set(Parking.objects.overlapping(time - hour, time)) == {
+        ended, valid, open_ended}
+    assert set(Parking.objects.overlapping(time + hour, time + 2 * hour)) == {
+        open_ended, future}
+
+
+@pytest.mark.django_db
+def test_archived_parking_keeps_validity(parking_factory):
+    time = now()
+    parking = parking_factory(
+        time_start=time - datetime.timedelta(hours=1), time_end=time)
+
+    archived = parking.archive()
+    archived.refresh_from_db()
+
+    assert archived.validity == parking.validity
+    assert ArchivedParking.objects.valid_at(parking.time_end).get() == archived
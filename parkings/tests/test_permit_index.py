@@ -0,0 +1,41 @@
+import datetime
+
+import pytest
+from django.core.exceptions import ImproperlyConfigured
+
+from parkings.lookups.permits import _AreaItems, permit_index
+
+utc = datetime.timezone.utc
+
+
+def at(hour):
+    return datetime.datetime(2023, 5, 1, hour, tzinfo=utc)
+
+
+@pytest.mark.parametrize("hour, expected", [
+    (0, None), (1, 9), (8, 9), (10, 12), (11, 12), (13, None)])
+def test_first_valid_item_is_found(hour, expected):
+    items = _AreaItems([(at(1), at(9)), (at(2), at(3)), (at(10), at(12))])
+
+    result = items.find(at(hour))
+
+    assert result == (at(expected) if expected is not None else None)
+
+
+def test_item_ending_before_a_longer_one_is_skipped():
+    items = _AreaItems([(at(1), at(2)), (at(3), at(4)), (at(3), at(20))])
+
+    assert items.find(at(5)) == at(20)
+
+
+def test_index_requires_shared_cache(settings):
+    settings.PARKKIHUBI_PERMIT_INDEX = True
+
+    with pytest.raises(ImproperlyConfigured):
+        permit_index.enabled
+
+
+def test_index_is_enabled_with_shared_cache(settings, shared_cache):
+    settings.PARKKIHUBI_PERMIT_INDEX = True
+
+    assert permit_index.enabled
@@ -124,3 +124,43 @@ def test_permitlookupitem_creation_ignored_for_start_date_gte_end_date():
 
     assert Permit.objects.count() == 1
     assert PermitLookupItem.objects.count() == 0
+
+
+@pytest.mark.django_db
+def test_permitlookupitem_validity_queries():
+    permit = create_permit(active=True, subject_count=1, area_count=1)
+    item = permit.lookup_items.get()
+    second = timezone.timedelta(seconds=1)
+
+    assert item.validity.lower == item.start_time
+    assert item.validity.upper == item.end_time
+    items = PermitLookupItem.objects
+    assert list(items.by_time(item.end_time)) == [item]
+    assert list(items.by_time(item.end_time + second)) == []
+    assert list(items.ends_before(item.end_time)) == []
+    assert list(items.ends_before(item.end_time + second)) == [item]
+    assert list(Permit.objects.all_items_end_before(item.end_time)) == []
+    assert list(Permit.objects.all_items_end_before(
+        item.end_time + second)) == [permit]
+
+
+@pytest.mark.django_db
+def test_permit_by_lookup_matches_same_item_without_duplicates():
+    permit = create_permit(active=True, subject_count=2, area_count=2)
+    create_permit(active=True, subject_count=1, area_count=1)
+    item = permit.lookup_items.first()
+    long_ago = timezone.now() - timezone.timedelta(days=500)
+
+    queryset = Permit.objects.by_lookup(
+        time=item.start_time,
+        subject=item.registration_number,
+        area=item.area)
+    mismatching = Permit.objects.by_lookup(
+        time=long_ago, subject=item.registration_number)
+
+    assert list(queryset) == [permit]
+    assert list(mismatching) == []
+    assert list(Permit.objects.by_subject(item.registration_number)) == [
+        permit]
+    assert "DISTINCT" not in str(queryset.query)
+    assert "EXISTS" in str(queryset.query)
@@ -0,0 +1,43 @@
+import pytest
+from django.core.exceptions import ImproperlyConfigured
+
+from parkings.lookups.plates import BloomFilter, plate_filter
+
+
+def test_added_values_are_found():
+    bloom_filter = BloomFilter(capacity=100, false_positive_rate=0.01)
+    values = ["ABC{}".format(n) for n in range(100)]
+    for value in values:
+        bloom_filter.add(value)
+
+    assert all(value in bloom_filter for value in values)
+
+
+def test_false_positive_rate_is_near_the_given_rate():
+    bloom_filter = BloomFilter(capacity=1000, false_positive_rate=0.01)
+    for n in range(1000):
+        bloom_filter.add("ABC{}".format(n))
+
+    false_positives = sum(
+        "XYZ{}".format(n) in bloom_filter for n in range(10000))
+
+    assert false_positives < 200
+
+
+def test_empty_filter_contains_nothing():
+    bloom_filter = BloomFilter(capacity=0, false_positive_rate=0.01)
+
+    assert "ABC123" not in bloom_filter
+
+
+def test_filter_requires_shared_cache(settings):
+    settings.PARKKIHUBI_PLATE_FILTER = True
+
+    with pytest.raises(ImproperlyConfigured):
+        plate_filter.enabled
+
+
+def test_filter_is_enabled_with_shared_cache(settings, shared_cache):
+    settings.PARKKIHUBI_PLATE_FILTER = True
+
+    assert plate_filter.enabled
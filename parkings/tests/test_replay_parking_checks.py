@@ -0,0 +1,133 @@
+import datetime
+import json
+
+import pytest
+import requests
+import requests_mock
+from django.core.management.base import CommandError
+from django.utils import timezone
+from rest_framework.authtoken.models import Token
+
+from parkings.factories import ParkingCheckFactory, UserFactory
+from parkings.management.commands import replay_parking_checks
+from parkings.tests.utils import call_mgmt_cmd_with_output
+
+URL = "http://target.test/enforcement/v1/check_parking/"
+
+
+def create_checks():
+    performer = UserFactory()
+    Token.objects.create(user=performer)
+    checks = [
+        ParkingCheckFactory(
+            performer=performer, registration_number=reg_num, allowed=allowed)
+        for (reg_num, allowed) in [
+            ("ABC-123", True), ("XYZ-987", False), ("DEF-456", True)]
+    ]
+    return (performer, checks)
+
+
+def respond_allowed_for(allowed_reg_nums):
+    def callback(request, context):
+        data = json.loads(request.body)
+        return {"allowed": data["registration_number"] in allowed_reg_nums}
+    return callback
+
+
+@pytest.mark.django_db
+def test_replay_parking_checks():
+    (performer, checks) = create_checks()
+    since = (timezone.now() - datetime.timedelta(hours=1)).isoformat()
+
+    with requests_mock.Mocker() as mocker:
+        mocker.post(URL, json=respond_allowed_for({"ABC-123"}))
+        (result, stdout, stderr) = call_mgmt_cmd_with_output(
+            replay_parking_checks.Command, "http://target.test/",
+            "--since", since, "--speed", "0", "--verbosity", "2")
+
+    assert mocker.call_count == 3
+    sent = [json.loads(x.body) for x in mocker.request_history]
+    assert {x["registration_number"] for x in sent} == {
+        "ABC-123", "XYZ-987", "DEF-456"}
+    assert all(x["time"] for x in sent)
+    token = Token.objects.get(user=performer)
+    assert all(
+        x.headers["Authorization"] == "ApiKey " + token.key
+        for x in mocker.request_history)
+    assert "Requests:           3" in stdout
+    assert "Errors:             0" in stdout
+    assert "Mismatches:         1" in stdout
+    assert "DEF-456: OK" in stdout
+
+
+@pytest.mark.django_db
+def test_replay_parking_checks_with_api_key():
+    create_checks()
+    since = (timezone.now() - datetime.timedelta(hours=1)).isoformat()
+
+    with requests_mock.Mocker() as mocker:
+        mocker.post(URL, status_code=403, json={})
+        (result, stdout, stderr) = call_mgmt_cmd_with_output(
+            replay_parking_checks.Command, "http://target.test",
+            "--since", since, "--speed", "0", "--api-key", "secret")
+
+    assert all(
+        x.headers["Authorization"] == "ApiKey secret"
+        for x in mocker.request_history)
+    assert "Errors:             3" in stdout
+
+
+@pytest.mark.django_db
+def test_replay_parking_checks_without_api_key():
+    ParkingCheckFactory()
+    since = (timezone.now() - datetime.timedelta(hours=1)).isoformat()
+
+    with pytest.raises(CommandError) as excinfo:
+        call_mgmt_cmd_with_output(
+            replay_parking_checks.Command, "http://target.test",
+            "--since", since)
+
+    assert "--api-key" in str(excinfo.value)
+
+
+@pytest.mark.django_db
+def test_replay_parking_checks_nothing_to_replay():
+    (result, stdout, stderr) = call_mgmt_cmd_with_output(
+        replay_parking_checks.Command, "http://target.test",
+        "--since", timezone.now().isoformat())
+
+    assert stdout == "No parking checks to replay\n"
+
+
+@pytest.mark.django_db
+def test_replay_parking_checks_counts_failed_requests_as_errors():
+    create_checks()
+    since = (timezone.now() - datetime.timedelta(hours=1)).isoformat()
+
+    with requests_mock.Mocker() as mocker:
+        mocker.post(URL, response_list=[
+            {"exc": requests.ConnectionError},
+            {"status_code": 200, "text": "<html>"},
+            {"status_code": 200, "json": {"allowed": True}},
+        ])
+        (result, stdout, stderr) = call_mgmt_cmd_with_output(
+            replay_parking_checks.Command, "http://target.test",
+            "--since", since, "--speed", "0", "--concurrency", "1")
+
+    assert mocker.call_count == 3
+    assert "Errors:             2" in stdout
+
+
+@pytest.mark.django_db
+def test_replay_parking_checks_skips_anonymized_checks():
+    (performer, checks) = create_checks()
+    ParkingCheckFactory(performer=performer, registration_number="")
+    since = (timezone.now() - datetime.timedelta(hours=1)).isoformat()
+
+    with requests_mock.Mocker() as mocker:
+        mocker.post(URL, json=respond_allowed_for({"ABC-123", "DEF-456"}))
+        call_mgmt_cmd_with_output(
+            replay_parking_checks.Command, "http://target.test",
+            "--since", since, "--speed", "0")
+
+    assert mocker.call_count == 3
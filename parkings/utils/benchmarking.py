@@ -0,0 +1,62 @@
+import math
+
+
+def get_percentile(sorted_values, percent):
+    """
+    Get a percentile of sorted values with the nearest-rank method.
+
+    :type sorted_values: list[float]
+    :type percent: float
+    :rtype: float|None
+    """
+    if not sorted_values:
+        return None
+    rank = int(math.ceil(percent / 100.0 * len(sorted_values)))
+    return sorted_values[max(rank, 1) - 1]
+
+
+def summarize_durations(durations, total_time):
+    """
+    Summarize request durations to throughput and latency figures.
+
+    :param durations: Durations of the requests in seconds
+    :type durations: Iterable[float]
+    :param total_time: Wall clock time of all the requests in seconds
+    :type total_time: float
+    :rtype: dict
+    """
+    values = sorted(durations)
+    return {
+        "count": len(values),
+        "total_time": total_time,
+        "throughput": (len(values) / total_time) if total_time else None,
+        "mean": (sum(values) / len(values)) if values else None,
+        "p50": get_percentile(values, 50),
+        "p95": get_percentile(values, 95),
+        "p99": get_percentile(values, 99),
+        "max": values[-1] if values else None,
+    }
+
+
+def format_summary(summary):
+    """
+    Format a summary made by `summarize_durations` to printable lines.
+
+    :type summary: dict
+    :rtype: list[str]
+    """
+    def ms(value):
+        return "{:9.2f} ms".format(value * 1000) if value is not None else "n/a"
+
+    throughput = summary["throughput"]
+    return [
+        "Requests:   {:9d}".format(summary["count"]),
+        "Total time: {:9.2f} s".format(summary["total_time"]),
+        "Throughput: {} req/s".format(
+            "{:9.1f}".format(throughput) if throughput is not None else "n/a"),
+        "Mean:       {}".format(ms(summary["mean"])),
+        "p50:        {}".format(ms(summary["p50"])),
+        "p95:        {}".format(ms(summary["p95"])),
+        "p99:        {}".format(ms(summary["p99"])),
+        "Max:        {}".format(ms(summary["max"])),
+    ]
@@ -0,0 +1,158 @@
+"""
+Coordinate transformations between spatial reference systems.
+
+Creating a GDAL coordinate transformation is much slower than using one
+and the transformations are not thread-safe, so they are created once
+per thread and SRID pair and then reused.  Whole sequences of
+coordinates are transformed with a single GDAL call.
+"""
+import math
+import threading
+from ctypes import POINTER, c_double, c_int, c_void_p
+
+from django.contrib.gis.gdal import (
+    CoordTransform, GDALException, SpatialReference)
+from django.contrib.gis.gdal.libgdal import lgdal
+from django.contrib.gis.geos import (
+    GeometryCollection, LinearRing, LineString, Point, Polygon)
+
+_octransform_ex = lgdal.OCTTransformEx
+_octransform_ex.argtypes = [
+    c_void_p, c_int, POINTER(c_double), POINTER(c_double),
+    POINTER(c_double), POINTER(c_int)]
+_octransform_ex.restype = c_int
+
+_local = threading.local()
+
+
+class TransformError(GDALException):
+    """
+    Error of a failed transformation.
+
+    A GDALException like the one raised by GEOSGeometry.transform, so
+    that the callers of the replaced transformations keep working.
+    """
+
+
+def get_coord_transform(source_srid, target_srid):
+    """
+    Get the coordinate transformation of the current thread.
+
+    :type source_srid: int
+    :type target_srid: int
+    :rtype: django.contrib.gis.gdal.CoordTransform
+    """
+    transforms = getattr(_local, "transforms", None)
+    if transforms is None:
+        transforms = _local.transforms = {}
+    key = (source_srid, target_srid)
+    transform = transforms.get(key)
+    if transform is None:
+        transform = transforms[key] = CoordTransform(
+            SpatialReference(source_srid), SpatialReference(target_srid))
+    return transform
+
+
+def transform_coordinates(coordinates, source_srid, target_srid):
+    """
+    Transform a sequence of (x, y) coordinates at once.
+
+    The coordinates which cannot be transformed, e.g. because they are
+    outside of the projection plane of the target, are returned as None.
+
+    :type coordinates: Sequence[tuple[float, float]]
+    :type source_srid: int
+    :type target_srid: int
+    :rtype: list[tuple[float, float]|None]
+    """
+    count = len(coordinates)
+    if source_srid == target_srid:
+        return [(x[0], x[1]) for x in coordinates]
+    if not count:
+        return []
+    xs = (c_double * count)(*(x[0] for x in coordinates))
+    ys = (c_double * count)(*(x[1] for x in coordinates))
+    zs = (c_double * count)()
+    successes = (c_int * count)()
+    transform = get_coord_transform(source_srid, target_srid)
+    _octransform_ex(transform.ptr, count, xs, ys, zs, successes)
+    return [
+        (x, y) if success and math.isfinite(x) and math.isfinite(y) else None
+        for (x, y, success) in zip(xs, ys, successes)
+    ]
+
+
+def transform_points(points, srid):
+    """
+    Transform points to given SRID.
+
+    The points which cannot be transformed are returned as None.
+
+    :type points: Sequence[Point]
+    :type srid: int
+    :rtype: list[Point|None]
+    """
+    result = [None] * len(points)
+    indexes_by_srid = {}
+    for (index, point) in enumerate(points):
+        indexes_by_srid.setdefault(point.srid, []).append(index)
+    for (source_srid, indexes) in indexes_by_srid.items():
+        transformed = transform_coordinates(
+            [points[index].coords for index in indexes], source_srid, srid)
+        for (index, coords) in zip(indexes, transformed):
+            if coords is not None:
+                result[index] = Point(*coords, srid=srid)
+    return result
+
+
+def transform_point(point, srid):
+    """
+    Transform a point to given SRID.
+
+    :type point: Point
+    :type srid: int
+    :rtype: Point
+    :raises TransformError: if the point cannot be transformed
+    """
+    [result] = transform_points([point], srid)
+    if result is None:
+        raise TransformError(
+            "Cannot transform {} to SRID {}".format(point.wkt, srid))
+    return result
+
+
+def transform_geometry(geometry, srid):
+    """
+    Transform a geometry to given SRID.
+
+    Points, line strings, polygons and their collections are transformed
+    with one GDAL call per linear component.  Other geometry types are
+    transformed with GEOSGeometry.transform.
+
+    :type geometry: django.contrib.gis.geos.GEOSGeometry
+    :type srid: int
+    :rtype: django.contrib.gis.geos.GEOSGeometry
+    :raises TransformError: if the geometry cannot be transformed
+    """
+    if isinstance(geometry, Point):
+        return transform_point(geometry, srid)
+    if isinstance(geometry, (LineString, LinearRing)):
+        return type(geometry)(
+            _transform_component(geometry, geometry.srid, srid), srid=srid)
+    if isinstance(geometry, Polygon):
+        return Polygon(*(
+            _transform_component(ring, geometry.srid, srid)
+            for ring in geometry), srid=srid)
+    if isinstance(geometry, GeometryCollection):
+        return type(geometry)(
+            *(transform_geometry(part, srid) for part in geometry), srid=srid)
+    return geometry.transform(srid, clone=True)
+
+
+def _transform_component(component, source_srid, target_srid):
+    coordinates = transform_coordinates(
+        component.coords, source_srid, target_srid)
+    if any(x is None for x in coordinates):
+        raise TransformError(
+            "Cannot transform coordinates to SRID {}".format(target_srid))
+    return coordinates
@@ -174,7 +174,7 @@ REST_FRAMEWORK = {
     ],
     'DEFAULT_AUTHENTICATION_CLASSES': [
         'parkings.authentication.ApiKeyAuthentication',
-        'drf_jwt_2fa.authentication.Jwt2faAuthentication',
+        'parkings.authentication.Jwt2faAuthentication',
     ] + ([  # Following two are only for DEBUG mode in dev environment:
         'rest_framework.authentication.SessionAuthentication',
         'rest_framework.authentication.BasicAuthentication',
@@ -223,8 +223,33 @@ PARKKIHUBI_OPERATOR_API_ENABLED = env.bool('PARKKIHUBI_OPERATOR_API_ENABLED', Tr
 PARKKIHUBI_ENFORCEMENT_API_ENABLED = (
     env.bool('PARKKIHUBI_ENFORCEMENT_API_ENABLED', True))
 PARKKIHUBI_PERMITS_PRUNABLE_AFTER = timedelta(days=3)
+PARKKIHUBI_PERMIT_ITEM_CHANGES_PRUNABLE_AFTER = timedelta(
+    days=env.float('PARKKIHUBI_PERMIT_ITEM_CHANGES_PRUNABLE_AFTER', 7.0))
 DEFAULT_ENFORCEMENT_DOMAIN = ('Helsinki', 'HKI')
 PARKKIHUBI_REGISTRATION_NUMBERS_REMOVABLE_AFTER = timedelta(hours=24)
+PARKKIHUBI_WORKER_INDEX_CHECK_INTERVAL = timedelta(seconds=10)
+PARKKIHUBI_PARKING_CHECK_WRITE_BEHIND = env.bool(
+    'PARKKIHUBI_PARKING_CHECK_WRITE_BEHIND', False)
+PARKKIHUBI_PARKING_CHECK_FLUSH_SIZE = env.int(
+    'PARKKIHUBI_PARKING_CHECK_FLUSH_SIZE', 100)
+PARKKIHUBI_PARKING_CHECK_FLUSH_INTERVAL = timedelta(
+    seconds=env.float('PARKKIHUBI_PARKING_CHECK_FLUSH_INTERVAL', 5.0))
+PARKKIHUBI_CHECK_PARKING_CACHE_TTL = timedelta(
+    seconds=env.float('PARKKIHUBI_CHECK_PARKING_CACHE_TTL', 0.0))
+PARKKIHUBI_AREA_INDEX_MAX_AGE = timedelta(
+    seconds=env.float('PARKKIHUBI_AREA_INDEX_MAX_AGE', 300.0))
+PARKKIHUBI_HOT_PARKING_INDEX = env.bool('PARKKIHUBI_HOT_PARKING_INDEX', False)
+PARKKIHUBI_HOT_PARKING_INDEX_CATCH_UP_INTERVAL = timedelta(seconds=2)
+PARKKIHUBI_HOT_PARKING_INDEX_REBUILD_INTERVAL = timedelta(minutes=15)
+PARKKIHUBI_PERMIT_INDEX = env.bool('PARKKIHUBI_PERMIT_INDEX', False)
+PARKKIHUBI_PLATE_FILTER = env.bool('PARKKIHUBI_PLATE_FILTER', False)
+PARKKIHUBI_PLATE_FILTER_FALSE_POSITIVE_RATE = env.float(
+    'PARKKIHUBI_PLATE_FILTER_FALSE_POSITIVE_RATE', 0.01)
+PARKKIHUBI_PLATE_FILTER_REBUILD_INTERVAL = timedelta(minutes=10)
+PARKKIHUBI_AUTH_CACHE_TTL = timedelta(
+    seconds=env.float('PARKKIHUBI_AUTH_CACHE_TTL', 0.0))
+PARKKIHUBI_ENFORCEMENT_BUNDLE_MAX_AGE = timedelta(
+    seconds=env.float('PARKKIHUBI_ENFORCEMENT_BUNDLE_MAX_AGE', 300.0))
 
 LOGGING = {
     'version': 1,
@@ -1,5 +1,13 @@
+from datetime import timedelta
+
 from .settings import *  # noqa
 
 PARKKIHUBI_PUBLIC_API_ENABLED = True
 PARKKIHUBI_OPERATOR_API_ENABLED = True
 PARKKIHUBI_ENFORCEMENT_API_ENABLED = True
+PARKKIHUBI_PARKING_CHECK_WRITE_BEHIND = False
+PARKKIHUBI_CHECK_PARKING_CACHE_TTL = timedelta(0)
+PARKKIHUBI_HOT_PARKING_INDEX = False
+PARKKIHUBI_PERMIT_INDEX = False
+PARKKIHUBI_PLATE_FILTER = False
+PARKKIHUBI_AUTH_CACHE_TTL = timedelta(0)